@@ -23,17 +23,43 @@ OP = Enum(
         "Sum",
     ),
 )
-COMM = Enum("COMM", ("NONE", "ALL_REDUCE", "ALL_2_ALL"))
+COMM = Enum(
+    "COMM",
+    ("NONE", "ALL_REDUCE", "ALL_2_ALL", "REDUCE_SCATTER", "ALL_GATHER", "BROADCAST"),
+)
 OPTIMIZER = Enum("OPTIMIZER", ("NONE", "SGD", "ADAM"))
 BYTES = {"NONE": 0, "INT8": 1, "FP16": 2, "TF32": 2.375, "FP32": 4, "FP64": 5}
 ML_STATE = Enum("ML_STATE", ("FORWARD", "BACKWARD", "PARAM_SYNC"))
 dataflow = Enum("dataflow", ("IS", "WS", "OS"))
 comp_model = Enum("comp_model", ("simple", "SCALE_SIM", "abrupt_curve"))
+noc_model = Enum("noc_model", ("store_forward", "flow", "wormhole", "reservation"))
+comm_algo = Enum(
+    "comm_algo",
+    (
+        "auto",
+        "ring",
+        "ring_segmented",
+        "mesh_2d",
+        "hierarchical",
+        "tree",
+        "halving_doubling",
+        "pairwise",
+        "bruck",
+        "multicast",
+    ),
+)
 
 store_strategy = Enum(
     "store_strategy", ("cache", "weight", "ACT", "ACT_weight", "none")
 )
 recompute_strategy = Enum("recompute_strategy", ("none", "half", "all"))
+# edge DRAM controller of an access: nearest side, least loaded, or interleaved over all
+dram_select = Enum("dram_select", ("nearest", "least_loaded", "interleaved"))
+
+plan_step = Enum(
+    "plan_step",
+    ("edge_read", "edge_write", "tile_read", "tile_write", "comp", "comm", "comm_overlap"),
+)
 
 pipe_strategy = Enum(
     "pipe_strategy", ("GPipe", "Megatron1F1B", "Interleaved1F1B", "Cerebras")
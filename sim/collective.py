@@ -0,0 +1,516 @@
+import math
+import functools
+import simpy
+import numpy as np
+from typing import Dict, List, Tuple
+from ML import *
+
+# NOTE: a schedule is a list of steps, a step is a list of (src_id,des_id,size_MB)
+# transfers in one step run together, next step starts after all of them end
+Step = List[Tuple[int, int, float]]
+
+
+def ring_all_reduce(wd, group_id: List[int], size) -> List[Step]:
+    if wd.ring_reorder:
+        group_id = wd.ring_order(group_id)
+    n = len(group_id)
+    step = [(group_id[i - 1], group_id[i], size / n) for i in range(n)]
+    return [step] * (2 * (n - 1))
+
+
+# NOTE: size is the full buffer of one tile for all primitives
+# reduce-scatter: tile i ends with the reduced chunk i, all-gather: the reverse
+# on a ring both send the same chunks, only the direction of the data differs
+def ring_reduce_scatter(wd, group_id: List[int], size) -> List[Step]:
+    return ring_all_reduce(wd, group_id, size)[: len(group_id) - 1]
+
+
+def ring_all_gather(wd, group_id: List[int], size) -> List[Step]:
+    return ring_all_reduce(wd, group_id, size)[len(group_id) - 1 :]
+
+
+class StreamSchedule:
+    # estimate takes wd with array bandwidths (Wafer_Device.batch_view), otherwise
+    # a batch is estimated one config after another
+    array_bw = False
+
+    """
+    schedule that is not a list of barrier steps, it runs as its own SimPy process
+    """
+
+    def estimate(self, wd, size):
+        raise NotImplementedError
+
+    def time(self, wd):
+        raise NotImplementedError
+
+    def process(self, wd, task_id):
+        raise NotImplementedError
+
+
+class SegmentedRing(StreamSchedule):
+    """
+    ring all-reduce where every chunk is cut into segments that stream through the ring:
+    edge i sends segment s of step k once it received segment s of step k-1,
+    no barrier between steps, so segments overlap on different links & hops
+    phases=1: reduce-scatter or all-gather only
+    """
+
+    array_bw = True
+
+    def __init__(
+        self, group_id: List[int], size, segments=None, max_segments=64, phases=2
+    ):
+        self.group_id = group_id
+        self.size = size
+        self.segments = segments
+        self.max_segments = max_segments
+        self.phases = phases
+
+    def __steps(self):
+        return self.phases * (len(self.group_id) - 1)
+
+    # NOTE: segment time is linear in segment size seg, so precompute per group
+    # chain i (steps consecutive edges from edge i): lat * hops + seg * sum(1/bw)
+    # link l: lat * (segments through l) + seg * sum(1/bw of edges whose first link is l)
+    def __linear_cost(self, wd):
+        if getattr(self, "_cost", None) is None:
+            n = len(self.group_id)
+            lat = wd.noc_response_latency_ms
+            hops = np.zeros(n)
+            inv_bw = []
+            links_use: Dict[int, List[float]] = {}
+            for i in range(n):
+                links = wd.link_gen(self.group_id[i - 1], self.group_id[i])
+                hops[i] = len(links)
+                inv_bw.append(1 / wd.link_bw(links[0]))
+                for j, l in enumerate(links):
+                    use = links_use.setdefault(l, [0, 0])
+                    use[0] += 1
+                    use[1] = use[1] + (inv_bw[i] if j == 0 else 0)
+            # chain of steps edges from edge i: full laps + prefix of the next lap
+            # inv_bw & link seconds have a trailing config axis for array bandwidths
+            inv_bw = np.array(inv_bw)
+            steps = self.__steps()
+            idx = (np.arange(n)[:, None] + np.arange(steps)[None, :]) % n
+            self._cost = (
+                lat * hops[idx].sum(1),
+                inv_bw[idx].sum(1),
+                lat * np.array([use[0] for use in links_use.values()]),
+                np.array(
+                    [np.broadcast_to(use[1], inv_bw.shape[1:]) for use in links_use.values()]
+                ),
+            )
+        return self._cost
+
+    # NOTE: closed form of the streaming ring with S=1..max_segments segments, max of
+    # 1. pipeline fill: slowest chain + (S-1) holds of the busiest link
+    # 2. link bound: steps * S holds of the busiest link, one after another
+    def segments_times(self, wd, size=None):
+        chain_a, chain_b, link_a, link_b = self.__linear_cost(wd)
+        n = len(self.group_id)
+        config = (1,) * (chain_b.ndim - 1)
+        segments = np.arange(1, self.max_segments + 1).reshape((-1,) + config)
+        seg = (self.size if size is None else size) / n / segments
+        chain = (chain_a.reshape((1, -1) + config) + seg[:, None] * chain_b[None]).max(1)
+        busy = (link_a.reshape((1, -1) + config) + seg[:, None] * link_b[None]).max(1)
+        return np.maximum(chain + (segments - 1) * busy, self.__steps() * segments * busy)
+
+    def segments_time(self, wd, segments):
+        return float(self.segments_times(wd)[segments - 1])
+
+    # auto tune: least closed-form time over 1..max_segments
+    def tune(self, wd):
+        if self.segments is None:
+            self.segments = int(np.argmin(self.segments_times(wd))) + 1
+        return self.segments
+
+    def estimate(self, wd, size):
+        return self.segments_times(wd, size).min(0)
+
+    def time(self, wd):
+        return self.segments_time(wd, self.tune(wd))
+
+    def process(self, wd, task_id):
+        n = len(self.group_id)
+        segments = self.tune(wd)
+        seg = self.size / n / segments
+        steps = self.__steps()
+        # arrive[i][k][s]: segment s of step k is at the end of edge i
+        arrive = [
+            [[wd.env.event() for _ in range(segments)] for _ in range(steps)]
+            for _ in range(n)
+        ]
+
+        def send(i, k, s):
+            yield wd.env.process(
+                wd.noc_process(seg, self.group_id[i - 1], self.group_id[i], task_id)
+            )
+            arrive[i][k][s].succeed()
+
+        def edge(i):
+            for k in range(steps):
+                for s in range(segments):
+                    if k > 0:
+                        yield arrive[i - 1][k - 1][s]
+                    wd.env.process(send(i, k, s))
+
+        for i in range(n):
+            wd.env.process(edge(i))
+        yield simpy.AllOf(wd.env, [e for i in range(n) for e in arrive[i][-1]])
+
+
+def ring_segmented_all_reduce(wd, group_id: List[int], size) -> SegmentedRing:
+    if wd.ring_reorder:
+        group_id = wd.ring_order(group_id)
+    return SegmentedRing(group_id, size)
+
+
+def ring_segmented_half(wd, group_id: List[int], size) -> SegmentedRing:
+    if wd.ring_reorder:
+        group_id = wd.ring_order(group_id)
+    return SegmentedRing(group_id, size, phases=1)
+
+
+# NOTE: root group_id[0] multicasts the buffer once over the XY tree of the group
+class Multicast(StreamSchedule):
+    array_bw = True
+
+    def __init__(self, group_id: List[int], size):
+        self.group_id = group_id
+        self.size = size
+
+    def estimate(self, wd, size):
+        return wd.multicast_time(size, self.group_id[0], self.group_id[1:])
+
+    def time(self, wd):
+        return self.estimate(wd, self.size)
+
+    def process(self, wd, task_id):
+        yield wd.env.process(
+            wd.multicast_process(self.size, self.group_id[0], self.group_id[1:], task_id)
+        )
+
+
+def multicast_broadcast(wd, group_id: List[int], size) -> Multicast:
+    return Multicast(group_id, size)
+
+
+# reduce-scatter in each part, all-reduce across parts per local rank, all-gather in each part
+# return the intra-part & inter-part ring steps
+def _two_level(parts: List[List[int]], size):
+    k = len(parts[0])
+    m = len(parts)
+    intra = [(p[i - 1], p[i], size / k) for p in parts for i in range(k)]
+    inter = [
+        (parts[j - 1][r], parts[j][r], size / k / m) for r in range(k) for j in range(m)
+    ]
+    return intra, inter, k, m
+
+
+def _two_level_all_reduce(parts: List[List[int]], size) -> List[Step]:
+    intra, inter, k, m = _two_level(parts, size)
+    return [intra] * (k - 1) + [inter] * (2 * (m - 1)) + [intra] * (k - 1)
+
+
+def _two_level_reduce_scatter(parts: List[List[int]], size) -> List[Step]:
+    intra, inter, k, m = _two_level(parts, size)
+    return [intra] * (k - 1) + [inter] * (m - 1)
+
+
+def _two_level_all_gather(parts: List[List[int]], size) -> List[Step]:
+    intra, inter, k, m = _two_level(parts, size)
+    return [inter] * (m - 1) + [intra] * (k - 1)
+
+
+def _parts_by(group_id: List[int], key):
+    parts: Dict[Tuple, List[int]] = {}
+    for i in group_id:
+        parts.setdefault(key(i), []).append(i)
+    parts = [sorted(p) for p in parts.values()]
+    # equal parts only, at least 2 parts of at least 2 tiles
+    if len(parts) < 2 or len(set(len(p) for p in parts)) != 1 or len(parts[0]) < 2:
+        return None
+    return parts
+
+
+def _mesh_rows(wd, group_id: List[int]):
+    y = wd.tile_intra_shape[1] * wd.tile_inter_shape[1]
+    return _parts_by(group_id, lambda i: i // y)
+
+
+def _dies(wd, group_id: List[int]):
+    y = wd.tile_intra_shape[1] * wd.tile_inter_shape[1]
+    x0, y0 = wd.tile_intra_shape
+    return _parts_by(group_id, lambda i: ((i // y) // x0, (i % y) // y0))
+
+
+# 2D mesh: rows of the group are the first level, columns the second
+def mesh_2d_all_reduce(wd, group_id: List[int], size) -> List[Step]:
+    parts = _mesh_rows(wd, group_id)
+    return None if parts is None else _two_level_all_reduce(parts, size)
+
+
+def mesh_2d_reduce_scatter(wd, group_id: List[int], size) -> List[Step]:
+    parts = _mesh_rows(wd, group_id)
+    return None if parts is None else _two_level_reduce_scatter(parts, size)
+
+
+def mesh_2d_all_gather(wd, group_id: List[int], size) -> List[Step]:
+    parts = _mesh_rows(wd, group_id)
+    return None if parts is None else _two_level_all_gather(parts, size)
+
+
+# hierarchical: tiles in the same die are the first level, intra-die noc is faster
+def hierarchical_all_reduce(wd, group_id: List[int], size) -> List[Step]:
+    parts = _dies(wd, group_id)
+    return None if parts is None else _two_level_all_reduce(parts, size)
+
+
+def hierarchical_reduce_scatter(wd, group_id: List[int], size) -> List[Step]:
+    parts = _dies(wd, group_id)
+    return None if parts is None else _two_level_reduce_scatter(parts, size)
+
+
+def hierarchical_all_gather(wd, group_id: List[int], size) -> List[Step]:
+    parts = _dies(wd, group_id)
+    return None if parts is None else _two_level_all_gather(parts, size)
+
+
+# binomial tree from group_id[0]: step k doubles the tiles holding the data
+def _binomial_broadcast(group_id: List[int], size) -> List[Step]:
+    n = len(group_id)
+    reduce = []
+    d = 1
+    while d < n:
+        reduce.append(
+            [(group_id[i + d], group_id[i], size) for i in range(0, n - d, 2 * d)]
+        )
+        d *= 2
+    return [[(des, src, s) for src, des, s in step] for step in reversed(reduce)]
+
+
+# binomial tree reduce to group_id[0] + broadcast back
+def tree_all_reduce(wd, group_id: List[int], size) -> List[Step]:
+    bcast = _binomial_broadcast(group_id, size)
+    reduce = [[(des, src, s) for src, des, s in step] for step in reversed(bcast)]
+    return reduce + bcast
+
+
+def tree_broadcast(wd, group_id: List[int], size) -> List[Step]:
+    return _binomial_broadcast(group_id, size)
+
+
+# 2D mesh: binomial tree over one tile per row (root first), then in every row together
+def mesh_2d_broadcast(wd, group_id: List[int], size) -> List[Step]:
+    parts = _mesh_rows(wd, group_id)
+    if parts is None:
+        return None
+    root = group_id[0]
+    parts = [[root] + [i for i in p if i != root] if root in p else p for p in parts]
+    parts.sort(key=lambda p: p[0] != root)
+    rows = [_binomial_broadcast(p, size) for p in parts]
+    return _binomial_broadcast([p[0] for p in parts], size) + [
+        sum(steps, []) for steps in zip(*rows)
+    ]
+
+
+# recursive halving reduce-scatter, 2^k tiles only
+def _halving(group_id: List[int], size) -> List[Step]:
+    n = len(group_id)
+    if n & (n - 1):
+        return None
+    halving = []
+    d = n // 2
+    chunk = size / 2
+    while d >= 1:
+        halving.append([(group_id[i], group_id[i ^ d], chunk) for i in range(n)])
+        d //= 2
+        chunk /= 2
+    return halving
+
+
+# recursive halving reduce-scatter + recursive doubling all-gather
+def halving_doubling_all_reduce(wd, group_id: List[int], size) -> List[Step]:
+    halving = _halving(group_id, size)
+    return None if halving is None else halving + halving[::-1]
+
+
+def halving_reduce_scatter(wd, group_id: List[int], size) -> List[Step]:
+    return _halving(group_id, size)
+
+
+def doubling_all_gather(wd, group_id: List[int], size) -> List[Step]:
+    halving = _halving(group_id, size)
+    return None if halving is None else halving[::-1]
+
+
+def pairwise_all_2_all(wd, group_id: List[int], size) -> List[Step]:
+    n = len(group_id)
+    return [
+        [(group_id[j], group_id[(j + i + 1) % n], size / n) for j in range(n)]
+        for i in range(n - 1)
+    ]
+
+
+# Bruck: log2(n) steps, step k sends every block whose index has bit k set
+def bruck_all_2_all(wd, group_id: List[int], size) -> List[Step]:
+    n = len(group_id)
+    steps = []
+    for k in range(math.ceil(math.log2(n))):
+        shift = 1 << k
+        blocks = sum(1 for j in range(n) if (j >> k) & 1)
+        steps.append(
+            [(group_id[j], group_id[(j + shift) % n], size * blocks / n) for j in range(n)]
+        )
+    return steps
+
+
+ALGO = {
+    COMM.ALL_REDUCE: {
+        comm_algo.ring: ring_all_reduce,
+        comm_algo.ring_segmented: ring_segmented_all_reduce,
+        comm_algo.mesh_2d: mesh_2d_all_reduce,
+        comm_algo.hierarchical: hierarchical_all_reduce,
+        comm_algo.tree: tree_all_reduce,
+        comm_algo.halving_doubling: halving_doubling_all_reduce,
+    },
+    COMM.ALL_2_ALL: {
+        comm_algo.pairwise: pairwise_all_2_all,
+        comm_algo.bruck: bruck_all_2_all,
+    },
+    COMM.REDUCE_SCATTER: {
+        comm_algo.ring: ring_reduce_scatter,
+        comm_algo.ring_segmented: ring_segmented_half,
+        comm_algo.mesh_2d: mesh_2d_reduce_scatter,
+        comm_algo.hierarchical: hierarchical_reduce_scatter,
+        comm_algo.halving_doubling: halving_reduce_scatter,
+    },
+    COMM.ALL_GATHER: {
+        comm_algo.ring: ring_all_gather,
+        comm_algo.ring_segmented: ring_segmented_half,
+        comm_algo.mesh_2d: mesh_2d_all_gather,
+        comm_algo.hierarchical: hierarchical_all_gather,
+        comm_algo.halving_doubling: doubling_all_gather,
+    },
+    COMM.BROADCAST: {
+        comm_algo.tree: tree_broadcast,
+        comm_algo.mesh_2d: mesh_2d_broadcast,
+        comm_algo.multicast: multicast_broadcast,
+    },
+}
+
+
+# NOTE: closed-form time of a schedule on wd, steps run one after another
+# step time: slowest transfer alone, or the most loaded link if transfers share it
+# both are linear in the message size, so a profile (count,base,slope,link) per step is kept:
+# step time = max(max(base + slope * size), link * size)
+# slope & link have a trailing config axis if the bandwidths of wd are arrays
+def schedule_profile(wd, schedule: List[Step]):
+    lat = wd.noc_response_latency_ms
+    profile = {}
+    for step in schedule:
+        # the same step object repeated (e.g. ring) is profiled once
+        if id(step) in profile:
+            profile[id(step)][0] += 1
+            continue
+        base, slope = [], []
+        load: Dict[int, float] = {}
+        for src, des, size in step:
+            if src == des:
+                continue
+            hops, bw = wd.noc_cost(src, des)
+            base.append(lat * hops)
+            slope.append(size / bw)
+            for link_id in wd.link_gen(src, des):
+                load[link_id] = load.get(link_id, 0) + size
+        link = functools.reduce(
+            np.maximum, [size / wd.link_bw(l) for l, size in load.items()], 0
+        )
+        profile[id(step)] = [1, np.array(base), np.array(slope), link]
+    return list(profile.values())
+
+
+def profile_time(profile, size=1):
+    time_ms = 0
+    for count, base, slope, link in profile:
+        step_ms = 0
+        if len(base):
+            base = base.reshape(base.shape + (1,) * (slope.ndim - 1))
+            step_ms = (base + slope * size).max(0)
+        time_ms = time_ms + count * np.maximum(step_ms, link * size)
+    return time_ms
+
+
+def schedule_time(wd, schedule: List[Step]):
+    if isinstance(schedule, StreamSchedule):
+        return schedule.time(wd)
+    return profile_time(schedule_profile(wd, schedule))
+
+
+# profile of (primitive,algo,group): schedule_profile of a step schedule for a size of 1,
+# the StreamSchedule itself, or None if algo does not apply to the group
+def comm_profile(wd, comm_type, algo, group_id: List[int]):
+    key = (comm_type, algo, tuple(group_id))
+    if key not in wd.comm_profile_table:
+        profile = ALGO[comm_type][algo](wd, group_id, 1)
+        if profile is not None and not isinstance(profile, StreamSchedule):
+            profile = schedule_profile(wd, profile)
+        wd.comm_profile_table[key] = profile
+    return wd.comm_profile_table[key]
+
+
+# estimated time of algo for any size, from the profile of (primitive,algo,group)
+def estimate(wd, comm_type, algo, group_id: List[int], size):
+    profile = comm_profile(wd, comm_type, algo, group_id)
+    if profile is None:
+        return None
+    if isinstance(profile, StreamSchedule):
+        return profile.estimate(wd, size)
+    return profile_time(profile, size)
+
+
+# NOTE: pick the algorithm with least estimated time for (primitive,group,size)
+# algo!=auto forces the algorithm if it supports this primitive and group
+# return (algo, estimated time), cached in wd.comm_algo_table
+def select(wd, comm_type, group_id: List[int], size, algo=comm_algo.auto):
+    key = (comm_type, tuple(group_id), size, algo)
+    best = wd.comm_algo_table.get(key)
+    if best is not None:
+        return best
+    algos = ALGO[comm_type]
+    if algo in algos:
+        time_ms = estimate(wd, comm_type, algo, group_id, size)
+        if time_ms is not None:
+            best = (algo, time_ms)
+    if best is None:
+        for name in algos:
+            time_ms = estimate(wd, comm_type, name, group_id, size)
+            if time_ms is not None and (best is None or time_ms < best[1]):
+                best = (name, time_ms)
+    wd.comm_algo_table[key] = best
+    return best
+
+
+def schedule(wd, comm_type, algo, group_id: List[int], size) -> List[Step]:
+    return ALGO[comm_type][algo](wd, group_id, size)
+
+
+if __name__ == "__main__":
+    import simpy
+    from wafer_device import Wafer_Device
+
+    env = simpy.Environment()
+    wd = Wafer_Device(env, tile_inter_shape=[2, 2], tile_intra_shape=[4, 4])
+    group = list(range(0, 64, 2))
+    for comm_type in ALGO:
+        for size in (0.01, 1, 100):
+            for name, func in ALGO[comm_type].items():
+                schedule = func(wd, group, size)
+                if schedule is not None:
+                    print(
+                        "{} {} MB {}: {:.4f} ms".format(
+                            comm_type, size, name, schedule_time(wd, schedule)
+                        )
+                    )
+            print("select: {} {:.4f} ms".format(*select(wd, comm_type, group, size)))
@@ -0,0 +1,321 @@
+import io
+import contextlib
+import numpy as np
+import simpy
+from typing import Dict, List
+from util import *
+from ML import *
+import collective
+from wafer_device import Wafer_Device, Packet
+from comp_graph import CompGraph
+import model_map as mp
+import pipeline_copy as pipe
+from pipe_eval import pipe_eval
+
+# NOTE: swept hardware parameters
+# bandwidths only scale transfer times, so configs that share the tile parameters
+# share one mapping and are evaluated together as arrays
+BW_PARAM = ("tile_intra_noc_bw_GB", "tile_inter_noc_bw_GB", "tile_dram_bw_GB")
+TILE_PARAM = ("macs", "sram_capacity_MB")
+
+
+# wd with the ring order of one group fixed, to build its ring schedules for one candidate
+# the collective profiles depend on the order, so they are kept apart from wd
+class _RingOrder:
+    def __init__(self, wd: Wafer_Device, group_id: List[int], order: List[int]) -> None:
+        self.wd = wd
+        self.group_id = list(group_id)
+        self.order = order
+        self.comm_profile_table = {}
+
+    def __getattr__(self, name):
+        return getattr(self.wd, name)
+
+    def ring_order(self, group_id: List[int], max_pass=8):
+        return (
+            self.order
+            if list(group_id) == self.group_id
+            else self.wd.ring_order(group_id)
+        )
+
+
+class BatchCost:
+    """
+    analytical time of Wafer_Device for N configs at once, bandwidths are arrays of shape (N,)
+    the *_time methods of Wafer_Device and collective.estimate run on wd.batch_view;
+    here only what picks one of several choices per config: the ring order and the
+    collective algorithm; routes, edge DRAM controllers and schedules come from wd
+    """
+
+    def __init__(self, wd: Wafer_Device, intra_bw, inter_bw, tile_dram_bw) -> None:
+        self.wd = wd
+        self.bw = np.broadcast_arrays(
+            *[np.asarray(b, float) for b in (intra_bw, inter_bw, tile_dram_bw)]
+        )
+        self.view = wd.batch_view(*self.bw)
+        self.ring_table = {}
+        self.order_table = {}
+        # one scalar view per config for StreamSchedules without array bandwidths
+        self.config_views = None
+
+    # NOTE: Wafer_Device.ring_order per config: least ring_cost of the candidates
+    # return candidates and the index of the chosen one per config
+    def ring_choice(self, group_id: List[int]):
+        key = tuple(group_id)
+        choice = self.ring_table.get(key)
+        if choice is None:
+            orders = self.wd.ring_candidates(group_id)
+            cost = [self.view.ring_cost(o) for o in orders]
+            step_ms = np.array([np.broadcast_to(c[0], self.bw[0].shape) for c in cost])
+            hops = np.array([c[1] for c in cost], dtype=float)
+            # lexsort is stable, ties keep the first candidate like min()
+            index = np.lexsort(
+                (np.broadcast_to(hops[:, None], step_ms.shape), step_ms), axis=0
+            )[0]
+            choice = (orders, index)
+            self.ring_table[key] = choice
+        return choice
+
+    def estimate(self, comm_type, algo, group_id: List[int], size):
+        if not self.wd.ring_reorder:
+            return self.__estimate(comm_type, algo, group_id, size)
+        orders, index = self.ring_choice(group_id)
+        time_ms = None
+        for c in np.unique(index):
+            part_ms = self.__estimate(comm_type, algo, group_id, size, orders[c], c)
+            if part_ms is None:
+                return None
+            time_ms = (
+                part_ms if time_ms is None else np.where(index == c, part_ms, time_ms)
+            )
+        return time_ms
+
+    # wd (view of all configs, or of config k) with the ring order of candidate c
+    def __ordered(self, group_id: List[int], order, c, k=None):
+        if order is None:
+            return self.view if k is None else self.config_views[k]
+        key = (tuple(group_id), c, k)
+        wd = self.order_table.get(key)
+        if wd is None:
+            base = self.view if k is None else self.config_views[k]
+            wd = _RingOrder(base, group_id, order)
+            self.order_table[key] = wd
+        return wd
+
+    def __estimate(self, comm_type, algo, group_id: List[int], size, order=None, c=0):
+        wd = self.__ordered(group_id, order, c)
+        profile = collective.comm_profile(wd, comm_type, algo, group_id)
+        if isinstance(profile, collective.StreamSchedule) and not profile.array_bw:
+            if self.config_views is None:
+                self.config_views = [self.wd.batch_view(*bw) for bw in zip(*self.bw)]
+            return np.array(
+                [
+                    collective.estimate(
+                        self.__ordered(group_id, order, c, k),
+                        comm_type,
+                        algo,
+                        group_id,
+                        size,
+                    )
+                    for k in range(len(self.config_views))
+                ],
+                dtype=float,
+            )
+        return collective.estimate(wd, comm_type, algo, group_id, size)
+
+    # collective.select per config: forced algo if it applies, otherwise the least estimate
+    def collective_time(self, comm_type, comm_size, group_id: List[int], algo=None):
+        if comm_type == COMM.NONE or len(group_id) < 2:
+            return 0
+        algo = algo or self.wd.comm_algo
+        algos = collective.ALGO[comm_type]
+        if algo in algos:
+            time_ms = self.estimate(comm_type, algo, group_id, comm_size)
+            if time_ms is not None:
+                return time_ms
+        best = None
+        for name in algos:
+            time_ms = self.estimate(comm_type, name, group_id, comm_size)
+            if time_ms is not None:
+                best = time_ms if best is None else np.minimum(best, time_ms)
+        return best
+
+    # NOTE: one plan step of Tile.compile_plan, as its analytical process would take
+    def step_time(self, step):
+        kind, size, task_id, group = step
+        if kind == plan_step.edge_read:
+            return self.view.dram_read_group_time(size, group, multicast=False)
+        elif kind == plan_step.edge_write:
+            return self.view.dram_write_group_time(size, group, gather=True)
+        elif kind in (plan_step.tile_read, plan_step.tile_write):
+            return self.view.tile_dram_time(size)
+        elif kind == plan_step.comp:
+            return size
+        time_ms = 0
+        for comm_type, gp in group:
+            time_ms = time_ms + self.collective_time(comm_type, size, gp)
+        return time_ms
+
+    # phase of one stage: parallel steps, then the trailing comm, op after op
+    def plan_time(self, op_plans):
+        time_ms = np.zeros_like(self.bw[0])
+        for op_plan in op_plans:
+            for steps, comm in op_plan:
+                step_ms = 0
+                for step in steps:
+                    step_ms = np.maximum(step_ms, self.step_time(step))
+                time_ms = time_ms + step_ms
+                if comm is not None:
+                    time_ms = time_ms + self.step_time(comm)
+        return time_ms
+
+
+def hw_grid(**axes):
+    """
+    full grid of the given hardware parameter axes, flattened to arrays of equal length
+    """
+    names = list(axes)
+    grid = np.meshgrid(*[np.asarray(axes[k], float) for k in names], indexing="ij")
+    return {k: g.ravel() for k, g in zip(names, grid)}
+
+
+def design_space(
+    network_name,
+    hw: Dict[str, np.ndarray],
+    wafer_config: dict,
+    tile_config: dict,
+    micro_batch=1,
+    strategy=pipe_strategy.GPipe,
+    train=True,
+):
+    """
+    analytical throughput of every config in hw, keys of hw: BW_PARAM & TILE_PARAM
+    the other parameters come from wafer_config & tile_config as in wafer_sim_main.py
+    1. configs with the same TILE_PARAM share one Wafer_Device, mapping & compiled plans
+    2. phase & stage pass latency of every stage from the plans, for all their bandwidths at once
+    3. full-length pipeline timeline by pipe_eval, no boost
+    the ring order and the collective schedules are built with the bandwidth of wafer_config
+    return a table: {parameter or result: array}, days & throughput (sample/s)
+    """
+    names = [k for k in BW_PARAM + TILE_PARAM if k in hw]
+    assert len(names) == len(hw), "unknown parameter in {}".format(list(hw))
+    table = dict(
+        zip(names, np.broadcast_arrays(*[np.asarray(hw[k], float) for k in names]))
+    )
+    N = len(next(iter(table.values())))
+    bw = {
+        k: table[k] if k in table else np.full(N, float(wafer_config[k]))
+        for k in BW_PARAM
+    }
+    tile = {
+        k: table[k] if k in table else np.full(N, float(tile_config[k]))
+        for k in TILE_PARAM
+    }
+    end_ms = np.zeros(N)
+    mini_batch = 1
+    keys, inverse = np.unique(
+        np.stack([tile[k] for k in TILE_PARAM], axis=1), axis=0, return_inverse=True
+    )
+    for g, key in enumerate(keys):
+        idx = np.flatnonzero(inverse.ravel() == g)
+        tc = dict(tile_config, Analytical=True)
+        tc.update({k: type(tile_config[k])(v) for k, v in zip(TILE_PARAM, key)})
+        with contextlib.redirect_stdout(io.StringIO()):
+            env = simpy.Environment()
+            wd = Wafer_Device(env=env, **dict(wafer_config, Analytical=True))
+            model = CompGraph.gread(path="model", name=network_name)
+            stgs = getattr(mp, "mapping_" + network_name)(env, model, tc, wd)
+            p = pipe.Pipeline(
+                env=env,
+                mini_batch_size=model.batch_size,
+                micro_batch_size=micro_batch,
+                stages=stgs,
+                noc=wd,
+                pipe_type=strategy,
+                train=train,
+            )
+        mini_batch = model.batch_size
+        cost = BatchCost(
+            wd, bw[BW_PARAM[0]][idx], bw[BW_PARAM[1]][idx], bw[BW_PARAM[2]][idx]
+        )
+        zero = np.zeros(len(idx))
+        lat = {"fd": [], "bd": [], "up": [], "fd_pass": [], "bd_pass": []}
+        for stg in stgs:
+            has_next = stg.next_core_id != None and stg.next_core_id != []
+            lat["fd"].append(cost.plan_time(stg.tile.plan["forward"]))
+            lat["fd_pass"].append(
+                cost.view.STAGE_PASS_time(
+                    Packet("", stg.o_shape).size, stg.cur_core_id, stg.next_core_id
+                )
+                if has_next
+                else zero
+            )
+            if train:
+                lat["bd"].append(cost.plan_time(stg.tile.plan["backward"]))
+                lat["up"].append(cost.plan_time(stg.tile.plan["update"]))
+                lat["bd_pass"].append(
+                    cost.view.STAGE_PASS_time(
+                        Packet("", stg.i_shape).size, stg.cur_core_id, stg.next_core_id
+                    )
+                    if has_next
+                    else zero
+                )
+        # input fetch of Pipeline.start, i_shape in FP16
+        fetch_ms = cost.view.dram_read_group_time(
+            mulc(stgs[0].i_shape) / 1000 / 1000 * 2, stgs[0].cur_core_id, multicast=True
+        )
+        lat = {
+            k: np.array(v).reshape(len(stgs), len(idx)) if v != [] else None
+            for k, v in lat.items()
+        }
+        _, end, _, _ = pipe_eval(
+            lat["fd"],
+            lat["bd"],
+            lat["up"],
+            p.micro_batch_num,
+            strategy,
+            train,
+            fd_pass_ms=lat["fd_pass"],
+            bd_pass_ms=lat["bd_pass"],
+            fetch_ms=np.broadcast_to(fetch_ms, idx.shape),
+        )
+        end_ms[idx] = end.max(axis=(0, 1))
+    table.update({k: tile[k] for k in TILE_PARAM})
+    table.update({k: bw[k] for k in BW_PARAM})
+    table["days"] = end_ms / 1000 / 60 / 60 / 24
+    table["throughput"] = mini_batch / (end_ms / 1000)
+    return table
+
+
+if __name__ == "__main__":
+    wafer_config = {
+        "wafer_name": "test",
+        "tile_inter_shape": [5, 4],
+        "tile_intra_shape": [4, 4],
+        "tile_intra_noc_bw_GB": 1024 * 2,
+        "tile_inter_noc_bw_GB": 100 * 2,
+        "tile_dram_bw_GB": 25.6 * 32 / 16,
+        "tile_dram_capacity_GB": 48 / 16,
+        "edge_die_dram_bw_GB": 25.6,
+        "clk_freq_GHz": 1,
+        "with_dram_per_tile": True,
+    }
+    tile_config = {
+        "tile_name": "test",
+        "sram_capacity_MB": 3,
+        "macs": 8000,
+        "freq_GHz": 1,
+        "with_dram": True,
+        "opt": OPTIMIZER.ADAM,
+        "ZeRO": ZeRO_strategy.ZeRO_3,
+    }
+    hw = hw_grid(
+        tile_intra_noc_bw_GB=[512, 1024, 2048, 4096],
+        tile_inter_noc_bw_GB=[50, 100, 200, 400],
+        tile_dram_bw_GB=[25.6, 51.2, 102.4],
+        macs=[4000, 8000],
+    )
+    table = design_space("BERT_LARGE", hw, wafer_config, tile_config)
+    print(" ".join("{:>12}".format(k[:12]) for k in table))
+    for i in np.argsort(-table["throughput"])[:10]:
+        print(" ".join("{:>12.6g}".format(table[k][i]) for k in table))
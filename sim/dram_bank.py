@@ -0,0 +1,165 @@
+import simpy
+from monitored_resource import ResourceMonitor
+from noc_flow import FlowNoC
+
+
+# NOTE: closed-form access time of an idle DRAM, shared by analytical mode
+# ctrl latency + row activation (miss) + data / bw of the channels it is striped over
+# unit: ms, MB, GB/s == MB/ms
+def dram_access_time(
+    access_size_MB, bw_GB, ctrl_latency_ms=0, row_miss_ns=0, channels=1, stripe_KB=4
+):
+    stripes = max(1, -int(-access_size_MB * 1000 // stripe_KB))
+    bw_GB = bw_GB * min(channels, stripes) / channels
+    return ctrl_latency_ms + row_miss_ns / 1e6 + access_size_MB / bw_GB
+
+
+class BankedDRAM:
+    """
+    DRAM of channels x banks per channel
+    1. an access is striped over channels in stripe_KB units, round robin from the next channel
+    2. concurrent accesses share the bandwidth of a channel (max-min fair fluid model, see FlowNoC)
+    3. each touched channel pays row activation: hit if the bank still holds the row of the
+       same stream (task_id & direction), miss otherwise; plus turnaround if the channel
+       switches between read and write
+    4. a stream maps to one bank per channel by its key
+    idle time of one access is dram_access_time with the same parameters
+    """
+
+    def __init__(
+        self,
+        name,
+        env,
+        bw_GB,
+        capacity_GB,
+        channels=1,
+        banks=8,
+        stripe_KB=4,
+        ctrl_latency_ms=0,
+        row_hit_ns=0,
+        row_miss_ns=0,
+        turnaround_ns=0,
+        monitor=True,
+    ) -> None:
+        self.name = name
+        self.env = env
+        self.bw_GB = bw_GB
+        self.capacity = capacity_GB
+        self.channels = channels
+        self.banks = banks
+        self.stripe_KB = stripe_KB
+        self.ctrl_latency_ms = ctrl_latency_ms
+        self.row_miss_ns = row_miss_ns
+        self.row_hit_ms = row_hit_ns / 1e6
+        self.row_miss_ms = row_miss_ns / 1e6
+        self.turnaround_ms = turnaround_ns / 1e6
+        # open row (stream key) of each bank, last direction of each channel
+        self.open_row = [[None] * banks for _ in range(channels)]
+        self.stream_bank = {}
+        self.last_write = [None] * channels
+        self.next_channel = 0
+        self.active = 0
+        # data of accesses issued and not finished yet
+        self.load_MB = 0
+        # statistics
+        self.row_hits = 0
+        self.row_misses = 0
+        self.turnarounds = 0
+        self.monitor = ResourceMonitor() if monitor else None
+        self.channel_bus = (
+            FlowNoC(env, lambda _: self.bw_GB / self.channels) if env else None
+        )
+
+    def access_time(self, access_size_MB):
+        return dram_access_time(
+            access_size_MB,
+            self.bw_GB,
+            self.ctrl_latency_ms,
+            self.row_miss_ns,
+            self.channels,
+            self.stripe_KB,
+        )
+
+    def __channels(self, access_size_MB):
+        stripes = max(1, -int(-access_size_MB * 1000 // self.stripe_KB))
+        n = min(self.channels, stripes)
+        first = self.next_channel
+        self.next_channel = (first + n) % self.channels
+        return [(first + i) % self.channels for i in range(n)]
+
+    # row activation & turnaround of each touched channel, return the slowest one
+    def __activate(self, channels, stream, write):
+        # streams take banks round robin in order of first access, so runs are repeatable
+        bank = self.stream_bank.setdefault(stream, len(self.stream_bank) % self.banks)
+        overhead = 0
+        for c in channels:
+            t = 0
+            if self.open_row[c][bank] == stream:
+                self.row_hits += 1
+                t += self.row_hit_ms
+            else:
+                self.row_misses += 1
+                t += self.row_miss_ms
+                self.open_row[c][bank] = stream
+            if self.last_write[c] is not None and self.last_write[c] != write:
+                self.turnarounds += 1
+                t += self.turnaround_ms
+            self.last_write[c] = write
+            overhead = max(overhead, t)
+        return overhead
+
+    def access_process(self, data_size_MB, task_id=1, write=True, DEBUG_MODE=False):
+        t_start = self.env.now
+        channels = self.__channels(data_size_MB)
+        if self.monitor is not None:
+            self.monitor.request(t_start, self.active)
+        self.active += 1
+        self.load_MB += data_size_MB
+        overhead = self.ctrl_latency_ms + self.__activate(channels, (task_id, write), write)
+        yield self.env.timeout(overhead)
+        share = data_size_MB / len(channels)
+        yield simpy.AllOf(
+            self.env, [self.channel_bus.transfer(share, [c]) for c in channels]
+        )
+        self.active -= 1
+        self.load_MB -= data_size_MB
+        if self.monitor is not None:
+            # busy: bandwidth-equivalent time, wait: slowdown by other accesses
+            alone_ms = share * self.channels / self.bw_GB
+            self.monitor.grant(t_start + overhead + alone_ms, self.env.now)
+            self.monitor.release(
+                t_start, self.env.now, data_size_MB, data_size_MB / self.bw_GB
+            )
+
+    def __str__(self):
+        return "{}:(bw:{} GB/s,channels:{},banks:{},row hit/miss:{}/{},turnaround:{})".format(
+            self.name,
+            self.bw_GB,
+            self.channels,
+            self.banks,
+            self.row_hits,
+            self.row_misses,
+            self.turnarounds,
+        )
+
+
+if __name__ == "__main__":
+    # two streams share 4 channels, the third access turns the channels around
+    env = simpy.Environment()
+    dram = BankedDRAM(
+        "test", env, 100, 16, channels=4, row_hit_ns=15, row_miss_ns=45, turnaround_ns=10
+    )
+
+    def one_access(name, size, task_id, write):
+        t = env.now
+        yield env.process(dram.access_process(size, task_id, write))
+        print("{} end with {:.6f} ms".format(name, env.now - t))
+
+    env.process(one_access("a0", 100, "a", False))
+    env.process(one_access("a1", 100, "b", False))
+    env.run()
+    env.process(one_access("a2", 100, "a", True))
+    env.process(one_access("a3", 100, "a", False))
+    env.run()
+    print(dram)
+    print("idle access {:.6f} ms".format(dram.access_time(100)))
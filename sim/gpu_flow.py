@@ -77,24 +77,12 @@ class GPU():# for compute process
             with (self.cm_worker.request() if overlap else self.cp_worker.request()) as req:
                     yield req       
                     for gp in comm_op.device_group:
-                        if comm_op.type==COMM.ALL_REDUCE:
-                            yield wd1.env.process(wd1.ALL_2_ALL_process(comm_mbytes,gp,traffic_tpye))
-                        elif comm_op.type==COMM.ALL_2_ALL:
-                            yield wd1.env.process(wd1.ALL_REDUCE_process(comm_mbytes,gp,traffic_tpye))
-                        elif comm_op.type==COMM.NONE:
-                            pass
-                        else:
-                            pass
+                        for comm_type in comm_op.primitives():
+                            yield wd1.env.process(wd1.collective_process(comm_type,comm_mbytes,gp,traffic_tpye))
         else:
             for gp in comm_op.device_group:
-                if comm_op.type==COMM.ALL_REDUCE:
-                    yield wd1.env.process(wd1.ALL_2_ALL_process(comm_mbytes,gp,traffic_tpye))
-                elif comm_op.type==COMM.ALL_2_ALL:
-                    yield wd1.env.process(wd1.ALL_REDUCE_process(comm_mbytes,gp,traffic_tpye))
-                elif comm_op.type==COMM.NONE:
-                    pass
-                else:
-                    pass
+                for comm_type in comm_op.primitives():
+                    yield wd1.env.process(wd1.collective_process(comm_type,comm_mbytes,gp,traffic_tpye))
     def mapping_analysis(self,stage_info,device:List[int],op_list:List[OpNode],wd1:wd,train:bool):
         #init 
         #device_gp=device
@@ -1,19 +1,212 @@
 import simpy
+import numpy as np
 from functools import partial, wraps
 
+
+class ResourceMonitor:
+    """
+    streaming counters of one resource in fixed width time bins (numpy arrays)
+    per bin: busy time, bytes, waiting time, max queue depth
+    once more than max_bins bins are needed, neighbour bins are merged and bin width doubles,
+    so memory is bounded whatever the simulated time is
+    """
+
+    def __init__(self, bin_ms=1.0, max_bins=4096) -> None:
+        assert max_bins % 2 == 0
+        self.bin_ms = bin_ms
+        self.max_bins = max_bins
+        size = min(64, max_bins)
+        self.busy_ms = np.zeros(size)
+        self.bytes_MB = np.zeros(size)
+        self.wait_ms = np.zeros(size)
+        self.queue_len = np.zeros(size, dtype=np.int64)
+        self.bin_num = 0
+        # totals
+        self.req_cnt = 0
+        self.tot_busy_ms = 0
+        self.tot_bytes_MB = 0
+        self.tot_wait_ms = 0
+        self.max_queue_len = 0
+
+    def __arrays(self):
+        return (self.busy_ms, self.bytes_MB, self.wait_ms, self.queue_len)
+
+    def __coalesce(self):
+        self.busy_ms, self.bytes_MB, self.wait_ms = (
+            np.pad(a.reshape(-1, 2).sum(1), (0, len(a) // 2))
+            for a in (self.busy_ms, self.bytes_MB, self.wait_ms)
+        )
+        q = self.queue_len.reshape(-1, 2).max(1)
+        self.queue_len = np.pad(q, (0, len(q)))
+        self.bin_ms *= 2
+        self.bin_num = (self.bin_num + 1) // 2
+
+    def __grow(self, t):
+        index = int(t / self.bin_ms)
+        while index >= self.max_bins:
+            self.__coalesce()
+            index = int(t / self.bin_ms)
+        size = len(self.busy_ms)
+        while index >= size:
+            size *= 2
+        self.busy_ms, self.bytes_MB, self.wait_ms, self.queue_len = (
+            np.pad(a, (0, size - len(a))) for a in self.__arrays()
+        )
+        return index
+
+    def __bin(self, t):
+        index = int(t / self.bin_ms)
+        if index >= len(self.busy_ms):
+            index = self.__grow(t)
+        if index >= self.bin_num:
+            self.bin_num = index + 1
+        return index
+
+    # spread total over [t0,t1) in proportion to the overlap with each bin b0..b1
+    def __spread(self, arr, b0, b1, t0, t1, total):
+        rate = total / (t1 - t0)
+        arr[b0] += rate * ((b0 + 1) * self.bin_ms - t0)
+        arr[b0 + 1 : b1] += rate * self.bin_ms
+        arr[b1] += rate * (t1 - b1 * self.bin_ms)
+
+    def request(self, now, queue_len):
+        self.req_cnt += 1
+        if queue_len > 0:
+            b = self.__bin(now)
+            if queue_len > self.queue_len[b]:
+                self.queue_len[b] = queue_len
+            if queue_len > self.max_queue_len:
+                self.max_queue_len = queue_len
+
+    def grant(self, req_t, now):
+        if now <= req_t:
+            return
+        wait = now - req_t
+        self.tot_wait_ms += wait
+        # later bin first, growing may merge bins
+        b1 = self.__bin(now)
+        b0 = self.__bin(req_t)
+        if b0 == b1:
+            self.wait_ms[b0] += wait
+        else:
+            self.__spread(self.wait_ms, b0, b1, req_t, now, wait)
+
+    # busy_ms: occupancy if it is not the whole [start,now), e.g. a shared resource
+    def release(self, start, now, size_MB=0, busy_ms=None):
+        busy = now - start if busy_ms is None else busy_ms
+        self.tot_busy_ms += busy
+        self.tot_bytes_MB += size_MB
+        b1 = self.__bin(now)
+        b0 = self.__bin(start)
+        if b0 == b1:
+            self.busy_ms[b0] += busy
+            self.bytes_MB[b0] += size_MB
+        else:
+            self.__spread(self.busy_ms, b0, b1, start, now, busy)
+            self.__spread(self.bytes_MB, b0, b1, start, now, size_MB)
+
+    # bin start time and busy ratio of each used bin
+    def utilization(self):
+        n = self.bin_num
+        return np.arange(n) * self.bin_ms, self.busy_ms[:n] / self.bin_ms
+
+    def summary(self):
+        return {
+            "req_cnt": self.req_cnt,
+            "busy_ms": self.tot_busy_ms,
+            "bytes_MB": self.tot_bytes_MB,
+            "wait_ms": self.tot_wait_ms,
+            "max_queue_len": self.max_queue_len,
+        }
+
+    def __str__(self):
+        return "ResourceMonitor:(req:{},busy:{:.3f} ms,bytes:{:.3f} MB,wait:{:.3f} ms,max_queue:{},bin:{} ms)".format(
+            self.req_cnt,
+            self.tot_busy_ms,
+            self.tot_bytes_MB,
+            self.tot_wait_ms,
+            self.max_queue_len,
+            self.bin_ms,
+        )
+
+
 class MonitoredResource(simpy.Resource):
-    def __init__(self, *args, **kwargs):
+    # monitor=False: plain simpy.Resource, nothing is recorded
+    def __init__(self, *args, monitor=True, bin_ms=1.0, max_bins=4096, **kwargs):
         super().__init__(*args, **kwargs)
-        self.data = []
+        self.monitor = ResourceMonitor(bin_ms, max_bins) if monitor else None
+
+    def request(self, *args, size_MB=0, **kwargs):
+        req = super().request(*args, **kwargs)
+        if self.monitor is not None:
+            req.size_MB = size_MB
+            if not req.triggered:
+                req.req_t = self._env.now
+            self.monitor.request(self._env.now, len(self.queue))
+        return req
+
+    def _do_put(self, event):
+        super()._do_put(event)
+        if self.monitor is not None and event.triggered and hasattr(event, "req_t"):
+            self.monitor.grant(event.req_t, self._env.now)
+
+    def release(self, request, *args, **kwargs):
+        # NOTE: a request released before it is granted (cancel/interrupt) has no usage
+        if (
+            self.monitor is not None
+            and getattr(request, "usage_since", None) is not None
+        ):
+            self.monitor.release(
+                request.usage_since, self._env.now, getattr(request, "size_MB", 0)
+            )
+        return super().release(request, *args, **kwargs)
+
+
+class LazyResourceList:
+    """
+    fixed length list of resources, item i is built by factory(i) on first access,
+    only touched items are stored (sparse index -> resource)
+    """
+
+    def __init__(self, length, factory):
+        self._len = length
+        self._factory = factory
+        self._items = {}
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("resource index {} out of range".format(index))
+        res = self._items.get(index)
+        if res is None:
+            res = self._factory(index)
+            self._items[index] = res
+        return res
+
+    def __iter__(self):
+        for index in range(self._len):
+            yield self[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyResourceList)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    # (index, resource) of created resources only
+    def items(self):
+        return sorted(self._items.items())
 
-    def request(self, *args, **kwargs):
-        self.data.append(('req',self._env.now))
-        return super().request(*args, **kwargs)
+    def created_num(self):
+        return len(self._items)
 
-    def release(self, *args, **kwargs):
-        self.data.append(('res',self._env.now))
-        return super().release(*args, **kwargs)
-    
 def patch_resource(resource, pre=None, post=None):
     """Patch *resource* so that it calls the callable *pre* before each
     put/get/request/release operation and the callable *post* after each
@@ -0,0 +1,152 @@
+import heapq
+import simpy
+from typing import Callable, Dict, List
+
+
+class Flow:
+    def __init__(self, size_MB, links, done) -> None:
+        self.size = size_MB
+        self.remaining = size_MB
+        self.links = links
+        self.rate = 0
+        self.done = done
+
+    def __str__(self):
+        return "Flow:(size:{} MByte,remaining:{:.6f},links:{},rate:{:.3f})".format(
+            self.size, self.remaining, list(self.links), self.rate
+        )
+
+
+class FlowNoC:
+    """
+    fluid NoC model: each active flow gets a max-min fair share of every link on its path
+    rates are recomputed only when one flow starts or finishes (once per time step),
+    so one transfer costs one SimPy event instead of one request per hop
+    link bandwidth unit: GB/s == MB/ms
+    """
+
+    def __init__(self, env, link_bw: Callable[[int], float], eps=1e-9) -> None:
+        self.env = env
+        self.link_bw = link_bw
+        self.eps = eps
+        self.flows: List[Flow] = []
+        self.last_t = env.now
+        self.__wake_id = 0
+        self.__dirty = False
+        self.__bw_table: Dict[int, float] = {}
+        # statistics
+        self.flow_cnt = 0
+        self.realloc_cnt = 0
+
+    def transfer(self, size_MB, links):
+        done = self.env.event()
+        if size_MB <= 0 or len(links) == 0:
+            done.succeed()
+            return done
+        self.__advance()
+        self.flows.append(Flow(size_MB, links, done))
+        self.flow_cnt += 1
+        # flows started at the same time share one reallocation
+        if not self.__dirty:
+            self.__dirty = True
+            self.__wake_id += 1
+            update = self.env.timeout(0)
+            update.callbacks.append(lambda _: self.__update())
+        return done
+
+    def __update(self):
+        self.__dirty = False
+        self.__advance()
+        finish = [f for f in self.flows if self.__finished(f)]
+        if finish != []:
+            self.flows = [f for f in self.flows if not self.__finished(f)]
+            for f in finish:
+                f.done.succeed()
+        if self.flows != []:
+            self.__reallocate()
+            self.__schedule()
+
+    # NOTE: besides the relative eps, a flow is finished once its time left is below the
+    # float spacing of env.now, otherwise the wakeup never advances time and it never drains
+    def __finished(self, f: Flow):
+        if f.remaining <= self.eps * f.size:
+            return True
+        return f.rate > 0 and self.env.now + f.remaining / f.rate <= self.env.now
+
+    def __bw(self, link_id):
+        bw = self.__bw_table.get(link_id)
+        if bw is None:
+            bw = self.link_bw(link_id)
+            self.__bw_table[link_id] = bw
+        return bw
+
+    def __advance(self):
+        dt = self.env.now - self.last_t
+        if dt > 0:
+            for f in self.flows:
+                f.remaining -= f.rate * dt
+        self.last_t = self.env.now
+
+    # NOTE: progressive filling, freeze flows on the most loaded link first
+    def __reallocate(self):
+        self.realloc_cnt += 1
+        residual = {}
+        link_flows = {}
+        for f in self.flows:
+            for l in f.links:
+                if l not in link_flows:
+                    link_flows[l] = []
+                    residual[l] = self.__bw(l)
+                link_flows[l].append(f)
+        unfrozen = {l: len(fs) for l, fs in link_flows.items()}
+        heap = [(residual[l] / n, l) for l, n in unfrozen.items()]
+        heapq.heapify(heap)
+        frozen = set()
+        while heap:
+            share, bottleneck = heapq.heappop(heap)
+            n = unfrozen[bottleneck]
+            if n == 0:
+                continue
+            # lazy heap, re-push the link if its share is out of date
+            cur_share = residual[bottleneck] / n
+            if cur_share > share:
+                heapq.heappush(heap, (cur_share, bottleneck))
+                continue
+            for f in link_flows[bottleneck]:
+                if f in frozen:
+                    continue
+                f.rate = cur_share
+                frozen.add(f)
+                for l in f.links:
+                    residual[l] -= cur_share
+                    unfrozen[l] -= 1
+
+    def __schedule(self):
+        if self.flows == []:
+            return
+        t_next = min(f.remaining / f.rate for f in self.flows)
+        self.__wake_id += 1
+        wake = self.env.timeout(max(t_next, 0))
+        wake.callbacks.append(lambda _, wake_id=self.__wake_id: self.__wake(wake_id))
+
+    def __wake(self, wake_id):
+        # stale wakeup, rates changed after it was scheduled
+        if wake_id != self.__wake_id or self.__dirty:
+            return
+        self.__update()
+
+
+if __name__ == "__main__":
+    # two flows share link 1, third flow is alone on link 2
+    env = simpy.Environment()
+    noc = FlowNoC(env, lambda link_id: 100)
+
+    def one_flow(name, size, links):
+        t = env.now
+        yield noc.transfer(size, links)
+        print("{} end with {:.3f} ms".format(name, env.now - t))
+
+    env.process(one_flow("f0", 100, [0, 1]))
+    env.process(one_flow("f1", 100, [1]))
+    env.process(one_flow("f2", 100, [2]))
+    env.run()
@@ -0,0 +1,113 @@
+from bisect import bisect_right
+from typing import Callable, Dict, List
+
+
+class LinkCalendar:
+    """
+    busy intervals [start,end) of one link, sorted and non-overlapping
+    """
+
+    def __init__(self) -> None:
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    # earliest start >= t so that [start,start+duration) is free, gap in the middle is allowed
+    def earliest(self, t, duration):
+        idx = bisect_right(self.ends, t)
+        while idx < len(self.starts) and self.starts[idx] < t + duration:
+            t = max(t, self.ends[idx])
+            idx += 1
+        return t, idx
+
+    def insert(self, idx, start, end):
+        # merge with the neighbour if they touch, keeps the calendar short
+        if idx > 0 and self.ends[idx - 1] == start:
+            self.ends[idx - 1] = end
+            if idx < len(self.starts) and self.starts[idx] == end:
+                self.ends[idx - 1] = self.ends[idx]
+                del self.starts[idx]
+                del self.ends[idx]
+        elif idx < len(self.starts) and self.starts[idx] == end:
+            self.starts[idx] = start
+        else:
+            self.starts.insert(idx, start)
+            self.ends.insert(idx, end)
+
+    def prune(self, now):
+        idx = bisect_right(self.ends, now)
+        if idx > 0:
+            del self.starts[:idx]
+            del self.ends[:idx]
+
+
+class ReservationNoC:
+    """
+    link reservation table: a transfer books a store-and-forward window on every hop
+    of its path when it is issued, so one transfer costs one SimPy timeout
+    hop i starts after hop i-1 ends and after the link is free, first hop adds size/bw
+    link bandwidth unit: GB/s == MB/ms
+    """
+
+    def __init__(
+        self, link_bw: Callable[[int], float], latency_ms, prune_len=64
+    ) -> None:
+        self.link_bw = link_bw
+        self.latency_ms = latency_ms
+        self.prune_len = prune_len
+        self.calendar: Dict[int, LinkCalendar] = {}
+        # statistics
+        self.transfer_cnt = 0
+
+    def __link(self, link_id):
+        cal = self.calendar.get(link_id)
+        if cal is None:
+            cal = LinkCalendar()
+            self.calendar[link_id] = cal
+        return cal
+
+    # book link_id for duration from t on, return the end of the window
+    def __book(self, link_id, now, t, duration):
+        cal = self.__link(link_id)
+        if len(cal) > self.prune_len:
+            cal.prune(now)
+        start, idx = cal.earliest(t, duration)
+        cal.insert(idx, start, start + duration)
+        return start + duration
+
+    # return the finish time of the transfer
+    def reserve(self, now, size_MB, links):
+        self.transfer_cnt += 1
+        t = now
+        first_hop = True
+        for l in links:
+            duration = self.latency_ms
+            if first_hop:
+                duration += size_MB / self.link_bw(l)
+                first_hop = False
+            t = self.__book(l, now, t, duration)
+        return t
+
+    # multicast tree {link: parent link}, parents first, a link starts after its parent ends
+    def reserve_tree(self, now, size_MB, parent):
+        self.transfer_cnt += 1
+        end = {}
+        for l, p in parent.items():
+            if p is None:
+                end[l] = self.__book(
+                    l, now, now, self.latency_ms + size_MB / self.link_bw(l)
+                )
+            else:
+                end[l] = self.__book(l, now, end[p], self.latency_ms)
+        return max(end.values(), default=now)
+
+
+if __name__ == "__main__":
+    # t0 reaches link 1 after its first hop, t1 fills the gap on link 1 before that
+    # t2 shares link 0 with t0 and waits for its window
+    noc = ReservationNoC(lambda link_id: 100, latency_ms=0.001)
+    print("t0 end @ {:.3f} ms".format(noc.reserve(0, 100, [0, 1])))
+    print("t1 end @ {:.3f} ms".format(noc.reserve(0, 100, [1])))
+    print("t2 end @ {:.3f} ms".format(noc.reserve(0, 100, [0])))
@@ -1,6 +1,6 @@
 from ML import *
 from util import *
-from typing import List,Optional,Union
+from typing import List,Optional,Tuple,Union
 import numpy as np
 import math
 class CompOp():
@@ -10,6 +10,8 @@ class CompOp():
         self.param_dim=op_param
         self.p_sgy=p_sgy
         self.ZeRO=ZeRO_strategy.none
+        #sequence parallelism for Transformer: model parallel all-reduce -> all-gather + reduce-scatter
+        self.seq_parallel=False
 
         self.o_shape=[]
         self.i_shape=[]
@@ -25,13 +27,49 @@ class CompOp():
         self.w_s_g_access_m=[]#[0,0,0]
         #compute power req
         self.fd_macs_m=0  
+        #gemm shapes per tile [SR,SC,T,num]: num gemms of (SR,T)*(T,SC), see Tile.compute_cycles
+        #forward, backward of input (dloss) and backward of weight (dW)
+        self.fd_gemm=[]
+        self.dloss_gemm=[]
+        self.dW_gemm=[]
         #communication req
         self.f_b_u_comm=[]#[0,0,0]
         self.ZeRO_comm=[]#[0,0]
         #self._analysis()
     def __str__(self):
         return '({},{})'.format(self.type,self.param_dim)
+    def _gemm_set(self,weight_gemm,act_gemm=[]):
+        '''
+        weight_gemm: activation(SR,T)*weight(T,SC), act_gemm: activation*activation
+        backward of C=A*B: dA=dC*B^T -> [SR,T,SC], dB=A^T*dC -> [T,SC,SR]
+        '''
+        weight_gemm=[[max(1,math.ceil(d)) for d in g[:3]]+[g[3]] for g in weight_gemm]
+        act_gemm=[[max(1,math.ceil(d)) for d in g[:3]]+[g[3]] for g in act_gemm]
+        self.fd_gemm=weight_gemm+act_gemm
+        self.dloss_gemm=[[SR,T,SC,num] for SR,SC,T,num in self.fd_gemm]+[[T,SC,SR,num] for SR,SC,T,num in act_gemm]
+        self.dW_gemm=[[T,SC,SR,num] for SR,SC,T,num in weight_gemm]
+    def _ZeRO_set(self,w_s_g):
+        '''
+        w_s_g: weight, optimizer state, gradient of one Nd replica
+        ZeRO-1 shards optimizer state over Nd, ZeRO-2 also gradient, ZeRO-3 also weight,
+        ZeRO_comm: forward & backward all-gather of the weight shards, only ZeRO-3 shards weight
+        '''
+        Nd=self.p_sgy[0] if self.p_sgy!=None else 1
+        if self.ZeRO==ZeRO_strategy.ZeRO_3:
+            zero_w_s_g=np.array([1/Nd,1/Nd,1/Nd])
+        elif self.ZeRO==ZeRO_strategy.ZeRO_2:
+            zero_w_s_g=np.array([1,1/Nd,1/Nd])
+        elif self.ZeRO==ZeRO_strategy.ZeRO_1:
+            zero_w_s_g=np.array([1,1/Nd,1])
+        else:
+            zero_w_s_g=np.array([1,1,1])
+        self.w_s_g_size_m=(np.array(w_s_g)*zero_w_s_g).tolist()#capacity req
+        self.w_s_g_access_m=(np.array(w_s_g)*zero_w_s_g).tolist()#bandwidth req
+        self.ZeRO_comm=[w_s_g[0],w_s_g[0]] if self.ZeRO==ZeRO_strategy.ZeRO_3 else [0,0]
     def _analysis(self):
+        self.fd_gemm=[]
+        self.dloss_gemm=[]
+        self.dW_gemm=[]
         if self.type==OP.Linear:
             #assert(len(self.param_dim)==4 and ( len(self.p_sgy)==4))#B,M,N,K
             [B,M,N,K]=self.param_dim
@@ -43,17 +81,17 @@ class CompOp():
             self.i_shape=[B//Nd,N//Nm_N,K//Nm_K] #[B,K,N]  
             #capacity req
             self.intra_act_size_m=0 
-            self.w_s_g_size_m=[(M*K+M)/Nm_M/Nm_N/Nm_K/self.unit_m,2*(M*K+M)/Nm_M/Nm_N/Nm_K/self.unit_m,(M*K+M)/Nm_M/Nm_N/Nm_K/self.unit_m]
+            w_s_g=[(M*K+M)/Nm_M/Nm_N/Nm_K/self.unit_m,2*(M*K+M)/Nm_M/Nm_N/Nm_K/self.unit_m,(M*K+M)/Nm_M/Nm_N/Nm_K/self.unit_m]
             #bandwidth req
             self.intra_act_access_m=0
-            self.w_s_g_access_m=self.w_s_g_size_m
+            self._ZeRO_set(w_s_g)
             #compute power req
             #TODO 
-            #assert(self.ZeRO==ZeRO_strategy.none)
             self.fd_macs_m=B*M*N*K/Nd/Nm_M/Nm_N/Nm_K/self.unit_m
+            #weight (M,K), input (K,N) per sample
+            self._gemm_set([[B*N/Nd/Nm_N,M/Nm_M,K/Nm_K,1]])
             #no sharding
             self.f_b_u_comm=[Nm_K*B*M*N/Nd/Nm_M/Nm_N/self.unit_m,Nm_M*B*K*N/Nd/Nm_K/Nm_N/self.unit_m,Nd*M*K/Nm_M/Nm_K/self.unit_m]
-            self.ZeRO_comm=[0,0]
         elif self.type==OP.Conv2:#TODO
             #assert(len(self.param_dim)==7 and (len(self.p_sgy)==5))#B,C,H,W,R,S,K, 
             [B,C,H,W,R,S,K]=self.param_dim
@@ -68,16 +106,16 @@ class CompOp():
 
             #capacity req
             self.intra_act_size_m=0 
-            self.w_s_g_size_m=[(R*R*C/Nm_C+1)*K/Nm_K/self.unit_m,2*(R*R*C/Nm_C+1)*K/Nm_K/self.unit_m,(R*R*C/Nm_C+1)*K/Nm_K/self.unit_m]
+            w_s_g=[(R*R*C/Nm_C+1)*K/Nm_K/self.unit_m,2*(R*R*C/Nm_C+1)*K/Nm_K/self.unit_m,(R*R*C/Nm_C+1)*K/Nm_K/self.unit_m]
             #bandwidth req
             self.intra_act_access_m=0
-            self.w_s_g_access_m=self.w_s_g_size_m
+            self._ZeRO_set(w_s_g)
             #compute power req
             #TODO 
-            #assert(self.ZeRO==ZeRO_strategy.none)
             self.fd_macs_m=B/Nd*C/Nm_C*R*R*o_h*o_w*K/Nm_K/self.unit_m
+            #im2col: (output pixels, C*R*R)*(C*R*R,K)
+            self._gemm_set([[B/Nd*o_h*o_w,K/Nm_K,C/Nm_C*R*R,1]])
             self.f_b_u_comm=[Nm_C*B*K*o_h*o_w/Nd/Nm_K/self.unit_m,Nm_K*B*C*H*W/Nd/Nm_C/Nm_H/Nm_W/self.unit_m,Nd*R*S*C*K/Nm_C/Nm_K/self.unit_m]
-            self.ZeRO_comm=[0,0]
         elif self.type==OP.Pool:#TODO
             #assert(len(self.param_dim)==6 and ( len(self.p_sgy)==4))
             [B,C,H,W,R,S]=self.param_dim
@@ -140,35 +178,23 @@ class CompOp():
                  [Nd,Nm]=[1,1]
             self.o_shape=[B//Nd,S,H]
             self.i_shape=[B//Nd,S,H]  
-            w_s_g=np.array([12*H*H/Nm,3*12*H*H/Nm,12*H*H/Nm])/self.unit_m
-            zero_w_s_g=np.array([1,1,1])
-            w_s_g_access=np.array([12*H*H/Nm,3*12*H*H/Nm,12*H*H/Nm])/self.unit_m
-            zero_w_s_g_access=np.array([1,1,1])
-            self.ZeRO_comm=[0,0]
+            w_s_g=[12*H*H/Nm/self.unit_m,3*12*H*H/Nm/self.unit_m,12*H*H/Nm/self.unit_m]
             #reference:Wang huizheng's
-            if self.ZeRO==ZeRO_strategy.ZeRO_3:
-                zero_w_s_g_access=np.array([1/Nd,1/Nd,1/Nd])
-                zero_w_s_g=np.array([1/Nd,1/Nd,1/Nd])
-                self.ZeRO_comm=[2*12*H*H/Nm/self.unit_m,2*12*H*H/Nm/self.unit_m] #TODO
-            elif self.ZeRO==ZeRO_strategy.ZeRO_2:
-                zero_w_s_g_access=np.array([1,1/Nd,1/Nd])
-                zero_w_s_g=np.array([1,1/Nd,1/Nd])
-                self.ZeRO_comm=[2*12*H*H/Nm/self.unit_m,2*12*H*H/Nm/self.unit_m] #TODO
-            elif self.ZeRO==ZeRO_strategy.ZeRO_1:
-                zero_w_s_g_access=np.array([1,1/Nd,1])
-                zero_w_s_g=np.array([1,1/Nd,1])
-                self.ZeRO_comm=[2*12*H*H/Nm/self.unit_m,2*12*H*H/Nm/self.unit_m] #TODO
-            elif self.ZeRO==ZeRO_strategy.none:
-                zero_w_s_g_access=np.array([1,1,1])
-                zero_w_s_g=np.array([1,1,1])
-                self.ZeRO_comm=[0,0]
-            self.w_s_g_size_m=(w_s_g*zero_w_s_g).tolist()#capacity req
-            self.w_s_g_access_m=(w_s_g_access*zero_w_s_g_access).tolist()#bandwidth req
+            self._ZeRO_set(w_s_g)
             self.f_b_u_comm=[2*12*B*S*H/Nd/self.unit_m,2*12*B*S*H/Nd/self.unit_m,12*H*H/Nm/self.unit_m]
             #self.f_b_u_comm=[0,0,0]
-            self.intra_act_size_m=B*S*((15*H+2.5*A*S)/Nm+2*H)/Nd/self.unit_m
-            self.intra_act_access_m=((34*B*S*H+7*B*A*S*S)/Nm+4*B*S*H)/Nd/self.unit_m#bandwidth req
-            self.fd_macs_m=(24*B*S*H*H+4*B*S*S*H)/Nd/Nm/self.unit_m#compute power req
+            #sequence parallelism splits layernorm & dropout activation along S as well
+            Ns=Nm if self.seq_parallel else 1
+            self.intra_act_size_m=B*S*((15*H+2.5*A*S)/Nm+2*H/Ns)/Nd/self.unit_m
+            self.intra_act_access_m=((34*B*S*H+7*B*A*S*S)/Nm+4*B*S*H/Ns)/Nd/self.unit_m#bandwidth req
+            #MACs like the other ops (the FLOPs are 24BSH^2+4BS^2H), same as the sum of the gemms below
+            self.fd_macs_m=(12*B*S*H*H+2*B*S*S*H)/Nd/Nm/self.unit_m#compute power req
+            #heads split by Nm: QKV, projection, MLP up, MLP down, then scores & scores*V per head
+            tokens=B/Nd*S
+            heads=math.ceil(A/Nm)*B/Nd
+            self._gemm_set(
+                [[tokens,3*H/Nm,H,1],[tokens,H,H/Nm,1],[tokens,4*H/Nm,H,1],[tokens,H,4*H/Nm,1]],
+                [[S,S,H/A,heads],[S,H/A,S,heads]])
         else:
             #TODO
             self.o_shape=0 
@@ -178,15 +204,23 @@ class CompOp():
     def set_ZeRO(self,ZeRO):
         self.ZeRO=ZeRO
         self._analysis()
+    def set_seq_parallel(self,seq_parallel):
+        self.seq_parallel=seq_parallel
+        self._analysis()
 
 class CommOp():
-    def __init__(self,device_group:Optional[List[int]]=None,comm_type:COMM=COMM.NONE,comm_size=0) -> None:
+    #comm_type: one primitive, or a tuple of primitives run one after another on the same size
+    #e.g. (COMM.REDUCE_SCATTER,COMM.ALL_GATHER) for ZeRO-1/2 weight update
+    def __init__(self,device_group:Optional[List[int]]=None,comm_type:Union[COMM,Tuple[COMM,...]]=COMM.NONE,comm_size=0) -> None:
         self.type=comm_type
         self.size=comm_size
         self.device_group=device_group
         self._analysis()
     def _analysis(self):
-        assert(self.type==COMM.NONE or self.type==COMM.ALL_REDUCE or self.type==COMM.ALL_2_ALL)
+        for comm_type in self.primitives():
+            assert(isinstance(comm_type,COMM))
+    def primitives(self):
+        return self.type if isinstance(self.type,tuple) else (self.type,)
     def __str__(self) -> str:
         return '({},{})'.format(self.type,self.size)
     def No_comm(self):
@@ -205,6 +239,15 @@ class Oppd(CompOp):
         self.f_b_u_comm_d=[]
         self.ZeRO_comm_d=[] #forward all-gather,backward all-gather
         self.dpmap_flag=False
+    def _dp_comm(self):
+        #ZeRO-3: weight stays sharded, reduce-scatter gradient only
+        #ZeRO-1/2: reduce-scatter gradient, update the shard, all-gather weight
+        if self.ZeRO==ZeRO_strategy.ZeRO_3:
+            return COMM.REDUCE_SCATTER
+        elif self.ZeRO==ZeRO_strategy.none:
+            return COMM.ALL_REDUCE
+        else:
+            return (COMM.REDUCE_SCATTER,COMM.ALL_GATHER)
     def _comm_set(self):
         #pass
         self.f_b_u_comm_d=[]
@@ -215,29 +258,31 @@ class Oppd(CompOp):
             comm_info=[]
             comm_info.append(CommOp(Nm_K_Group,COMM.ALL_REDUCE,self.f_b_u_comm[0]))#forward
             comm_info.append(CommOp(Nm_M_Group,COMM.ALL_REDUCE,self.f_b_u_comm[1]))#backward
-            comm_info.append(CommOp(Nd_Group,COMM.ALL_REDUCE,self.f_b_u_comm[2]))#weight update
+            comm_info.append(CommOp(Nd_Group,self._dp_comm(),self.f_b_u_comm[2]))#weight update
             self.f_b_u_comm_d=comm_info  
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[0]))
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[1]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_GATHER,self.ZeRO_comm[0]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_GATHER,self.ZeRO_comm[1]))
         elif self.type==OP.Conv2:
             #[Nd,Nm_C,Nm_H,Nm_W,Nm_K]=self.p_sgy
             [Nd_Group,Nm_C_Group,_,_,Nm_K_Group]=split_comm_group(self.device,self.p_sgy)
             comm_info=[]
             comm_info.append(CommOp(Nm_C_Group,COMM.ALL_REDUCE,self.f_b_u_comm[0]))#forward
             comm_info.append(CommOp(Nm_K_Group,COMM.ALL_REDUCE,self.f_b_u_comm[1]))#backward
-            comm_info.append(CommOp(Nd_Group,COMM.ALL_REDUCE,self.f_b_u_comm[2]))#weight update
+            comm_info.append(CommOp(Nd_Group,self._dp_comm(),self.f_b_u_comm[2]))#weight update
             self.f_b_u_comm_d=comm_info  
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[0]))
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[1]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_GATHER,self.ZeRO_comm[0]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_GATHER,self.ZeRO_comm[1]))
         elif self.type==OP.Transformer:
             [Nd_Group,Nm_Group]=split_comm_group(self.device,self.p_sgy[0:2])
+            #sequence parallelism: all-gather before & reduce-scatter after the model parallel gemm
+            mp_comm=(COMM.ALL_GATHER,COMM.REDUCE_SCATTER) if self.seq_parallel else COMM.ALL_REDUCE
             comm_info=[]
-            comm_info.append(CommOp(Nm_Group,COMM.ALL_REDUCE,self.f_b_u_comm[0]))#forward
-            comm_info.append(CommOp(Nm_Group,COMM.ALL_REDUCE,self.f_b_u_comm[1]))#backward
-            comm_info.append(CommOp(Nd_Group,COMM.ALL_REDUCE,self.f_b_u_comm[2]))#weight update
+            comm_info.append(CommOp(Nm_Group,mp_comm,self.f_b_u_comm[0]))#forward
+            comm_info.append(CommOp(Nm_Group,mp_comm,self.f_b_u_comm[1]))#backward
+            comm_info.append(CommOp(Nd_Group,self._dp_comm(),self.f_b_u_comm[2]))#weight update
             self.f_b_u_comm_d=comm_info  
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[0]))
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[1]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_GATHER,self.ZeRO_comm[0]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_GATHER,self.ZeRO_comm[1]))
         elif self.type==OP.Embedding:
             #[Nd,Nm_emb_dim]=self.p_sgy 
             [Nd_Group,Nm_emb_dim_Group]=split_comm_group(self.device,self.p_sgy[0:2])
@@ -246,8 +291,9 @@ class Oppd(CompOp):
             comm_info.append(CommOp(Nm_emb_dim_Group,COMM.ALL_2_ALL,self.f_b_u_comm[1]))#backward
             comm_info.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.f_b_u_comm[2]))#weight update
             self.f_b_u_comm_d=comm_info  
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[0]))
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[1]))
+            #ZeRO not modelled: sparse gradients of the tables go all-to-all, tables stay replicated
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.NONE,self.ZeRO_comm[0]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.NONE,self.ZeRO_comm[1]))
         elif self.type==OP.Pool:
             #[Nd,Nm_C,Nm_H,Nm_W]=self.p_sgy
             [Nd_Group,Nm_C_Group,Nm_H_Group,Nm_W_Group]=split_comm_group(self.device,self.p_sgy)
@@ -256,8 +302,9 @@ class Oppd(CompOp):
             comm_info.append(CommOp(Nm_C_Group,COMM.ALL_REDUCE,self.f_b_u_comm[1]))#backward
             comm_info.append(CommOp(Nd_Group,COMM.ALL_REDUCE,self.f_b_u_comm[2]))#weight update
             self.f_b_u_comm_d=comm_info  
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[0]))
-            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.ALL_2_ALL,self.ZeRO_comm[1]))
+            #no weight, nothing for ZeRO to shard
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.NONE,self.ZeRO_comm[0]))
+            self.ZeRO_comm_d.append(CommOp(Nd_Group,COMM.NONE,self.ZeRO_comm[1]))
         else:
             raise NotImplementedError
     def update(self):
@@ -266,6 +313,9 @@ class Oppd(CompOp):
     def set_ZeRO(self,ZeRO):
         super().set_ZeRO(ZeRO)
         self._comm_set()
+    def set_seq_parallel(self,seq_parallel):
+        super().set_seq_parallel(seq_parallel)
+        self._comm_set()
 
     def dpmap(self,device_id:List[int],p_sgy:Union[List[int],None]=None):
         if (p_sgy==None or p_sgy==[]):
@@ -0,0 +1,166 @@
+import numpy as np
+from typing import List
+from ML import *
+
+# phase code of the schedule arrays
+FD, BD, UP = 0, 1, 2
+PHASE_STATE = {FD: ML_STATE.FORWARD, BD: ML_STATE.BACKWARD, UP: ML_STATE.PARAM_SYNC}
+
+
+def pipe_order(stage_num, micro_batch_num, strategy=pipe_strategy.GPipe, train=True):
+    """
+    execution order of (phase, micro batch) on every stage, arrays of shape (stage_num, K)
+    GPipe: all forward then all backward
+    1F1B: stage s runs min(stage_num-s-1, micro_batch_num) warmup forward, then one forward one backward
+    """
+    S, M = stage_num, micro_batch_num
+    if not train:
+        phase = np.full((S, M), FD)
+        micro = np.tile(np.arange(M), (S, 1))
+    elif strategy == pipe_strategy.GPipe:
+        phase = np.tile(np.repeat([FD, BD], M), (S, 1))
+        micro = np.tile(np.arange(M), (S, 2))
+    elif strategy == pipe_strategy.Megatron1F1B:
+        phase = np.empty((S, 2 * M), dtype=int)
+        micro = np.empty((S, 2 * M), dtype=int)
+        for s in range(S):
+            w = min(S - s - 1, M)
+            steady = np.arange(M - w)
+            phase[s] = np.concatenate(
+                [np.full(w, FD), np.tile([FD, BD], M - w), np.full(w, BD)]
+            )
+            micro[s] = np.concatenate(
+                [
+                    np.arange(w),
+                    np.stack([steady + w, steady], axis=1).ravel(),
+                    np.arange(M - w, M),
+                ]
+            )
+    else:
+        raise NotImplementedError
+    return phase, micro
+
+
+def _chain(ready, hold):
+    # NOTE: one stage in order: start_k=max(ready_k,release_k-1), release_k=start_k+hold_k
+    # release_k = C_k + max_{j<=k}(ready_j - C_{j-1}), C=cumsum(hold), along axis 0
+    C = np.cumsum(hold, axis=0)
+    start_off = np.maximum.accumulate(ready - (C - hold), axis=0)
+    release = C + start_off
+    return release - hold, release
+
+
+def pipe_eval(
+    fd_ms: List[float],
+    bd_ms: List[float],
+    up_ms: List[float],
+    micro_batch_num,
+    strategy=pipe_strategy.GPipe,
+    train=True,
+    fd_pass_ms=None,
+    bd_pass_ms=None,
+    fetch_ms=0,
+):
+    """
+    exact timeline of a pipeline with fixed per-stage latency, without SimPy
+    same rules as Pipeline.register:
+    1. micro batch m is fetched at m*fetch_ms
+    2. a stage holds its resource for the phase and the stage pass after it
+    3. GPipe backward starts when all forward finish, update of all stages starts when
+       stage 0 finishes the last backward
+    latency of shape (stage_num,), or (stage_num, N) for N configs at once (fetch_ms: (N,))
+    return start, end, phase, micro arrays of shape (stage_num, K) [+ (N,)], end excludes the stage pass
+    """
+    batch = np.ndim(fd_ms) == 2
+    fd_ms = np.asarray(fd_ms, float).reshape(len(fd_ms), -1)
+    S, N, M = fd_ms.shape[0], fd_ms.shape[1], micro_batch_num
+
+    # per-stage latency (S,) or (S, N) -> (S, N)
+    def as_batch(x):
+        x = np.asarray(0 if x is None else x, float)
+        return np.broadcast_to(x.reshape(-1, 1) if x.ndim == 1 else x, (S, N))
+
+    dur = np.stack([fd_ms, as_batch(bd_ms)], axis=1)
+    hold = dur + np.stack([as_batch(fd_pass_ms), as_batch(bd_pass_ms)], axis=1)
+    phase, micro = pipe_order(S, M, strategy, train)
+    K = phase.shape[1]
+    start = np.full((S, K, N), np.nan)
+    release = np.full((S, K, N), np.nan)
+    fetch = np.arange(M)[:, None] * np.asarray(fetch_ms, float).reshape(1, -1)
+    if not train or strategy == pipe_strategy.GPipe:
+        # every dependency comes from the stage before in sweep order, one pass per stage
+        ready = fetch
+        for s in range(S):
+            start[s, :M], release[s, :M] = _chain(
+                ready, np.repeat(hold[s, FD][None], M, 0)
+            )
+            ready = release[s, :M]
+        if train:
+            ready = np.repeat(release[S - 1, M - 1][None], M, 0)
+            for s in range(S - 1, -1, -1):
+                start[s, M:], release[s, M:] = _chain(
+                    ready, np.repeat(hold[s, BD][None], M, 0)
+                )
+                ready = release[s, M:]
+    else:
+        # forward depends on the stage before, backward on the stage after:
+        # resolve in rounds, each stage runs its next op once its dependency is released
+        # the rounds only depend on the order, so all configs share them
+        pos = np.empty((S, 2, M), dtype=int)
+        for s in range(S):
+            pos[s, phase[s], micro[s]] = np.arange(K)
+        stages = np.arange(S)
+        ptr = np.zeros(S, dtype=int)
+        while (ptr < K).any():
+            s = stages[ptr < K]
+            k = ptr[s]
+            p, m = phase[s, k], micro[s, k]
+            dep = np.empty((len(s), N))
+            fd = p == FD
+            first = fd & (s == 0)
+            dep[first] = fetch[m[first]]
+            up = fd & (s > 0)
+            dep[up] = release[s[up] - 1, pos[s[up] - 1, FD, m[up]]]
+            last = ~fd & (s == S - 1)
+            dep[last] = release[s[last], pos[s[last], FD, m[last]]]
+            down = ~fd & (s < S - 1)
+            dep[down] = release[s[down] + 1, pos[s[down] + 1, BD, m[down]]]
+            go = ~np.isnan(dep[:, 0])
+            assert go.any(), "pipeline schedule deadlock"
+            s, k, p, dep = s[go], k[go], p[go], dep[go]
+            prev = np.where((k > 0)[:, None], release[s, np.maximum(k - 1, 0)], 0)
+            start[s, k] = np.maximum(dep, prev)
+            release[s, k] = start[s, k] + hold[s, p]
+            ptr[s] += 1
+    end = start + dur[np.arange(S)[:, None], phase]
+    if train:
+        t_up = release[0, phase[0] == BD].max(axis=0)
+        start = np.concatenate([start, np.repeat(t_up[None, None], S, 0)], axis=1)
+        end = np.concatenate([end, (t_up + as_batch(up_ms))[:, None]], axis=1)
+        phase = np.concatenate([phase, np.full((S, 1), UP)], axis=1)
+        micro = np.concatenate([micro, np.full((S, 1), -1)], axis=1)
+    if not batch:
+        start, end = start[..., 0], end[..., 0]
+    return start, end, phase, micro
+
+
+def pipe_trace(start, end, phase):
+    """
+    Stage.trace of every stage: [(start, end, ML_STATE), ...] in execution order
+    """
+    return [
+        [(s, e, PHASE_STATE[p]) for s, e, p in zip(*row)]
+        for row in zip(start.tolist(), end.tolist(), phase.tolist())
+    ]
+
+
+if __name__ == "__main__":
+    # 4 stages, 8 micro batches, the slow stage 2 sets the pace
+    fd, bd, up = [1, 1, 2, 1], [2, 2, 4, 2], [1, 1, 1, 1]
+    for strategy in [pipe_strategy.GPipe, pipe_strategy.Megatron1F1B]:
+        start, end, phase, micro = pipe_eval(
+            fd, bd, up, 8, strategy, fd_pass_ms=[0.1] * 4
+        )
+        print("{} end @ {:.3f} ms".format(strategy, end.max()))
+        for trace in pipe_trace(start, end, phase):
+            print(" ".join("{}{:.1f}".format(str(x[2])[0], x[0]) for x in trace))
@@ -6,6 +6,7 @@ from util import *
 from tile_dataflow import Tile
 from wafer_device import Wafer_Device as wd
 from wafer_device import Packet
+from pipe_eval import pipe_eval, pipe_trace
 from ML import *
 
 
@@ -33,6 +34,7 @@ class Stage:
             dram_capacity_GB=noc.tile_dram_capacity_GB,
             opt=tile_config["opt"],
             ZeRO=tile_config["ZeRO"],
+            seq_parallel=tile_config.get("seq_parallel", False),
             Analytical=tile_config["Analytical"],
         )
         self.op_list = op_list
@@ -50,6 +52,11 @@ class Stage:
         self.res_fd_cnt = 0
         self.prio = 1
         self.trace = []
+        # NOTE: latency of each phase per micro-batch shape, replayed as one timeout
+        # on by default in analytical mode, set "phase_memo" False for contention-sensitive runs
+        self.phase_memo = (
+            {} if tile_config.get("phase_memo", tile_config["Analytical"]) else None
+        )
         self.__class__.__stage_id += 1
 
     def init_info(self, micro_batch):
@@ -59,6 +66,16 @@ class Stage:
         self.i_shape = self.op_list[0].i_shape
         self.o_shape = self.op_list[-1].o_shape
 
+    def phase_process(self, c_type, process):
+        key = (c_type, tuple(self.i_shape))
+        if self.phase_memo is not None and key in self.phase_memo:
+            yield self.env.timeout(self.phase_memo[key])
+            return
+        t_start = self.env.now
+        yield from process()
+        if self.phase_memo is not None:
+            self.phase_memo[key] = self.env.now - t_start
+
     def up_state(self, noc: wd, c_type=ML_STATE.FORWARD, wait=1e-15):
         # resource request time
         with self.res.request(priority=self.prio) as req:
@@ -67,7 +84,7 @@ class Stage:
             # Forward
             if c_type == ML_STATE.FORWARD:
                 # forward time
-                yield self.env.process(self.tile.forward_process())
+                yield from self.phase_process(c_type, self.tile.forward_process)
                 # trace record
                 self.trace.append((t_last, self.env.now, c_type))
                 self.res_fd_cnt += 1
@@ -75,27 +92,23 @@ class Stage:
                     task_info = self.__class__.__stage_id
                     pks = Packet("", self.o_shape)
                     # pass proc: cur group -> next group
-                    yield self.env.process(
-                        noc.STAGE_PASS_process(
-                            pks, self.cur_core_id, self.next_core_id, task_info
-                        )
+                    yield from noc.STAGE_PASS_process(
+                        pks, self.cur_core_id, self.next_core_id, task_info
                     )
             # backward
             elif c_type == ML_STATE.BACKWARD:
-                yield self.env.process(self.tile.backward_process())
+                yield from self.phase_process(c_type, self.tile.backward_process)
                 self.trace.append((t_last, self.env.now, c_type))
                 self.res_fd_cnt -= 1
                 if self.next_core_id != None and self.next_core_id != []:
                     task_info = self.__class__.__stage_id
                     pks = Packet("", self.i_shape)
-                    yield self.env.process(
-                        noc.STAGE_PASS_process(
-                            pks, self.cur_core_id, self.next_core_id, task_info
-                        )
+                    yield from noc.STAGE_PASS_process(
+                        pks, self.cur_core_id, self.next_core_id, task_info
                     )
             # gradient update
             else:
-                yield self.env.process(self.tile.update_process())
+                yield from self.phase_process(c_type, self.tile.update_process)
                 self.trace.append((t_last, self.env.now, c_type))
 
 
@@ -119,16 +132,28 @@ class Pipeline:
         self.mini_batch = mini_batch_size
         self.micro_batch = micro_batch_size
         self.micro_batch_num = math.ceil(self.mini_batch / self.micro_batch)
-        self.reg = []
         self.train = train
         self.cur_fd_times = 0
         self.cur_bd_times = 0
-        self.one_epoch_finish = simpy.Store(self.env, capacity=1)
-        self.one_fd_finish = simpy.Store(self.env, capacity=1)
+        # NOTE: work items of each stage, pulled by its scheduler process in schedule order
+        # forward: from the stage before, stage 0 from data fetch
+        # backward: from the stage after, the last stage from its own forward
         self.one_data_fetch = simpy.Store(self.env, capacity=1)
+        self.fd_queue = [self.one_data_fetch]
+        self.bd_queue = []
+        self.one_epoch_finish = self.env.event()
         self.strategy = pipe_type
         self.boost_mode = False
         self.boost_times = 3 if self.stages[0].tile.Analytical else 6
+        # NOTE: adaptive boost issues micro batches until the stage period is steady
+        self.adaptive = False
+        self.steady_tol = 0.01
+        self.steady_window = 8
+        self.steady = False
+        self.steady_event = self.env.event()
+        self.issued = 0
+        self.sim_times = self.micro_batch_num
+        self.boost_error_days = 0
         self.__set_stage()
 
     def __set_stage(self):
@@ -136,7 +161,9 @@ class Pipeline:
         # init stage, resource, strategy, mapping
         for i in range(self.stage_num):
             self.stages[i].init_info(self.micro_batch)
-            self.reg.append(simpy.PriorityStore(self.env, capacity=1))
+            if i > 0:
+                self.fd_queue.append(simpy.Store(self.env))
+            self.bd_queue.append(simpy.Store(self.env))
             if self.strategy == pipe_strategy.GPipe:
                 self.stages[i].stage_info = [
                     self.strategy,
@@ -157,74 +184,125 @@ class Pipeline:
                 self.train,
             )
 
-    def forward(self, times):
-        # 1. data fetch 2. forward update state 3. 1F1B put finish signal
-        with self.one_data_fetch.get() as get:
-            a = yield get
-            for i, stg in enumerate(self.stages):
-                # print( hasattr(stg,"up_state"))
-                yield self.env.process(
-                    stg.up_state(self.noc, c_type=ML_STATE.FORWARD, wait=1e-15)
-                )
-                if self.strategy == pipe_strategy.Megatron1F1B and self.train:
-                    if i == self.stage_num - 2:
-                        yield self.reg[i].put(1)
-                    else:
-                        self.reg[i].put(1)
-                elif self.strategy == pipe_strategy.GPipe or not self.train:
-                    if i == self.stage_num - 1:
-                        self.cur_fd_times += 1
-                    # print('self.cur_time',self.cur_time)
-                    # one epoch forward finish
-                    if self.cur_fd_times == times:
-                        self.one_fd_finish.put(1)
-                    # print('self.one_fd_finish.put(1)',self.cur_fd_times)
-                else:
-                    raise NotImplementedError
+    # next forward item, None once sim_times items are done
+    def __pull(self, queue, done):
+        if done >= self.sim_times:
+            return None
+        get = queue.get()
+        # adaptive: sim_times drops to the issued number once steady, stop waiting then
+        if self.adaptive and not self.steady:
+            yield get | self.steady_event
+            if not get.triggered:
+                get.cancel()
+                return (yield from self.__pull(queue, done))
+        return (yield get)
 
-    def backward(self, times):
-        # diff between 1F1B and GPipe: 1F1B need request finish signal, GPipe not need
-        # backward from stage_n to stage_1
-        for i in range(self.stage_num - 1, -1, -1):
-            if self.strategy == pipe_strategy.Megatron1F1B:
-                # request finish signal
-                with self.reg[i].get() as get:
-                    a = yield get
-                    stg = self.stages[i]
-                    # update state
-                    yield self.env.process(
-                        stg.up_state(self.noc, c_type=ML_STATE.BACKWARD, wait=1e-15)
-                    )
-                    if i == 0:
-                        self.cur_bd_times += 1
-                    if self.cur_bd_times == times:
-                        self.one_epoch_finish.put(1)
-            elif self.strategy == pipe_strategy.GPipe:
-                stg = self.stages[i]
-                yield self.env.process(
-                    stg.up_state(self.noc, c_type=ML_STATE.BACKWARD, wait=1e-15)
-                )
-                if i == 0:
-                    self.cur_bd_times += 1
-                # one epoch forward & backward finish
-                if self.cur_bd_times == times:
-                    self.one_epoch_finish.put(1)
+    def __forward(self, i, item):
+        stg = self.stages[i]
+        yield from stg.up_state(self.noc, c_type=ML_STATE.FORWARD, wait=1e-15)
+        if i < self.stage_num - 1:
+            self.fd_queue[i + 1].put(item)
+            return
+        self.cur_fd_times += 1
+        if self.adaptive:
+            self.__steady_check()
+        if self.train:
+            self.bd_queue[i].put(item)
+
+    def __backward(self, i):
+        stg = self.stages[i]
+        item = yield self.bd_queue[i].get()
+        yield from stg.up_state(self.noc, c_type=ML_STATE.BACKWARD, wait=1e-15)
+        if i > 0:
+            self.bd_queue[i - 1].put(item)
+        else:
+            self.cur_bd_times += 1
 
-    def parameter_syn(self):
-        # gradient update, when one epoch finish
+    def stage_process(self, i):
+        """
+        scheduler of stage i, the only process of the stage
+        GPipe: all forward then all backward
+        1F1B: stage_num-i-1 warmup forward, then one forward one backward, then the rest backward
+        gradient update of all stages starts when stage 0 finishes the last backward
+        same order as pipe_eval.pipe_order
+        """
+        warmup = math.inf
+        if self.train and self.strategy == pipe_strategy.Megatron1F1B:
+            warmup = self.stage_num - i - 1
+        fd_done, bd_done = 0, 0
         while True:
-            with self.one_epoch_finish.get() as get:
-                a = yield get
-                for stg in self.stages:
-                    self.env.process(
-                        stg.up_state(self.noc, c_type=ML_STATE.PARAM_SYNC, wait=1e-15)
-                    )
+            item = yield from self.__pull(self.fd_queue[i], fd_done)
+            if item is None:
                 break
+            yield from self.__forward(i, item)
+            fd_done += 1
+            if fd_done > warmup:
+                yield from self.__backward(i)
+                bd_done += 1
+        if not self.train:
+            return
+        while bd_done < fd_done:
+            yield from self.__backward(i)
+            bd_done += 1
+        if i == 0:
+            self.one_epoch_finish.succeed()
+        yield self.one_epoch_finish
+        yield from self.stages[i].up_state(
+            self.noc, c_type=ML_STATE.PARAM_SYNC, wait=1e-15
+        )
+
+    # (period, drift) of c_type starts, max over stages: period is the mean interval of the
+    # last steady_window intervals, drift its change from the mean of the window before
+    # None if a stage has too few samples or, with tol, drifts by more than tol
+    def __steady_period(self, c_type, tol=None):
+        w = self.steady_window
+        periods, drifts = [], []
+        for stg in self.stages:
+            starts = [t[0] for t in stg.trace if t[2] == c_type]
+            if len(starts) < 2 * w + 1:
+                return None
+            period = (starts[-1] - starts[-1 - w]) / w
+            drift = abs(period - (starts[-1 - w] - starts[-1 - 2 * w]) / w)
+            if tol is not None and drift > tol * period:
+                return None
+            periods.append(period)
+            drifts.append(drift)
+        return max(periods), max(drifts)
+
+    # stop issuing once the forward period of every stage is steady
+    def __steady_check(self):
+        if self.steady:
+            return
+        if self.__steady_period(ML_STATE.FORWARD, self.steady_tol) is not None:
+            self.steady = True
+            self.sim_times = self.issued
+            self.steady_event.succeed()
+
+    # extrapolated (period, drift) per micro batch, from the steady window
+    def __steady_extrapolation(self):
+        fd = self.__steady_period(ML_STATE.FORWARD)
+        bd = self.__steady_period(ML_STATE.BACKWARD) if self.train else None
+        if fd is None:
+            return 0, 0
+        if bd is None:
+            return fd
+        if self.strategy == pipe_strategy.GPipe:
+            # all forward then all backward: one more micro batch adds both periods
+            return fd[0] + bd[0], fd[1] + bd[1]
+        # 1F1B: one forward & one backward per period
+        return max(fd[0], bd[0]), max(fd[1], bd[1])
 
     # start pipeline from data fetch & DRAM read
     def start(self):
         times = self.boost_times if self.boost_mode else self.micro_batch_num
+        if self.adaptive:
+            times = self.micro_batch_num
         for i in range(times):
+            # NOTE: the fetch store holds one item, the next fetch starts once stage 0 takes
+            # the last one, stage 0 starts at the same time as fetching all at once
+            if self.steady:
+                break
+            self.issued += 1
             task_info = "input_data_fetch_" + str(i)
             i_shape = self.stages[0].i_shape
             with self.one_data_fetch.put(Packet(task_info, i_shape)) as put:
@@ -234,11 +312,11 @@ class Pipeline:
                         i_shape,
                         self.stages[0].cur_core_id,
                         task_id=task_info,
-                        multicast=False,
+                        multicast=True,
                     )
                 )
 
-    def register(self, boost_mode=True):
+    def register(self, boost_mode=True, adaptive=False, tol=0.01, window=8):
         print("----------pipe_info----------")
         print(
             "stage num={}, extute times={}".format(
@@ -246,36 +324,86 @@ class Pipeline:
             )
         )
         print("mini batch={}, micro batch={}".format(self.mini_batch, self.micro_batch))
+        # adaptive: boost_mode with a steady-state detected micro batch number, the mean
+        # forward period of every stage over the last two windows of intervals differs within tol
         self.boost_mode = boost_mode
+        self.adaptive = boost_mode and adaptive
+        self.steady_tol = tol
+        self.steady_window = window
         self.boost_times = min(self.boost_times, self.micro_batch_num)
         times = self.boost_times if self.boost_mode else self.micro_batch_num
-
-        # self.boost_times=1
-        # #n of backward with n micro_batch
-        def all_backward(times):
-            while True:
-                with self.one_fd_finish.get() as get:
-                    a = yield get
-                    for i in range(times):
-                        self.env.process(self.backward(times))
-                break
-
+        self.sim_times = self.micro_batch_num if self.adaptive else times
+        if self.train and self.strategy not in [
+            pipe_strategy.GPipe,
+            pipe_strategy.Megatron1F1B,
+        ]:
+            raise NotImplementedError
         # 1. start pipeline -- data fetch
         self.env.process(self.start())
-        # 2. #n of forward with n micro_batch
-        for i in range(times):
-            self.env.process(self.forward(times))
-        # 3. backward based on
-        # GPipe: first request #n of forward finish, all backward
-        # 1F1B: once one forward finish, backward update
-        if self.train:
-            if self.strategy == pipe_strategy.GPipe:
-                self.env.process(all_backward(times))
-            elif self.strategy == pipe_strategy.Megatron1F1B:
-                for i in range(times):
-                    self.env.process(self.backward(times))
-            # 4. gradient update
-            self.env.process(self.parameter_syn())
+        # 2. one scheduler per stage for forward, backward & gradient update
+        for i in range(self.stage_num):
+            self.env.process(self.stage_process(i))
+
+    # latency of every phase and stage pass, one micro batch at a time without contention
+    def __measure(self, lat):
+        t = self.env.now
+        yield self.env.process(
+            self.noc.dram_read_group_process(
+                self.stages[0].i_shape,
+                self.stages[0].cur_core_id,
+                task_id="input_data_fetch",
+                multicast=True,
+            )
+        )
+        lat["fetch"] = self.env.now - t
+        phases = [
+            ("fd", lambda stg: stg.tile.forward_process, lambda stg: stg.o_shape),
+            ("bd", lambda stg: stg.tile.backward_process, lambda stg: stg.i_shape),
+            ("up", lambda stg: stg.tile.update_process, None),
+        ]
+        for name, process, pass_shape in phases if self.train else phases[:1]:
+            for stg in self.stages:
+                t = self.env.now
+                yield self.env.process(process(stg)())
+                lat[name].append(self.env.now - t)
+                if pass_shape is None:
+                    continue
+                t = self.env.now
+                if stg.next_core_id != None and stg.next_core_id != []:
+                    yield self.env.process(
+                        self.noc.STAGE_PASS_process(
+                            Packet("", pass_shape(stg)),
+                            stg.cur_core_id,
+                            stg.next_core_id,
+                            "stage_pass",
+                        )
+                    )
+                lat[name + "_pass"].append(self.env.now - t)
+
+    def evaluate(self):
+        """
+        full-length schedule from the max-plus recurrences of pipe_eval instead of register & simpy_run
+        every stage phase runs once in SimPy to get its latency, so no boost_mode is needed
+        """
+        print("----------pipe_eval----------")
+        lat = {"fd": [], "bd": [], "up": [], "fd_pass": [], "bd_pass": []}
+        self.env.run(until=self.env.process(self.__measure(lat)))
+        start, end, phase, micro = pipe_eval(
+            lat["fd"],
+            lat["bd"] or [0] * self.stage_num,
+            lat["up"] or [0] * self.stage_num,
+            self.micro_batch_num,
+            self.strategy,
+            self.train,
+            fd_pass_ms=lat["fd_pass"],
+            bd_pass_ms=lat["bd_pass"] or None,
+            fetch_ms=lat["fetch"],
+        )
+        self.boost_mode = False
+        # timeline starts at 0 like simpy_run, the measurement time is not counted
+        for stg, trace in zip(self.stages, pipe_trace(start, end, phase)):
+            stg.trace = trace
+        return end.max()
 
     def simpy_run(self, until_ms=2000):
         print("----------simpy_run----------")
@@ -302,7 +430,20 @@ class Pipeline:
         # print(all_trace)
         # pipe_endtime=all_trace[0][-1][1]
         # print(all_trace[0])
-        if self.boost_mode:
+        if self.adaptive:
+            # add the rest micro batches at the steady period
+            # NOTE: error estimate, not a bound: the period drift between the last two
+            # windows carried over the rest micro batches
+            period, drift = self.__steady_extrapolation()
+            rest = self.micro_batch_num - self.sim_times
+            pipe_endtime = pipe_endtime + rest * period
+            self.boost_error_days = rest * drift / 1000 / 60 / 60 / 24
+            print(
+                "adaptive boost: {} micro batch simulated, period {:.6g} ms".format(
+                    self.sim_times, period
+                )
+            )
+        elif self.boost_mode:
             # add boosted time
             max_unit_time_1F_1B = max_ave_1F_1B_time(
                 all_trace, self.train
@@ -341,6 +482,12 @@ class Pipeline:
                 title, exe_mode, endtime_days, endtime_secs
             )
         )
+        if self.adaptive:
+            print(
+                "{} ML {} pipeline endtime error estimate +-{:.4g} days".format(
+                    title, exe_mode, self.boost_error_days
+                )
+            )
         print(
             "{} ML {} pipeline throughout= {:.4f} sample/s".format(
                 title, exe_mode, self.mini_batch / endtime_secs
@@ -0,0 +1,50 @@
+from array import array
+from collections import OrderedDict
+
+
+class RouteCache:
+    """
+    per-device table of NoC link paths, key=(src_id,des_id) -> array('i') of link id
+    max_size=None: unbounded table, every (src,des) pair is stored once
+    max_size=n   : LRU table, keep at most n paths (for very large mesh)
+    max_size=0   : cache disabled
+    """
+
+    def __init__(self, tile_num, max_size=None) -> None:
+        self.tile_num = tile_num
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._table = OrderedDict() if max_size else {}
+
+    def __len__(self):
+        return len(self._table)
+
+    def get(self, src_id, des_id, link_func):
+        key = src_id * self.tile_num + des_id
+        path = self._table.get(key)
+        if path is not None:
+            self.hits += 1
+            if self.max_size:
+                self._table.move_to_end(key)
+            return path
+        self.misses += 1
+        path = array("i", link_func(src_id, des_id))
+        if self.max_size == 0:
+            return path
+        self._table[key] = path
+        if self.max_size and len(self._table) > self.max_size:
+            self._table.popitem(last=False)
+        return path
+
+    def clear(self, tile_num=None):
+        if tile_num is not None:
+            self.tile_num = tile_num
+        self._table.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return "RouteCache:(paths:{},max_size:{},hits:{},misses:{})".format(
+            len(self._table), self.max_size, self.hits, self.misses
+        )
@@ -0,0 +1,101 @@
+import os
+import sys
+
+# NOTE: sim modules import each other flat (from util import *), run tests from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# demo scripts that run at import, not pytest tests
+collect_ignore = ["test.py", "test_allof.py", "test_pipeline.py"]
+
+import shutil
+import pytest
+
+SIM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WAFER = {
+    "ResNet50": dict(tile_inter_shape=[5, 4], tile_intra_shape=[4, 4]),
+    "BERT_LARGE": dict(tile_inter_shape=[5, 4], tile_intra_shape=[4, 4]),
+}
+
+
+def wafer_config(net, **wd_kw):
+    """
+    Wafer_Device kwargs of the default test wafer, wd_kw overrides any of them
+    """
+    return {
+        "wafer_name": "test",
+        "tile_intra_noc_bw_GB": 2048,
+        "tile_inter_noc_bw_GB": 200,
+        "tile_dram_bw_GB": 25.6 * 32 / 16,
+        "tile_dram_capacity_GB": 3,
+        "edge_die_dram_bw_GB": 25.6,
+        "clk_freq_GHz": 1,
+        "with_dram_per_tile": True,
+        **WAFER[net],
+        **wd_kw,
+    }
+
+
+def tile_config(net, analytical=True, **tile_kw):
+    from ML import OPTIMIZER, ZeRO_strategy
+
+    return {
+        "tile_name": "t",
+        "sram_capacity_MB": 3,
+        "macs": 8000,
+        "freq_GHz": 1,
+        "with_dram": True,
+        "opt": OPTIMIZER.SGD if net == "ResNet50" else OPTIMIZER.ADAM,
+        "ZeRO": ZeRO_strategy.none if net == "ResNet50" else ZeRO_strategy.ZeRO_3,
+        "Analytical": analytical,
+        **tile_kw,
+    }
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    """
+    copy model/<net>.json into tmp_path and run there, mapping writes model/*_map.json & plots
+    """
+    (tmp_path / "model").mkdir(exist_ok=True)
+    monkeypatch.chdir(tmp_path)
+
+    def copy(net):
+        shutil.copy(os.path.join(SIM_DIR, "model", net + ".json"), "model")
+
+    return copy
+
+
+@pytest.fixture
+def make_pipeline(model_dir):
+    """
+    factory of a mapped Pipeline of one model on the default test wafer
+    """
+    import simpy
+    import model_map
+    import pipeline_copy
+    from comp_graph import CompGraph
+    from wafer_device import Wafer_Device
+    from ML import pipe_strategy
+
+    def make(net, strategy=pipe_strategy.GPipe, analytical=True, tile_kw={}, **wd_kw):
+        model_dir(net)
+        env = simpy.Environment()
+        wd = Wafer_Device(env=env, Analytical=analytical, **wafer_config(net, **wd_kw))
+        tile = tile_config(net, analytical, **tile_kw)
+        model = CompGraph.gread(path="model", name=net)
+        stages = getattr(model_map, "mapping_" + net)(env, model, tile, wd)
+        return pipeline_copy.Pipeline(
+            env=env,
+            mini_batch_size=model.batch_size,
+            micro_batch_size=1,
+            stages=stages,
+            noc=wd,
+            pipe_type=strategy,
+            train=True,
+        )
+
+    return make
+
+
+def pipe_end(pipe):
+    return max(stg.trace[-1][1] for stg in pipe.stages)
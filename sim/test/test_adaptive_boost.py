@@ -0,0 +1,29 @@
+import pytest
+from conftest import pipe_end
+from ML import pipe_strategy
+
+UNTIL_MS = 1e12
+
+
+def status_ms(pipe):
+    return pipe.status(draw_pipe=False, clear=False) * 24 * 60 * 60 * 1000
+
+
+@pytest.mark.parametrize("strategy", [pipe_strategy.GPipe, pipe_strategy.Megatron1F1B])
+def test_adaptive_matches_full_run(make_pipeline, strategy):
+    full = make_pipeline("BERT_LARGE", strategy)
+    full.register(boost_mode=False)
+    full.simpy_run(until_ms=UNTIL_MS)
+    boost = make_pipeline("BERT_LARGE", strategy)
+    boost.register(boost_mode=True, adaptive=True)
+    boost.simpy_run(until_ms=UNTIL_MS)
+    assert boost.sim_times < boost.micro_batch_num
+    end_ms = status_ms(boost)
+    assert end_ms == pytest.approx(pipe_end(full), rel=1e-9)
+    error_ms = boost.boost_error_days * 24 * 60 * 60 * 1000
+    if strategy == pipe_strategy.GPipe:
+        # steady analytical stages: no period drift left to carry over
+        assert error_ms == pytest.approx(0, abs=1e-6)
+    else:
+        # backward periods of 1F1B still drift a little, the estimate stays small
+        assert 0 <= error_ms < 0.05 * end_ms
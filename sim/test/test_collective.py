@@ -0,0 +1,101 @@
+import simpy
+import pytest
+import collective
+from wafer_device import Wafer_Device
+from ML import *
+
+# 2 dies of 4x4 tiles side by side: 4 rows x 8 columns
+# RING: a physical ring of neighbours, no two edges share a link
+RING = [0, 1, 2, 3, 11, 10, 9, 8]
+GROUPS = [RING, [0, 1, 4, 5], list(range(0, 32, 2))]
+
+
+def device(analytical=True, **kw):
+    env = simpy.Environment()
+    kw.setdefault("ring_reorder", False)
+    wd = Wafer_Device(
+        env,
+        tile_inter_shape=[1, 2],
+        tile_intra_shape=[4, 4],
+        Analytical=analytical,
+        resource_monitor=False,
+        **kw
+    )
+    return env, wd
+
+
+@pytest.mark.parametrize("group", GROUPS)
+def test_all_reduce_time_is_ring_cost(group):
+    env, wd = device()
+    size = 4
+    ring = collective.schedule(wd, COMM.ALL_REDUCE, comm_algo.ring, group, size)
+    t = wd.ALL_REDUCE_time(size, group)
+    assert t == pytest.approx(collective.schedule_time(wd, ring))
+    assert t == pytest.approx(
+        collective.select(wd, COMM.ALL_REDUCE, group, size, comm_algo.ring)[1]
+    )
+    env.process(wd.ALL_REDUCE_process(size, group, "ar"))
+    env.run()
+    assert env.now == pytest.approx(t)
+
+
+def test_all_reduce_time_has_link_bound():
+    # on a line the wrap-around edge shares every link of the other edges
+    _, wd = device()
+    group = [0, 1, 4, 5]
+    n = len(group)
+    step = max(wd.noc_time(4 / n, group[i - 1], group[i]) for i in range(n))
+    assert wd.ALL_REDUCE_time(4, group) > 2 * (n - 1) * step
+
+
+@pytest.mark.parametrize("group", GROUPS)
+@pytest.mark.parametrize("size", [0.01, 1, 100])
+def test_estimate_is_schedule_time(group, size):
+    _, wd = device()
+    for comm_type, algos in collective.ALGO.items():
+        for algo in algos:
+            schedule = collective.schedule(wd, comm_type, algo, group, size)
+            t = collective.estimate(wd, comm_type, algo, group, size)
+            if schedule is None:
+                assert t is None
+            else:
+                assert t == pytest.approx(collective.schedule_time(wd, schedule))
+
+
+@pytest.mark.parametrize("group", GROUPS)
+@pytest.mark.parametrize("size", [0.01, 100])
+def test_select_is_fastest(group, size):
+    _, wd = device()
+    for comm_type, algos in collective.ALGO.items():
+        times = [
+            collective.estimate(wd, comm_type, algo, group, size) for algo in algos
+        ]
+        algo, t = collective.select(wd, comm_type, group, size)
+        assert t == min(x for x in times if x is not None)
+        assert t == collective.estimate(wd, comm_type, algo, group, size)
+
+
+@pytest.mark.parametrize(
+    "comm_type,algo",
+    [
+        (COMM.ALL_REDUCE, comm_algo.ring),
+        (COMM.REDUCE_SCATTER, comm_algo.ring),
+        (COMM.ALL_GATHER, comm_algo.ring),
+        (COMM.BROADCAST, comm_algo.multicast),
+    ],
+)
+def test_contention_free_simulation_matches_estimate(comm_type, algo):
+    env, wd = device(analytical=False)
+    env.process(wd.collective_process(comm_type, 4, RING, "c", algo))
+    env.run()
+    assert env.now == pytest.approx(collective.estimate(wd, comm_type, algo, RING, 4))
+
+
+@pytest.mark.parametrize("segments", [1, 2, 4, 8])
+@pytest.mark.parametrize("phases", [1, 2])
+def test_segmented_ring_closed_form(segments, phases):
+    env, wd = device(analytical=False)
+    ring = collective.SegmentedRing(RING, 4, segments, phases=phases)
+    env.process(ring.process(wd, "seg"))
+    env.run()
+    assert env.now == pytest.approx(ring.time(wd))
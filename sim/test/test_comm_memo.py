@@ -0,0 +1,51 @@
+import simpy
+import pytest
+from wafer_device import Wafer_Device
+from ML import *
+
+
+def run(analytical, comm_memo):
+    # the same all-reduce 3 times, with point-to-point traffic on shared links meanwhile
+    env = simpy.Environment()
+    wd = Wafer_Device(
+        env,
+        tile_inter_shape=[1, 2],
+        tile_intra_shape=[2, 4],
+        Analytical=analytical,
+        comm_memo=comm_memo,
+    )
+    group = [0, 1, 2, 3, 4, 5, 6, 7]
+    end = []
+    first_done = env.event()
+
+    # the first run is alone on the noc, a memo would record and replay it
+    def all_reduce(k):
+        for i in range(3):
+            yield env.process(
+                wd.collective_process(COMM.ALL_REDUCE, 8, group, "ar{}".format(k))
+            )
+            end.append(env.now)
+            if i == 0:
+                first_done.succeed()
+
+    # starts while the second all-reduce runs
+    def traffic():
+        yield first_done
+        for i in range(6):
+            yield env.timeout(1e-3)
+            yield env.process(wd.noc_process(4, 0, 3, "p2p"))
+            end.append(env.now)
+
+    env.process(all_reduce(0))
+    env.process(traffic())
+    env.run()
+    return end, wd
+
+
+@pytest.mark.parametrize("analytical", [False, True])
+def test_memo_does_not_change_results(analytical):
+    end_off, _ = run(analytical, False)
+    end_on, wd = run(analytical, True)
+    assert end_on == end_off
+    # replay only in Analytical mode, simulated collectives always run their transfers
+    assert wd.comm_memo_hits == (2 if analytical else 0)
@@ -0,0 +1,53 @@
+import numpy as np
+import simpy
+import pytest
+from op_pd import CompOp
+from tile_dataflow import Tile, compute_cycles_batch
+from ML import *
+
+
+def gemm_macs_m(gemm):
+    return sum(SR * SC * T * num for SR, SC, T, num in gemm) / 1e6
+
+
+@pytest.mark.parametrize(
+    "op_type,param,p_sgy",
+    [
+        (OP.Linear, [8, 1024, 512, 256], [2, 2, 2, 1]),
+        (OP.Transformer, [4, 128, 1024, 16], [2, 4]),
+    ],
+)
+def test_fd_macs_is_the_sum_of_gemm_macs(op_type, param, p_sgy):
+    op = CompOp(op_type, param, p_sgy)
+    op._analysis()
+    assert op.fd_macs_m == pytest.approx(gemm_macs_m(op.fd_gemm))
+    # the input-gradient pass does at least the forward work
+    assert gemm_macs_m(op.dloss_gemm) >= gemm_macs_m(op.fd_gemm)
+
+
+@pytest.mark.parametrize("macs", [0.5, 3, 383.3, 1000, 2000, 4096, 8000])
+def test_comp_time_for_any_macs(macs):
+    tile = Tile(simpy.Environment(), macs=macs)
+    assert min(tile.array_shape) >= 1
+    for macs_m in ([[64, 64, 64, 2]], [64, 64, 64], 64**3 / 1e6):
+        t = tile.comp_time(macs_m)
+        assert np.isfinite(t) and t > 0
+
+
+def test_known_array_shapes():
+    env = simpy.Environment()
+    assert Tile(env, macs=8000).array_shape == [64, 32]
+    assert Tile(env, macs=4096).array_shape == [32, 32]
+    assert Tile(env, macs=1024).array_shape == [16, 16]
+
+
+def test_gemm_cycles_scale_with_num():
+    tile = Tile(simpy.Environment(), macs=4096)
+    one = tile.comp_time([[128, 128, 256, 1]])
+    assert tile.comp_time([[128, 128, 256, 3]]) == pytest.approx(3 * one)
+    assert tile.comp_time([128, 128, 256]) == pytest.approx(one)
+
+
+def test_zero_array_shape_is_rejected():
+    with pytest.raises(AssertionError):
+        compute_cycles_batch([[64, 64, 64]], [0, 8])
@@ -0,0 +1,61 @@
+import numpy as np
+import simpy
+import pytest
+import collective
+from conftest import wafer_config, tile_config
+from design_space import BatchCost, design_space, hw_grid
+from wafer_device import Wafer_Device
+from ML import *
+
+
+@pytest.mark.parametrize(
+    "wd_kw",
+    [{}, {"comm_algo": comm_algo.ring_segmented}, {"ring_reorder": False}],
+)
+def test_matches_per_config_evaluate(model_dir, make_pipeline, wd_kw):
+    model_dir("ResNet50")
+    hw = hw_grid(
+        tile_intra_noc_bw_GB=[512, 2048],
+        tile_inter_noc_bw_GB=[50, 400],
+        tile_dram_bw_GB=[25.6],
+        macs=[4000, 8000],
+    )
+    table = design_space(
+        "ResNet50", hw, wafer_config("ResNet50", **wd_kw), tile_config("ResNet50")
+    )
+    for i in (0, 5, 7):
+        bw = {k: float(table[k][i]) for k in hw if k != "macs"}
+        pipe = make_pipeline(
+            "ResNet50", tile_kw={"macs": int(table["macs"][i])}, **wd_kw, **bw
+        )
+        days = pipe.evaluate() / 1000 / 60 / 60 / 24
+        assert table["days"][i] == pytest.approx(days, rel=1e-9)
+
+
+# estimate that takes scalar bandwidths only
+class ScalarMulticast(collective.Multicast):
+    array_bw = False
+
+    def estimate(self, wd, size):
+        return float(super().estimate(wd, size))
+
+
+def test_stream_schedule_without_array_bw(monkeypatch):
+    monkeypatch.setitem(
+        collective.ALGO[COMM.BROADCAST],
+        comm_algo.multicast,
+        lambda wd, group_id, size: ScalarMulticast(group_id, size),
+    )
+    wd = Wafer_Device(
+        simpy.Environment(), tile_inter_shape=[1, 2], tile_intra_shape=[4, 4]
+    )
+    intra, inter, dram = [256, 1024, 512], [50, 200, 400], [32, 32, 64]
+    cost = BatchCost(wd, intra, inter, dram)
+    group = [3, 0, 9, 12, 30]
+    t = cost.estimate(COMM.BROADCAST, comm_algo.multicast, group, 4)
+    assert t.shape == (3,) and len(set(t)) == 3
+    for k in range(3):
+        view = wd.batch_view(intra[k], inter[k], dram[k])
+        assert t[k] == pytest.approx(
+            collective.estimate(view, COMM.BROADCAST, comm_algo.multicast, group, 4)
+        )
@@ -0,0 +1,71 @@
+import random
+import simpy
+import pytest
+from dram_bank import BankedDRAM, dram_access_time
+
+
+def test_idle_access_matches_closed_form():
+    env = simpy.Environment()
+    dram = BankedDRAM(
+        "t", env, 100, 16, channels=4, ctrl_latency_ms=1e-4, row_miss_ns=45
+    )
+    env.process(dram.access_process(8, "a", False))
+    env.run()
+    assert env.now == pytest.approx(dram.access_time(8))
+    assert dram.access_time(8) == pytest.approx(
+        dram_access_time(8, 100, 1e-4, 45, 4)
+    )
+
+
+def test_concurrent_accesses_share_bandwidth():
+    # one channel: two equal accesses finish together at twice the idle time
+    env = simpy.Environment()
+    dram = BankedDRAM("t", env, 100, 16, channels=1)
+    end = []
+
+    def one_access(task_id):
+        yield env.process(dram.access_process(100, task_id, False))
+        end.append(env.now)
+
+    env.process(one_access("a"))
+    env.process(one_access("b"))
+    env.run()
+    assert end == pytest.approx([2, 2])
+
+
+def test_row_hit_and_turnaround():
+    env = simpy.Environment()
+    dram = BankedDRAM("t", env, 100, 16, channels=1, row_miss_ns=45, turnaround_ns=10)
+
+    def accesses():
+        yield env.process(dram.access_process(1, "a", False))
+        yield env.process(dram.access_process(1, "a", False))
+        yield env.process(dram.access_process(1, "a", True))
+
+    env.process(accesses())
+    env.run()
+    # read miss, read hit, write miss (new stream key) with turnaround
+    assert (dram.row_misses, dram.row_hits, dram.turnarounds) == (2, 1, 1)
+
+
+def test_accesses_finish_at_large_now():
+    # mixed sizes on shared channels far from t=0 must all drain
+    rng = random.Random(0)
+    env = simpy.Environment(initial_time=1e6)
+    dram = BankedDRAM("t", env, 25.6, 16, channels=4, row_miss_ns=45)
+    done = []
+
+    def stream(k):
+        for _ in range(20):
+            yield env.timeout(rng.random() * 0.01)
+            size = rng.choice([0.000512, 0.003, 0.0171, 0.25])
+            yield env.process(dram.access_process(size, k, rng.random() < 0.5))
+        done.append(k)
+
+    for k in range(8):
+        env.process(stream(k))
+    while env.peek() < float("inf"):
+        env.step()
+        assert dram.channel_bus.realloc_cnt < 10000, "DRAM accesses do not drain"
+    assert sorted(done) == list(range(8))
+    assert dram.active == 0
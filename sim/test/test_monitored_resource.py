@@ -0,0 +1,112 @@
+import simpy
+import numpy as np
+import pytest
+from monitored_resource import MonitoredResource, ResourceMonitor
+
+
+def test_release_spreads_over_bins():
+    mon = ResourceMonitor(bin_ms=1.0)
+    mon.release(0.5, 2.5, size_MB=4)
+    t, util = mon.utilization()
+    assert t == pytest.approx([0, 1, 2])
+    assert util == pytest.approx([0.5, 1, 0.5])
+    assert mon.bytes_MB[:3] == pytest.approx([1, 2, 1])
+    assert mon.summary()["busy_ms"] == pytest.approx(2)
+    assert mon.summary()["bytes_MB"] == pytest.approx(4)
+
+
+def test_shared_busy_time():
+    # a shared resource is busy for less than the whole [start,now)
+    mon = ResourceMonitor(bin_ms=1.0)
+    mon.release(0, 2, busy_ms=1)
+    # now on a bin edge opens the next bin, empty
+    assert mon.utilization()[1] == pytest.approx([0.5, 0.5, 0])
+    assert mon.tot_busy_ms == pytest.approx(1)
+
+
+def test_wait_spreads_over_bins():
+    mon = ResourceMonitor(bin_ms=1.0)
+    mon.grant(0.25, 0.75)
+    mon.grant(1.5, 3.5)
+    assert mon.wait_ms[:4] == pytest.approx([0.5, 0.5, 1, 0.5])
+    assert mon.tot_wait_ms == pytest.approx(2.5)
+    mon.grant(4, 4)
+    assert mon.tot_wait_ms == pytest.approx(2.5)
+
+
+def test_bins_merge_past_max_bins():
+    mon = ResourceMonitor(bin_ms=1.0, max_bins=4)
+    for i in range(4):
+        mon.request(i + 0.5, queue_len=i)
+        mon.release(i, i + 0.5, size_MB=1)
+    assert mon.bin_ms == 1.0
+    mon.release(9, 10, size_MB=1)
+    # 10 ms does not fit in 4 bins of 2 ms, the width doubles twice
+    assert mon.bin_ms == 4.0
+    assert len(mon.busy_ms) == 4
+    assert mon.bin_num == 3
+    assert mon.busy_ms[:3] == pytest.approx([2, 0, 1])
+    assert mon.bytes_MB[:3] == pytest.approx([4, 0, 1])
+    assert list(mon.queue_len[:3]) == [3, 0, 0]
+    assert mon.busy_ms.sum() == pytest.approx(mon.tot_busy_ms)
+    assert mon.max_queue_len == 3
+
+
+def test_totals_do_not_depend_on_bins():
+    rng = np.random.default_rng(0)
+    spans = np.sort(rng.random((200, 2)) * 1000, axis=1)
+    mons = [ResourceMonitor(bin_ms=0.5, max_bins=16), ResourceMonitor(bin_ms=0.5)]
+    for mon in mons:
+        for start, end in spans:
+            mon.release(start, end, size_MB=end - start)
+    assert mons[0].bin_ms > mons[1].bin_ms
+    for mon in mons:
+        assert mon.busy_ms.sum() == pytest.approx((spans[:, 1] - spans[:, 0]).sum())
+        assert mon.bytes_MB.sum() == pytest.approx(mon.tot_bytes_MB)
+    assert mons[0].summary() == pytest.approx(mons[1].summary())
+
+
+def use(env, res, hold, size):
+    with res.request(size_MB=size) as req:
+        yield req
+        yield env.timeout(hold)
+
+
+def test_monitored_resource_records_contention():
+    env = simpy.Environment()
+    res = MonitoredResource(env, capacity=1, bin_ms=1.0)
+    for _ in range(3):
+        env.process(use(env, res, 1.5, 2))
+    env.run()
+    s = res.monitor.summary()
+    assert s["req_cnt"] == 3
+    assert s["busy_ms"] == pytest.approx(4.5)
+    assert s["bytes_MB"] == pytest.approx(6)
+    assert s["wait_ms"] == pytest.approx(1.5 + 3)
+    assert s["max_queue_len"] == 2
+    assert res.monitor.utilization()[1] == pytest.approx([1, 1, 1, 1, 0.5])
+
+
+def test_cancelled_request_has_no_usage():
+    env = simpy.Environment()
+    res = MonitoredResource(env, capacity=1)
+
+    def impatient(env, res):
+        req = res.request(size_MB=1)
+        yield req | env.timeout(0.5)
+        res.release(req)
+
+    env.process(use(env, res, 1, 1))
+    env.process(impatient(env, res))
+    env.run()
+    assert res.monitor.tot_busy_ms == pytest.approx(1)
+    assert res.monitor.tot_bytes_MB == pytest.approx(1)
+
+
+def test_monitor_off():
+    env = simpy.Environment()
+    res = MonitoredResource(env, capacity=1, monitor=False)
+    env.process(use(env, res, 1, 1))
+    env.run()
+    assert res.monitor is None
+    assert env.now == 1
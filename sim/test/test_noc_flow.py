@@ -0,0 +1,73 @@
+import random
+import simpy
+import pytest
+from noc_flow import FlowNoC
+
+
+def run_flows(env, noc, flows):
+    # flows: [(start_ms, size_MB, links)], return end time of each flow
+    end = [None] * len(flows)
+
+    def one_flow(i, t, size, links):
+        yield env.timeout(t)
+        yield noc.transfer(size, links)
+        end[i] = env.now
+
+    for i, (t, size, links) in enumerate(flows):
+        env.process(one_flow(i, t, size, links))
+    env.run()
+    return end
+
+
+def test_max_min_fair_share():
+    # f0 & f1 share link 1, f2 is alone on link 2
+    env = simpy.Environment()
+    noc = FlowNoC(env, lambda link_id: 100)
+    end = run_flows(env, noc, [(0, 100, [0, 1]), (0, 100, [1]), (0, 100, [2])])
+    assert end == pytest.approx([2, 2, 1])
+
+
+def test_rate_rises_when_a_flow_finishes():
+    # f1 runs at 50 until f0 ends at 1 ms, then alone at 100
+    env = simpy.Environment()
+    noc = FlowNoC(env, lambda link_id: 100)
+    end = run_flows(env, noc, [(0, 50, [0]), (0, 100, [0])])
+    assert end == pytest.approx([1, 1.5])
+
+
+def test_bottleneck_frees_bandwidth_elsewhere():
+    # f0 is held to 10 by link 0, f1 gets the rest of link 1
+    env = simpy.Environment()
+    noc = FlowNoC(env, lambda link_id: 10 if link_id == 0 else 100)
+    end = run_flows(env, noc, [(0, 10, [0, 1]), (0, 90, [1])])
+    assert end == pytest.approx([1, 1])
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_drains_at_large_now(seed):
+    # time left below the float spacing of env.now must still finish the flow
+    rng = random.Random(seed)
+    env = simpy.Environment(initial_time=1e6)
+    noc = FlowNoC(env, lambda link_id: 1 + link_id % 3)
+    flows = [
+        (
+            rng.random() * 0.2,
+            rng.choice([0.000512, 0.003, 0.0171, 0.25]),
+            rng.sample(range(4), 2),
+        )
+        for _ in range(160)
+    ]
+    done = []
+
+    def one_flow(t, size, links):
+        yield env.timeout(t)
+        yield noc.transfer(size, links)
+        done.append(env.now)
+
+    for flow in flows:
+        env.process(one_flow(*flow))
+    while env.peek() < float("inf"):
+        env.step()
+        assert noc.realloc_cnt < 10 * len(flows), "flow model does not drain"
+    assert len(done) == len(flows)
+    assert noc.flows == []
@@ -0,0 +1,100 @@
+import io
+import random
+import contextlib
+import simpy
+import pytest
+from noc_reservation import LinkCalendar, ReservationNoC
+from wafer_device import Wafer_Device
+from ML import *
+
+
+def test_earliest_back_fills_a_gap():
+    cal = LinkCalendar()
+    cal.insert(0, 0, 1)
+    cal.insert(1, 3, 4)
+    assert cal.earliest(0, 2) == (1, 1)
+    assert cal.earliest(0, 2.5) == (4, 2)
+
+
+def test_touching_windows_merge():
+    cal = LinkCalendar()
+    cal.insert(0, 0, 1)
+    cal.insert(1, 2, 3)
+    cal.insert(1, 1, 2)
+    assert (cal.starts, cal.ends) == ([0], [3])
+
+
+def test_prune_drops_past_windows():
+    cal = LinkCalendar()
+    for i in range(4):
+        cal.insert(i, 2 * i, 2 * i + 1)
+    cal.prune(3)
+    assert (cal.starts, cal.ends) == ([4, 6], [5, 7])
+
+
+def test_reserve_store_and_forward():
+    # t0 reaches link 1 after its first hop, t1 fills the gap on link 1 before that
+    # t2 shares link 0 with t0 and waits for its window
+    noc = ReservationNoC(lambda link_id: 100, latency_ms=0.001)
+    assert noc.reserve(0, 100, [0, 1]) == pytest.approx(1.002)
+    assert noc.reserve(0, 100, [1]) == pytest.approx(1.001)
+    assert noc.reserve(0, 100, [0]) == pytest.approx(2.002)
+    assert noc.transfer_cnt == 3
+
+
+def run(mode, transfers):
+    # transfers: [(start_ms, size_MB, src, des)], return end time of each transfer
+    env = simpy.Environment()
+    with contextlib.redirect_stdout(io.StringIO()):
+        wd = Wafer_Device(
+            env,
+            tile_inter_shape=[1, 2],
+            tile_intra_shape=[3, 3],
+            Analytical=False,
+            noc_mode=mode,
+            resource_monitor=False,
+        )
+    end = [None] * len(transfers)
+
+    def one(i, t, size, src, des):
+        yield env.timeout(t)
+        yield from wd.noc_process(size, src, des)
+        end[i] = env.now
+
+    for i, transfer in enumerate(transfers):
+        env.process(one(i, *transfer))
+    env.run()
+    return end, wd
+
+
+@pytest.mark.parametrize(
+    "transfers",
+    [
+        [(0, 10, 0, 5)],
+        [(0, 10, 0, 5), (0, 10, 0, 5)],
+        [(0, 10, 0, 5), (0.5, 10, 1, 2)],
+        [(0, 10, 0, 2), (0, 10, 3, 5)],
+    ],
+)
+def test_matches_store_forward(transfers):
+    end, wd = run(noc_model.reservation, transfers)
+    assert end == pytest.approx(run(noc_model.store_forward, transfers)[0])
+    for t, (start, size, src, des) in zip(end, transfers):
+        assert t - start >= wd.noc_time(size, src, des) - 1e-12
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_close_to_store_forward_under_contention(seed):
+    # contention is resolved in issue order instead of link arrival order: the mean
+    # end time stays within 1%, a single late transfer can move the last one by ~7%
+    rng = random.Random(seed)
+    transfers = [
+        (rng.random(), rng.choice([1, 5, 20]), *rng.sample(range(18), 2))
+        for _ in range(40)
+    ]
+    end, wd = run(noc_model.reservation, transfers)
+    ref, _ = run(noc_model.store_forward, transfers)
+    for t, (start, size, src, des) in zip(end, transfers):
+        assert t - start >= wd.noc_time(size, src, des) - 1e-12
+    assert sum(end) == pytest.approx(sum(ref), rel=0.01)
+    assert max(end) == pytest.approx(max(ref), rel=0.1)
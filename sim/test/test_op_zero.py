@@ -0,0 +1,64 @@
+import pytest
+from op_pd import Oppd
+from ML import *
+from util import mulc
+
+# op, param, p_sgy with Nd=4
+OPS = [
+    (OP.Linear, [8, 1024, 512, 256], [4, 2, 1, 1]),
+    (OP.Conv2, [8, 64, 56, 56, 3, 1, 128], [4, 2, 1, 1, 1]),
+    (OP.Transformer, [4, 128, 1024, 16], [4, 2]),
+]
+
+
+def mapped(op_type, param, p_sgy, ZeRO):
+    op = Oppd(op_type, param, "op")
+    op.dpmap(list(range(mulc(p_sgy))), p_sgy)
+    op.set_ZeRO(ZeRO)
+    return op
+
+
+@pytest.mark.parametrize("op_type,param,p_sgy", OPS)
+def test_ZeRO_shards_and_comm(op_type, param, p_sgy):
+    Nd = p_sgy[0]
+    full = mapped(op_type, param, p_sgy, ZeRO_strategy.none).w_s_g_size_m
+    scale = {
+        ZeRO_strategy.none: [1, 1, 1],
+        ZeRO_strategy.ZeRO_1: [1, 1 / Nd, 1],
+        ZeRO_strategy.ZeRO_2: [1, 1 / Nd, 1 / Nd],
+        ZeRO_strategy.ZeRO_3: [1 / Nd, 1 / Nd, 1 / Nd],
+    }
+    dp = {
+        ZeRO_strategy.none: COMM.ALL_REDUCE,
+        ZeRO_strategy.ZeRO_1: (COMM.REDUCE_SCATTER, COMM.ALL_GATHER),
+        ZeRO_strategy.ZeRO_2: (COMM.REDUCE_SCATTER, COMM.ALL_GATHER),
+        ZeRO_strategy.ZeRO_3: COMM.REDUCE_SCATTER,
+    }
+    for ZeRO in scale:
+        op = mapped(op_type, param, p_sgy, ZeRO)
+        assert op.w_s_g_size_m == pytest.approx(
+            [w * s for w, s in zip(full, scale[ZeRO])]
+        )
+        assert op.w_s_g_access_m == pytest.approx(op.w_s_g_size_m)
+        assert op.f_b_u_comm_d[2].type == dp[ZeRO]
+        assert len(op.f_b_u_comm_d[2].device_group[0]) == Nd
+        gather = full[0] if ZeRO == ZeRO_strategy.ZeRO_3 else 0
+        for comm in op.ZeRO_comm_d:
+            assert comm.type == COMM.ALL_GATHER
+            assert comm.size == pytest.approx(gather)
+
+
+@pytest.mark.parametrize(
+    "op_type,param,p_sgy",
+    [
+        (OP.Pool, [8, 64, 56, 56, 2, 2], [4, 2, 1, 1]),
+        (OP.Embedding, [8, 128, 1024, 30522, 2, 512], [4, 2]),
+    ],
+)
+def test_ZeRO_not_modelled(op_type, param, p_sgy):
+    op = mapped(op_type, param, p_sgy, ZeRO_strategy.ZeRO_3)
+    assert (
+        op.w_s_g_size_m
+        == mapped(op_type, param, p_sgy, ZeRO_strategy.none).w_s_g_size_m
+    )
+    assert all(comm.No_comm() for comm in op.ZeRO_comm_d)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from conftest import pipe_end
+from pipe_eval import pipe_eval, pipe_order, BD, FD, UP
+from ML import pipe_strategy
+
+STRATEGIES = [pipe_strategy.GPipe, pipe_strategy.Megatron1F1B]
+# 4 stages, the slow stage 2 sets the pace
+FD_MS, BD_MS, UP_MS = [1, 1, 2, 1], [2, 2, 4, 2], [1, 1, 1, 1]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_order_runs_every_micro_batch_once(strategy):
+    phase, micro = pipe_order(4, 6, strategy)
+    for p, m in zip(phase, micro):
+        assert sorted(m[p == FD]) == list(range(6))
+        assert sorted(m[p == BD]) == list(range(6))
+    if strategy == pipe_strategy.Megatron1F1B:
+        # stage s runs 4-s-1 warmup forwards and one more before its first backward
+        assert list(np.argmax(phase == BD, axis=1)) == [4, 3, 2, 1]
+
+
+def test_gpipe_closed_form():
+    M = 8
+    start, end, phase, _ = pipe_eval(FD_MS, BD_MS, UP_MS, M)
+    # the slow stage runs back to back once filled, in both directions
+    fd_end = sum(FD_MS) + (M - 1) * max(FD_MS)
+    bd_end = fd_end + sum(BD_MS) + (M - 1) * max(BD_MS)
+    assert end[-1, M - 1] == pytest.approx(fd_end)
+    assert end[0, 2 * M - 1] == pytest.approx(bd_end)
+    assert (phase[:, -1] == UP).all()
+    assert end.max() == pytest.approx(bd_end + 1)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_configs_at_once(strategy):
+    fd = np.array([FD_MS, [2, 1, 1, 3]]).T
+    bd, up = 2 * fd, np.ones_like(fd)
+    start, end, _, _ = pipe_eval(fd, bd, up, 8, strategy, fetch_ms=[0.5, 0])
+    for n in range(2):
+        ref = pipe_eval(fd[:, n], bd[:, n], up[:, n], 8, strategy, fetch_ms=[0.5, 0][n])
+        assert start[..., n] == pytest.approx(ref[0])
+        assert end[..., n] == pytest.approx(ref[1])
+
+
+@pytest.mark.parametrize("net", ["ResNet50", "BERT_LARGE"])
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_evaluate_matches_simpy(make_pipeline, net, strategy):
+    full = make_pipeline(net, strategy)
+    full.register(boost_mode=False)
+    full.simpy_run(until_ms=1e12)
+    pipe = make_pipeline(net, strategy)
+    end_ms = pipe.evaluate()
+    assert end_ms == pytest.approx(pipe_end(full), rel=1e-12)
+    for stg, ref in zip(pipe.stages, full.stages):
+        assert [t[2] for t in stg.trace] == [t[2] for t in ref.trace]
+        assert np.array([t[:2] for t in stg.trace]) == pytest.approx(
+            np.array([t[:2] for t in ref.trace]), rel=1e-12
+        )
@@ -0,0 +1,47 @@
+import itertools
+import simpy
+import pytest
+from wafer_device import Wafer_Device
+
+
+def small_wd(**kw):
+    return Wafer_Device(
+        simpy.Environment(), tile_inter_shape=[2, 2], tile_intra_shape=[2, 3], **kw
+    )
+
+
+def pairs(wd):
+    n = wd.route_cache.tile_num
+    return [(s, d) for s, d in itertools.product(range(n), range(n)) if s != d]
+
+
+def test_closed_form_path_matches_hop_route():
+    wd = small_wd()
+    for s, d in pairs(wd):
+        assert wd._link_path(s, d) == wd._link_path_hops(s, d), (s, d)
+
+
+def test_cached_path_matches_uncached():
+    wd = small_wd()
+    for _ in range(2):
+        for s, d in pairs(wd):
+            assert list(wd.link_gen(s, d)) == wd._link_path(s, d)
+    assert wd.route_cache.misses == len(pairs(wd))
+    assert wd.route_cache.hits == len(pairs(wd))
+
+
+def test_lru_size_is_bounded():
+    wd = small_wd(route_cache_size=8)
+    for s, d in pairs(wd):
+        assert list(wd.link_gen(s, d)) == wd._link_path(s, d)
+    assert len(wd.route_cache) == 8
+
+
+def test_shape_change_refreshes_paths():
+    wd = small_wd()
+    wd.link_gen(0, 5)
+    wd.tile_intra_shape = [2, 4]
+    assert list(wd.link_gen(0, 5)) == wd._link_path(0, 5)
+    # in-place mutation would keep stale paths, shapes are immutable
+    with pytest.raises(TypeError):
+        wd.tile_intra_shape[1] = 3
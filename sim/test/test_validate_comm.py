@@ -0,0 +1,62 @@
+import io
+import contextlib
+import simpy
+import pytest
+from wafer_device import Wafer_Device
+from ML import *
+
+# the scenarios of wafer_device.validate_allreduce / validate_congestion
+GROUP_4 = [0, 1, 3, 2]
+GROUP_16 = [0, 1, 2, 3, 4, 5, 6, 7, 15, 14, 13, 12, 11, 10, 9, 8]
+SIZES = [64, 96, 128, 192, 768, 1536]
+RING_4_MS = [0.806, 1.206, 1.606, 2.406, 9.606, 19.206]
+RING_16_MS = [1.030, 1.530, 2.030, 3.030, 12.030, 24.030]
+
+
+def run(comm, size, group, analytical, **kw):
+    env = simpy.Environment()
+    with contextlib.redirect_stdout(io.StringIO()):
+        shape = [[1, 1], [2, 2]] if len(group) == 4 else [[1, 2], [2, 4]]
+        wd = Wafer_Device(
+            env,
+            tile_inter_shape=shape[0],
+            tile_intra_shape=shape[1],
+            tile_intra_noc_bw_GB=150,
+            tile_inter_noc_bw_GB=120,
+            with_dram_per_tile=True,
+            Analytical=analytical,
+            **kw
+        )
+        env.process(getattr(wd, comm + "_process")(size, group, "validate"))
+        env.run()
+    return env.now
+
+
+@pytest.mark.parametrize("analytical", [True, False])
+@pytest.mark.parametrize("size,ms", zip(SIZES, RING_4_MS))
+def test_allreduce_4(size, ms, analytical):
+    assert run("ALL_REDUCE", size, GROUP_4, analytical) == pytest.approx(ms)
+
+
+@pytest.mark.parametrize("size,ms", zip(SIZES, RING_16_MS))
+def test_allreduce_16(size, ms):
+    assert run("ALL_REDUCE", size, GROUP_16, True) == pytest.approx(ms)
+
+
+@pytest.mark.parametrize("mode", list(noc_model))
+def test_congestion_allreduce(mode):
+    # GROUP_16 is a physical ring, every NoC model gives the analytical time
+    assert run("ALL_REDUCE", 128, GROUP_16, False, noc_mode=mode) == pytest.approx(
+        2.030
+    )
+
+
+def test_congestion_all_2_all():
+    # pairwise shift with the link-load bound, was 1.064 ms (slowest transfer
+    # only) before the legacy all-to-all went through the collective schedules
+    t = run("ALL_2_ALL", 128, GROUP_16, True)
+    assert t == pytest.approx(4.9487, abs=1e-4)
+    # max-min fair sharing of the same links lands within 1%
+    assert run("ALL_2_ALL", 128, GROUP_16, False, noc_mode=noc_model.flow) == (
+        pytest.approx(t, rel=0.01)
+    )
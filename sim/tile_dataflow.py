@@ -8,6 +8,38 @@ from ML import *
 from comp_graph import CompGraph,OpNode
 from op_pd import CommOp
 
+def _ceil_div(a,b):
+    return -(-a//b)
+
+def compute_cycles_batch(shapes,array_shape,array_group=[2,2],cp_model=comp_model.SCALE_SIM):
+    '''
+    vectorized compute_cycles: shapes is (N,3) array of [SR,SC,T] gemm shapes
+    array_shape [R,C] and array_group [PR,PC] are one shape or (N,2) arrays, one per gemm
+    return (N,) int64 array of cycles
+    '''
+    shapes=np.asarray(shapes,dtype=np.int64).reshape(-1,3)
+    SR,SC,T=shapes[:,0],shapes[:,1],shapes[:,2]
+    array_shape=np.asarray(array_shape,dtype=np.int64)
+    array_group=np.asarray(array_group,dtype=np.int64)
+    R,C=array_shape[...,0],array_shape[...,1]
+    PR,PC=array_group[...,0],array_group[...,1]
+    assert((R>0).all() and (C>0).all()),'invalid PE array shape {}'.format(array_shape.tolist())
+    if cp_model==comp_model.SCALE_SIM:
+        sr=_ceil_div(SR,PR)
+        sc=_ceil_div(SC,PC)
+        return (2*R+C+T-2)*_ceil_div(sr,R)*_ceil_div(sc,C)
+    cost=T*_ceil_div(SR,R*PR)*_ceil_div(SC,C*PC)
+    if cp_model==comp_model.simple:
+        return cost
+    elif cp_model==comp_model.abrupt_curve:
+        factor=np.select(
+            [(SR%(PR*R)==0)&(SC%(PC*C)==0),SR%(PR*R)==0,(SR%R==0)&(SC%C==0),SR%R==0],
+            [1.0,1.2,1.8,2.0],
+            2.5)
+        return (factor*cost).astype(np.int64)
+    else:
+        raise NotImplementedError
+
 class Tile():# for compute process
     def __init__(self,env,tile_name='tx8',
                 sram_capacity_MB=3,
@@ -18,6 +50,7 @@ class Tile():# for compute process
                 dram_capacity_GB=6/16,
                 opt=OPTIMIZER.ADAM,
                 ZeRO=ZeRO_strategy.ZeRO_2,
+                seq_parallel=False,
                 Analytical=True
                 ) -> None:
         #info
@@ -36,13 +69,17 @@ class Tile():# for compute process
         #define compute 
         self.macs=macs
         self.array_group=[2,2]
-        self.array_shape=self.__shape_suppose(self.macs)
+        #each of the PR*PC PE arrays holds 1/(PR*PC) of the macs
+        [R,C]=self.__shape_suppose(self.macs)
+        #at least one PE per array, so every input takes the array model
+        self.array_shape=[max(1,R//self.array_group[0]),max(1,C//self.array_group[1])]
         self.cp_model=comp_model.SCALE_SIM
         self.freq=freq_GHz
         self.dataflow=dataflow.IS
         self.TOPS=self.macs*2*self.freq/1000
 
         self.ZeRO=ZeRO
+        self.seq_parallel=seq_parallel
         self.opt=opt
         # define store byte
         self.act_bytes=0
@@ -62,6 +99,7 @@ class Tile():# for compute process
         self.device_id=[]
         self.op_list=[]
         self.noc=None
+        self.plan={}
         ''''
         self.forward_event=[]
         self.dloss_event=[]
@@ -96,6 +134,10 @@ class Tile():# for compute process
         if size==1000 or size== 1024:
             R=32
             C=32
+        if R==0 and size>=1:
+            #other macs: C the power of 2 not above sqrt(macs), R*C<=macs
+            C=2**int(math.log2(math.sqrt(size)))
+            R=int(size)//C
         return [R,C]
     def compute_cycles(self,param:List[int]):
         '''
@@ -106,44 +148,36 @@ class Tile():# for compute process
         #reference: https://github.com/ARM-software/SCALE-Sim
         '''
         assert(len(param)==3)
-        [SR,SC,T]=param
-        [R,C]=self.array_shape
-        [PR,PC]=self.array_group
-        if self.cp_model==comp_model.SCALE_SIM:
-            sr=math.ceil(SR/PR)
-            sc=math.ceil(SC/PC)
-            return (2*R+C+T-2)*math.ceil(sr/R)*math.ceil(sc/C)
-        elif self.cp_model==comp_model.simple:
-            return T*math.ceil(SR/(R*PR))*math.ceil(SC/(C*SC))
-        elif self.cp_model==comp_model.abrupt_curve:
-            cost=T*math.ceil(SR/(R*PR))*math.ceil(SC/(C*SC))
-            if SR%(PR*R)==0 and SC%(PC*C)==0:
-                cost=1.0*cost
-            elif SR%(PR*R)==0 :
-                cost=1.2*cost
-            elif SR%R==0 and SC%C==0:
-                cost=1.8*cost
-            elif SR%R==0 :
-                cost=2.0*cost
-            else:
-                cost=2.5*cost
-            return int(cost)
-        else:
-            raise NotImplementedError
+        return int(compute_cycles_batch([param],self.array_shape,self.array_group,self.cp_model)[0])
+    def compute_cycles_batch(self,shapes):
+        '''
+        compute_cycles of (N,3) [SR,SC,T] shapes at once with this tile's PE array
+        '''
+        return compute_cycles_batch(shapes,self.array_shape,self.array_group,self.cp_model)
     #TODO 
     #each tile group may process one subgraph rather than one op
     #if there is one simple op，it is not nesscessary to use reccompute strategy
     #@fangjh21.20230602
 
-    def tile_comp_process(self,macs_m:Union[float,List[int]]):
+    def comp_time(self,macs_m:Union[float,List[int],List[List[int]]]):
         '''
-        this is the tile compute process
-        the input is macs(M) or [M,N,K] parameter
+        compute time (ms) of macs(M), [M,N,K] parameter or gemm list [[SR,SC,T,num],...] (CompOp.fd_gemm)
         '''
-        if isinstance(macs_m, list):
-            exetime = self.compute_cycles(macs_m) / self.freq / 1e6  # ns to ms
+        if isinstance(macs_m, list) and isinstance(macs_m[0], list):
+            shapes = np.array(macs_m)
+            cycles = (self.compute_cycles_batch(shapes[:, :3]) * shapes[:, 3]).sum()
+            return cycles / self.freq / 1e6  # ns to ms
+        elif isinstance(macs_m, list):
+            return self.compute_cycles(macs_m) / self.freq / 1e6  # ns to ms
         else:
-            exetime = 2 * macs_m / self.TOPS / 1e3  # us to ms
+            return 2 * macs_m / self.TOPS / 1e3  # us to ms
+    def tile_comp_process(self,macs_m:Union[float,List[int],List[List[int]]]):
+        '''
+        this is the tile compute process
+        the input is macs(M), [M,N,K] parameter or gemm list [[SR,SC,T,num],...] (CompOp.fd_gemm)
+        '''
+        yield from self.tile_comp_time_process(self.comp_time(macs_m))
+    def tile_comp_time_process(self,exetime):
         if not self.Analytical:
             with self.cp_worker.request() as req:
                     yield req
@@ -155,29 +189,21 @@ class Tile():# for compute process
         this is the tile communication process
         '''
         comm_mbytes=comm_op.size*self.comm_bytes
+        comm_list=[(comm_type,gp) for gp in comm_op.device_group for comm_type in comm_op.primitives()]
+        yield from self.tile_collective_process(comm_mbytes,comm_list,wd1,traffic_tpye,overlap)
+    def tile_collective_process(self,comm_mbytes,comm_list,wd1:wd,traffic_tpye:event=event.comm,overlap=False):
+        '''
+        comm_list: [(comm_type,device group),...] issued one by one
+        '''
         #here if communication can not overlap by compute time,the 'cm_worker' should to be 'cp_worker'
         if not self.Analytical:
             with (self.cm_worker.request() if overlap else self.cp_worker.request()) as req:
                     yield req       
-                    for gp in comm_op.device_group:
-                        if comm_op.type==COMM.ALL_REDUCE:
-                            yield wd1.env.process(wd1.ALL_2_ALL_process(comm_mbytes,gp,traffic_tpye))
-                        elif comm_op.type==COMM.ALL_2_ALL:
-                            yield wd1.env.process(wd1.ALL_REDUCE_process(comm_mbytes,gp,traffic_tpye))
-                        elif comm_op.type==COMM.NONE:
-                            pass
-                        else:
-                            pass
+                    for comm_type,gp in comm_list:
+                        yield wd1.env.process(wd1.collective_process(comm_type,comm_mbytes,gp,traffic_tpye))
         else:
-            for gp in comm_op.device_group:
-                if comm_op.type==COMM.ALL_REDUCE:
-                    yield wd1.env.process(wd1.ALL_2_ALL_process(comm_mbytes,gp,traffic_tpye))
-                elif comm_op.type==COMM.ALL_2_ALL:
-                    yield wd1.env.process(wd1.ALL_REDUCE_process(comm_mbytes,gp,traffic_tpye))
-                elif comm_op.type==COMM.NONE:
-                    pass
-                else:
-                    pass
+            for comm_type,gp in comm_list:
+                yield wd1.env.process(wd1.collective_process(comm_type,comm_mbytes,gp,traffic_tpye))
     def mapping_analysis(self,stage_info,device:List[int],op_list:List[OpNode],wd1:wd,train:bool):
         #init 
         #device_gp=device
@@ -201,6 +227,7 @@ class Tile():# for compute process
         #dram/sram allocation for each op with parallism  and recompute strategy
         # @fangjh21.20230602
         for op in op_list:
+            op.seq_parallel=self.seq_parallel
             op.set_ZeRO(ZeRO)
             w_s_g_size_m=op.w_s_g_size_m
             #print(op)
@@ -287,649 +314,599 @@ class Tile():# for compute process
         self.analysis_backward_process(self.env,map_ana,device,op_list,wd1)
         self.analysis_weight_update_process(self.env,map_ana,device,op_list,wd1)
         '''
+        self.compile_plan()
         return  self.map_ana
     
-    def forward_process(self):
-        def analysis_template_event(param=[None,None,None,None,None,None,None,None,None,None,None]):
-            assert(len(param)==11)
-            #param=[wt_load,act_fetch,wt_load,act_fetch,Zero_comm,comp,intra_act_store,out_act_store,intra_act_store,out_act_store]
-            event_list=[]
-            comm_event=None
-            if(param[0]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[0]*self.buffer_bytes*len(self.device_id),group_id=self.device_id,task_id=event.wt_load,multicast=False))
-            if(param[1]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[1]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.act_fetch,multicast=False))
-            if(param[2]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[2]*self.buffer_bytes,self.device_id,event.wt_load,WRITE=False))
-            if(param[3]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[3]*self.act_bytes,self.device_id,event.act_fetch,WRITE=False))
-            if(param[4]!=None):
-                #ZeRO communication 
-                event_list.append(self.tile_comm_process(param[4],self.noc,event.comm))
-            if(param[5]!=None):
-                #compute 
-                event_list.append(self.tile_comp_process(param[5]))
-            if(param[6]!=None):
-                #communication 
-                comm_event=self.tile_comm_process(param[6],self.noc,event.comm)
-            if(param[7]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[7]*self.act_bytes,self.device_id,event.act_store,WRITE=True))
-            if(param[8]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[8]*self.act_bytes,self.device_id,event.act_store,WRITE=True))
-            if(param[9]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[9]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.act_store,gather=True))
-            if(param[10]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[10]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.act_store,gather=True))
-            return event_list,comm_event
-        dataflow0,sram1,recomputes2,tiledram3,edgedram4=self.map_ana
-        for op in self.op_list:#@fangjh21.20230609
-            access_size_m=0
-            #print(op.type)
-            #print(op.ZeRO_comm_d[0])
-            #print(op.f_b_u_comm_d[0])
-            param=[None,None,None,None,op.ZeRO_comm_d[0],op.fd_macs_m,op.f_b_u_comm_d[0] ,None,None,None,None]
-            #param[0],param[1] edge dram read
-            #param[2],param[3] tile dram read
-            #param[4]=op.ZeRO_comm_d[0] 
-            #param[5]=op.fd_macs_m
-            #param[6]=op.f_b_u_comm_d[0] 
-            #param[7],param[8] tile dram write
-            #param[9],param[10] edge dram write
-            if sram1==store_strategy.ACT_weight:
-                #ideal situation
-                pass
-            elif sram1==store_strategy.ACT:
-                if tiledram3==store_strategy.weight:
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            param[2]=op.w_s_g_access_m[0]                           
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)      
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            param[2]=op.w_s_g_access_m[0]                            
-                        elif dataflow0==dataflow.IS:
-                            param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m)                           
-                        else:
-                            raise NotImplementedError
+    def compile_plan(self):
+        '''
+        compile each op into an immutable plan after mapping_analysis, the runtime processes only replay it
+        plan[phase][op] = ((parallel steps, trailing comm step or None), ...)
+        step = (plan_step, size, task_id, group):
+            edge/tile dram read/write: size MB with bytes included, group is the tile group
+            comp: size is the compute time (ms)
+            comm/comm_overlap: size MB, group is ((comm_type, device group), ...) issued in order
+        '''
+        G=len(self.device_id)
+        a,b,f=self.act_bytes,self.buffer_bytes,self.full_bytes
+        er,ew,tr,tw=plan_step.edge_read,plan_step.edge_write,plan_step.tile_read,plan_step.tile_write
+        cm,cp=plan_step.comm,plan_step.comp
+        #slot of each template param: (plan_step,task_id,bytes,scaled by group size)
+        fd_slots=[(er,event.wt_load,b,True),(er,event.act_fetch,a,True),(tr,event.wt_load,b,False),(tr,event.act_fetch,a,False),
+                  (cm,event.comm,0,False),(cp,None,0,False),(cm,event.comm,0,False),
+                  (tw,event.act_store,a,False),(tw,event.act_store,a,False),(ew,event.act_store,a,True),(ew,event.act_store,a,True)]
+        re_slots=[(er,event.wt_load,b,True),(er,event.act_fetch,a,True),(tr,event.wt_load,b,False),(tr,event.act_fetch,a,False),
+                  (cm,event.comm,0,False),(cp,None,0,False),(cm,event.comm,0,False),
+                  (tw,event.act_store,a,True),(ew,event.act_store,a,True)]
+        dloss_slots=[(er,event.wt_load,b,True),(er,event.grad_fetch,a,True),(tr,event.wt_load,b,False),(tr,event.grad_fetch,a,False),
+                  (cm,event.comm,0,False),(cp,None,0,False),(cm,event.comm,0,False),
+                  (tw,event.grad_store,a,False),(ew,event.grad_store,a,True)]
+        dW_slots=[(er,event.act_fetch,a,True),(er,event.grad_fetch,a,True),(er,event.opt_load,f,True),
+                  (tr,event.act_fetch,a,False),(tr,event.grad_fetch,a,False),(tr,event.opt_load,f,False),
+                  (cm,event.comm,0,False),(cp,None,0,False),(cm,event.comm,0,False),
+                  (tw,event.opt_store,f,False),(tw,event.wt_store,f,False),(ew,event.opt_store,f,True),(ew,event.wt_store,f,True)]
+        #DP communication of update overlaps with compute
+        up_slots=[(er,event.wt_load,f,True),(er,event.grad_fetch,f,True),(tr,event.wt_load,f,False),(tr,event.grad_fetch,f,False),
+                  (plan_step.comm_overlap,event.comm,0,False),(tw,event.wt_load,f,False),(ew,event.wt_load,f,True)]
+        def stage(param,slots,comm_slot=None):
+            assert(len(param)==len(slots))
+            steps=[]
+            comm=None
+            for i,(value,(kind,task_id,nbytes,scaled)) in enumerate(zip(param,slots)):
+                if value is None:
+                    continue
+                if kind==cp:
+                    step=(cp,self.comp_time(value),None,self.device_id)
+                elif kind in (cm,plan_step.comm_overlap):
+                    step=(kind,value.size*self.comm_bytes,task_id,
+                          tuple((comm_type,gp) for gp in value.device_group for comm_type in value.primitives()))
                 else:
-                    raise NotImplementedError  
-            elif sram1==store_strategy.weight:
-                if tiledram3==store_strategy.ACT:
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            param[3]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[7]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            param[3]=temp_input_size_m
-                            param[7]=temp_input_size_m
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[7]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        elif dataflow0==dataflow.IS:
-                            param[3]=op.intra_act_access_m
-                            param[7]=op.intra_act_access_m
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        else:
-                            raise NotImplementedError
+                    step=(kind,value*nbytes*(G if scaled else 1),task_id,self.device_id)
+                if i==comm_slot:
+                    comm=step
                 else:
-                    raise NotImplementedError
-            elif sram1==store_strategy.cache:
-                if tiledram3==store_strategy.ACT_weight:
-                    assert(edgedram4==store_strategy.none)
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            param[2]=op.w_s_g_access_m[0]
-                            param[3]=temp_input_size_m*max(1,op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[7]=temp_input_size_m*max(1,op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)
-                            param[3]=temp_input_size_m
-                            param[7]=temp_input_size_m
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        elif dataflow0==dataflow.OS:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            param[2]=op.w_s_g_access_m[0]
-                            param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[7]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        elif dataflow0==dataflow.IS:
-                            param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            param[3]=op.intra_act_access_m
-                            param[7]=op.intra_act_access_m
-                            param[8]=mulc(op.o_shape)/1000/1000 #TODO
-                        elif dataflow0==dataflow.OS:
-                            raise NotImplementedError
-                elif tiledram3==store_strategy.ACT:
-                    assert(edgedram4==store_strategy.weight and dataflow0==dataflow.WS)
-                    raise NotImplementedError
-                elif tiledram3==store_strategy.weight:
-                    assert(edgedram4==store_strategy.ACT and dataflow0==dataflow.WS)
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO    
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    steps.append(step)
+            return (tuple(steps),comm)
+        plan={'forward':[],'backward':[],'update':[]}
+        for op in self.op_list:
+            plan['forward'].append((stage(self.__forward_param(op),fd_slots,6),))
+            re_param,dloss_param,dW_param=self.__backward_param(op)
+            #the trailing comm of dW is not issued
+            stages=[stage(dloss_param,dloss_slots,6),(stage(dW_param,dW_slots,8)[0],None)]
+            if self.map_ana[2]==recompute_strategy.all:
+                stages.insert(0,stage(re_param,re_slots,6))
+            plan['backward'].append(tuple(stages))
+            plan['update'].append((stage(self.__update_param(op),up_slots),))
+        self.plan={k:tuple(v) for k,v in plan.items()}
+        return self.plan
 
-                        elif dataflow0==dataflow.IS:
-                            access_size_m=op.intra_act_access_m
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
-                        else:
-                            raise NotImplementedError           
-                elif tiledram3==store_strategy.cache:
-                    assert(edgedram4==store_strategy.ACT_weight)
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            param[0]=op.w_s_g_access_m[0]
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m
-                            param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)  
-                            param[0]=op.w_s_g_access_m[0]
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
-                        elif dataflow0==dataflow.IS:
-                            access_size_m=op.intra_act_access_m
-                            param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
-                            param[1]=access_size_m
-                            param[9]=access_size_m
-                            param[10]=mulc(op.o_shape)/1000/1000 #TODO 
-                        else:
-                            raise NotImplementedError
-            else:
-                raise NotImplementedError
-            #please notice that the bytes number is considered in execute_template_event function
-            events,comm_event=analysis_template_event(param)
-            execute_event=[self.env.process(event) for event in events]
-            #print("forward_process start @ {:.3f} ms".format(self.env.now))
+    def plan_dump(self,path=None):
+        '''
+        readable plan of each op, written to path if given
+        '''
+        lines=[]
+        for phase,op_plans in self.plan.items():
+            for op,op_plan in zip(self.op_list,op_plans):
+                lines.append('{} {}:({},{})'.format(phase,op.hint_name,op.type,op.param_dim))
+                for i,(steps,comm) in enumerate(op_plan):
+                    for step in steps:
+                        lines.append('  stage{} {}'.format(i,self.__step_str(step)))
+                    if comm is not None:
+                        lines.append('  stage{} then {}'.format(i,self.__step_str(comm)))
+        text='\n'.join(lines)
+        if path is not None:
+            with open(path,'w') as f:
+                f.write(text)
+        return text
+
+    def __step_str(self,step):
+        kind,size,task_id,group=step
+        if kind in (plan_step.comm,plan_step.comm_overlap):
+            group=[(str(comm_type),len(gp)) for comm_type,gp in group]
+        else:
+            group=len(group)
+        return '{} size={:.6g} task={} group={}'.format(kind,size,task_id,group)
+
+    def __step_process(self,step):
+        kind,size,task_id,group=step
+        if kind==plan_step.edge_read:
+            return self.noc.dram_read_group_process(access_size_MB=size,group_id=group,task_id=task_id,multicast=False)
+        elif kind==plan_step.edge_write:
+            return self.noc.dram_write_group_process(access_size_MB=size,group_id=group,task_id=task_id,gather=True)
+        elif kind==plan_step.tile_read:
+            return self.noc.tile_dram_group_access_process(size,group,task_id,WRITE=False)
+        elif kind==plan_step.tile_write:
+            return self.noc.tile_dram_group_access_process(size,group,task_id,WRITE=True)
+        elif kind==plan_step.comp:
+            return self.tile_comp_time_process(size)
+        else:
+            return self.tile_collective_process(size,group,self.noc,task_id,kind==plan_step.comm_overlap)
+
+    def __plan_process(self,op_plan):
+        for steps,comm in op_plan:
+            execute_event=[self.env.process(self.__step_process(step)) for step in steps]
             yield simpy.AllOf(self.env,execute_event)
-            yield self.env.process(comm_event)
-            #print("forward_process end @ {:.3f} ms".format(self.env.now))
+            if comm is not None:
+                yield self.env.process(self.__step_process(comm))
+
+    def forward_process(self):
+        for op_plan in self.plan['forward']:
+            yield from self.__plan_process(op_plan)
 
     def backward_process(self):
-        def analysis_template_recompute_event(param=[None,None,None,None,None,None,None,None,None]):
-            assert(len(param)==9)
-            #param=[wt_load,act_fetch,wt_load,act_fetch,Zero_comm,comp,intra_act_store,out_act_store,intra_act_store,out_act_store]
-            event_list=[]
-            comm_event=None
-            if(param[0]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[0]*self.buffer_bytes*len(self.device_id),group_id=self.device_id,task_id=event.wt_load,multicast=False))
-            if(param[1]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[1]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.act_fetch,multicast=False))
-            if(param[2]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[2]*self.buffer_bytes,self.device_id,event.wt_load,WRITE=False))
-            if(param[3]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[3]*self.act_bytes,self.device_id,event.act_fetch,WRITE=False))
-            if(param[4]!=None):
-                #ZeRO communication 
-                event_list.append(self.tile_comm_process(param[4],self.noc,event.comm))
-            if(param[5]!=None):
-                #compute 
-                event_list.append(self.tile_comp_process(param[5]))
-            if(param[6]!=None):
-                #communication 
-                comm_event=self.tile_comm_process(param[6],self.noc,event.comm)
-            if(param[7]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[7]*self.act_bytes*len(self.device_id),self.device_id,event.act_store,WRITE=True))
-            if(param[8]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[8]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.act_store,gather=True))
-            if event_list==[]:
-                event_list=[None]
-            return event_list,comm_event
-        def analysis_template_dloss_event(param=[None,None,None,None,None,None,None,None,None]):  
-            assert(len(param)==9)
-            event_list=[]
-            comm_event=None
-            if(param[0]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[0]*self.buffer_bytes*len(self.device_id),group_id=self.device_id,task_id=event.wt_load,multicast=False))
-            if(param[1]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[1]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.grad_fetch,multicast=False))
-            if(param[2]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[2]*self.buffer_bytes,self.device_id,event.wt_load,WRITE=False))
-            if(param[3]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[3]*self.act_bytes,self.device_id,event.grad_fetch,WRITE=False))
+        for op_plan in self.plan['backward']:
+            yield from self.__plan_process(op_plan)
 
-            if(param[4]!=None):
-                #ZeRO communication 
-                event_list.append(self.tile_comm_process(param[4],self.noc,event.comm))
-            if(param[5]!=None):
-                #compute 
-                event_list.append(self.tile_comp_process(param[5]))
-            if(param[6]!=None):
-                #communication 
-                comm_event=self.tile_comm_process(param[6],self.noc,event.comm)
-            if(param[7]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[7]*self.act_bytes,self.device_id,event.grad_store,WRITE=True))
-            if(param[8]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[8]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.grad_store,gather=True))
-            if event_list==[]:
-                event_list=[None]
-            return event_list,comm_event
-        def analysis_template_dW_event(param=[None,None,None,None,None,None,None,None,None,None,None,None,None]):  
-            assert(len(param)==13)
-            event_list=[]
-            comm_event=None
-            if(param[0]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[0]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.act_fetch,multicast=False))
-            if(param[1]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[1]*self.act_bytes*len(self.device_id),group_id=self.device_id,task_id=event.grad_fetch,multicast=False))
-            if(param[2]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[2]*self.full_bytes*len(self.device_id),group_id=self.device_id,task_id=event.opt_load,multicast=False))
-            if(param[3]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[3]*self.act_bytes,self.device_id,event.act_fetch,WRITE=False))
-            if(param[4]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[4]*self.act_bytes,self.device_id,event.grad_fetch,WRITE=False))
-            if(param[5]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[5]*self.full_bytes,self.device_id,event.opt_load,WRITE=False))
-            if(param[6]!=None):
-                #ZeRO communication 
-                event_list.append(self.tile_comm_process(param[6],self.noc,event.comm))
-            if(param[7]!=None):
-                #compute 
-                event_list.append(self.tile_comp_process(param[7]))
-            if(param[8]!=None):
-                #communication 
-                comm_event=self.tile_comm_process(param[8],self.noc,event.comm)
-            if(param[9]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[9]*self.full_bytes,self.device_id,event.opt_store,WRITE=True))
-            if(param[10]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[10]*self.full_bytes,self.device_id,event.wt_store,WRITE=True))
-            if(param[11]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[11]*self.full_bytes*len(self.device_id),group_id=self.device_id,task_id=event.opt_store,gather=True))
-            if(param[12]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[12]*self.full_bytes*len(self.device_id),group_id=self.device_id,task_id=event.wt_store,gather=True))
-            if event_list==[]:
-                event_list=[None]
-            return event_list,comm_event 
+    def update_process(self):
+        for op_plan in self.plan['update']:
+            yield from self.__plan_process(op_plan)
+    def __forward_param(self,op):
         dataflow0,sram1,recomputes2,tiledram3,edgedram4=self.map_ana
+        access_size_m=0
+        #print(op.type)
+        #print(op.ZeRO_comm_d[0])
+        #print(op.f_b_u_comm_d[0])
+        param=[None,None,None,None,op.ZeRO_comm_d[0],op.fd_gemm or op.fd_macs_m,op.f_b_u_comm_d[0] ,None,None,None,None]
+        #param[0],param[1] edge dram read
+        #param[2],param[3] tile dram read
+        #param[4]=op.ZeRO_comm_d[0] 
+        #param[5]=op.fd_macs_m
+        #param[6]=op.f_b_u_comm_d[0] 
+        #param[7],param[8] tile dram write
+        #param[9],param[10] edge dram write
+        if sram1==store_strategy.ACT_weight:
+            #ideal situation
+            pass
+        elif sram1==store_strategy.ACT:
+            if tiledram3==store_strategy.weight:
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        param[2]=op.w_s_g_access_m[0]                           
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)      
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        param[2]=op.w_s_g_access_m[0]                            
+                    elif dataflow0==dataflow.IS:
+                        param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m)                           
+                    else:
+                        raise NotImplementedError
+            else:
+                raise NotImplementedError  
+        elif sram1==store_strategy.weight:
+            if tiledram3==store_strategy.ACT:
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        param[3]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[7]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        param[3]=temp_input_size_m
+                        param[7]=temp_input_size_m
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[7]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    elif dataflow0==dataflow.IS:
+                        param[3]=op.intra_act_access_m
+                        param[7]=op.intra_act_access_m
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    else:
+                        raise NotImplementedError
+            else:
+                raise NotImplementedError
+        elif sram1==store_strategy.cache:
+            if tiledram3==store_strategy.ACT_weight:
+                assert(edgedram4==store_strategy.none)
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        param[2]=op.w_s_g_access_m[0]
+                        param[3]=temp_input_size_m*max(1,op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[7]=temp_input_size_m*max(1,op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)
+                        param[3]=temp_input_size_m
+                        param[7]=temp_input_size_m
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    elif dataflow0==dataflow.OS:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        param[2]=op.w_s_g_access_m[0]
+                        param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[7]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    elif dataflow0==dataflow.IS:
+                        param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        param[3]=op.intra_act_access_m
+                        param[7]=op.intra_act_access_m
+                        param[8]=mulc(op.o_shape)/1000/1000 #TODO
+                    elif dataflow0==dataflow.OS:
+                        raise NotImplementedError
+            elif tiledram3==store_strategy.ACT:
+                assert(edgedram4==store_strategy.weight and dataflow0==dataflow.WS)
+                raise NotImplementedError
+            elif tiledram3==store_strategy.weight:
+                assert(edgedram4==store_strategy.ACT and dataflow0==dataflow.WS)
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO    
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
 
-        for op in self.op_list:
-            #9,9,13
-            re_param    =[None,None,None,None,op.ZeRO_comm_d[0],op.fd_macs_m,op.f_b_u_comm_d[0] ,None,None]
-            dloss_param =[None,None,None,None,op.ZeRO_comm_d[1],op.fd_macs_m,op.f_b_u_comm_d[1],None,None]
-            dW_param    =[None,None,None,None,None,None,None,op.fd_macs_m,None,None,None,None,None]
-            if sram1==store_strategy.ACT_weight:
-                #ideal situation
-                pass
-            elif sram1==store_strategy.ACT:
-                if tiledram3==store_strategy.weight:
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            re_param[2]=op.w_s_g_access_m[0]   
-                            dloss_param[2]=op.w_s_g_access_m[0] 
-                            dW_param[5]=op.w_s_g_access_m[1]
-                        elif dataflow0==dataflow.IS:   
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            total_size_m=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.sram_capacity_m) 
-                            re_param[2]=total_size_m
-                            total_size_m=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m) 
-                            dloss_param[2]=total_size_m
-                            dW_param[5]=op.w_s_g_access_m[1]
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            re_param[2]=op.w_s_g_access_m[0] 
-                            dloss_param[2]=op.w_s_g_access_m[0]  
-                            dW_param[5]=op.w_s_g_access_m[1]
-                        elif dataflow0==dataflow.IS:
-                            re_param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m) 
-                            dloss_param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m) 
-                            dW_param[5]=op.w_s_g_access_m[1]
-                        else:
-                            raise NotImplementedError
-                else:
-                    raise NotImplementedError  
-            elif sram1==store_strategy.weight:
-                if tiledram3==store_strategy.ACT:
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            re_param[3]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            re_param[7]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            dloss_param[3]=access_size_m
-                            dloss_param[7]=access_size_m
-                            dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            dW_param[4]=op.intra_act_access_m
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            re_param[3]=temp_input_size_m
-                            re_param[7]=temp_input_size_m
-                            dloss_param[3]=op.intra_act_access_m
-                            dloss_param[7]=op.intra_act_access_m
-                            dW_param[3]=op.intra_act_access_m
-                            dW_param[4]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            re_param[3]=temp_size_m
-                            re_param[7]=temp_size_m
-                            dloss_param[3]=temp_size_m
-                            dloss_param[7]=temp_size_m
-                            dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            dW_param[4]=op.intra_act_access_m
-                        elif dataflow0==dataflow.IS:
-                            re_param[3]=op.intra_act_access_m
-                            re_param[7]=op.intra_act_access_m
-                            dloss_param[3]=op.intra_act_access_m
-                            dloss_param[7]=op.intra_act_access_m
-                            dW_param[3]=op.intra_act_access_m
-                            dW_param[4]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                        else:
-                            raise NotImplementedError
-                else:
-                    raise NotImplementedError
-            elif sram1==store_strategy.cache:
-                if tiledram3==store_strategy.ACT_weight:
-                    assert(edgedram4==store_strategy.none)
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            re_param[2]=op.w_s_g_access_m[0]
-                            re_param[3]=temp_input_size_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            re_param[7]=temp_input_size_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            dloss_param[2]=op.w_s_g_access_m[0]
-                            dloss_param[3]=op.intra_act_access_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            dloss_param[7]=op.intra_act_access_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            dW_param[4]=op.intra_act_access_m
-                            dW_param[5]=op.w_s_g_access_m[1]
-                            dW_param[9]=op.w_s_g_access_m[1]
-                            dW_param[10]=op.w_s_g_access_m[2]
+                    elif dataflow0==dataflow.IS:
+                        access_size_m=op.intra_act_access_m
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    else:
+                        raise NotImplementedError           
+            elif tiledram3==store_strategy.cache:
+                assert(edgedram4==store_strategy.ACT_weight)
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        param[0]=op.w_s_g_access_m[0]
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m
+                        param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)  
+                        param[0]=op.w_s_g_access_m[0]
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    elif dataflow0==dataflow.IS:
+                        access_size_m=op.intra_act_access_m
+                        param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
+                        param[1]=access_size_m
+                        param[9]=access_size_m
+                        param[10]=mulc(op.o_shape)/1000/1000 #TODO 
+                    else:
+                        raise NotImplementedError
+        else:
+            raise NotImplementedError
+        return param
+    def __backward_param(self,op):
+        dataflow0,sram1,recomputes2,tiledram3,edgedram4=self.map_ana
+        #9,9,13
+        re_param    =[None,None,None,None,op.ZeRO_comm_d[0],op.fd_gemm or op.fd_macs_m,op.f_b_u_comm_d[0] ,None,None]
+        dloss_param =[None,None,None,None,op.ZeRO_comm_d[1],op.dloss_gemm or op.fd_macs_m,op.f_b_u_comm_d[1],None,None]
+        dW_param    =[None,None,None,None,None,None,None,op.dW_gemm or op.fd_macs_m,None,None,None,None,None]
+        if sram1==store_strategy.ACT_weight:
+            #ideal situation
+            pass
+        elif sram1==store_strategy.ACT:
+            if tiledram3==store_strategy.weight:
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        re_param[2]=op.w_s_g_access_m[0]   
+                        dloss_param[2]=op.w_s_g_access_m[0] 
+                        dW_param[5]=op.w_s_g_access_m[1]
+                    elif dataflow0==dataflow.IS:   
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        total_size_m=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.sram_capacity_m) 
+                        re_param[2]=total_size_m
+                        total_size_m=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m) 
+                        dloss_param[2]=total_size_m
+                        dW_param[5]=op.w_s_g_access_m[1]
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        re_param[2]=op.w_s_g_access_m[0] 
+                        dloss_param[2]=op.w_s_g_access_m[0]  
+                        dW_param[5]=op.w_s_g_access_m[1]
+                    elif dataflow0==dataflow.IS:
+                        re_param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m) 
+                        dloss_param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m) 
+                        dW_param[5]=op.w_s_g_access_m[1]
+                    else:
+                        raise NotImplementedError
+            else:
+                raise NotImplementedError  
+        elif sram1==store_strategy.weight:
+            if tiledram3==store_strategy.ACT:
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        re_param[3]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        re_param[7]=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        dloss_param[3]=access_size_m
+                        dloss_param[7]=access_size_m
+                        dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        dW_param[4]=op.intra_act_access_m
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        re_param[3]=temp_input_size_m
+                        re_param[7]=temp_input_size_m
+                        dloss_param[3]=op.intra_act_access_m
+                        dloss_param[7]=op.intra_act_access_m
+                        dW_param[3]=op.intra_act_access_m
+                        dW_param[4]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        re_param[3]=temp_size_m
+                        re_param[7]=temp_size_m
+                        dloss_param[3]=temp_size_m
+                        dloss_param[7]=temp_size_m
+                        dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        dW_param[4]=op.intra_act_access_m
+                    elif dataflow0==dataflow.IS:
+                        re_param[3]=op.intra_act_access_m
+                        re_param[7]=op.intra_act_access_m
+                        dloss_param[3]=op.intra_act_access_m
+                        dloss_param[7]=op.intra_act_access_m
+                        dW_param[3]=op.intra_act_access_m
+                        dW_param[4]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                    else:
+                        raise NotImplementedError
+            else:
+                raise NotImplementedError
+        elif sram1==store_strategy.cache:
+            if tiledram3==store_strategy.ACT_weight:
+                assert(edgedram4==store_strategy.none)
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        re_param[2]=op.w_s_g_access_m[0]
+                        re_param[3]=temp_input_size_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        re_param[7]=temp_input_size_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        dloss_param[2]=op.w_s_g_access_m[0]
+                        dloss_param[3]=op.intra_act_access_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        dloss_param[7]=op.intra_act_access_m*max(1,self.act_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        dW_param[4]=op.intra_act_access_m
+                        dW_param[5]=op.w_s_g_access_m[1]
+                        dW_param[9]=op.w_s_g_access_m[1]
+                        dW_param[10]=op.w_s_g_access_m[2]
 
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            re_param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)
-                            re_param[3]=temp_input_size_m
-                            re_param[7]=temp_input_size_m
-                            dloss_param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)
-                            dloss_param[3]=op.intra_act_access_m
-                            dloss_param[7]=op.intra_act_access_m
-                            dW_param[3]=op.intra_act_access_m
-                            dW_param[4]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            dW_param[5]=op.w_s_g_access_m[1]
-                            dW_param[9]=op.w_s_g_access_m[1]
-                            dW_param[10]=op.w_s_g_access_m[2]
-                        elif dataflow0==dataflow.OS:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            re_param[2]=op.w_s_g_access_m[0]
-                            temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            re_param[3]=temp_size_m
-                            re_param[7]=temp_size_m
-                            re_param[2]=op.w_s_g_access_m[0]
-                            temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            re_param[3]=temp_size_m
-                            re_param[7]=temp_size_m
-                            dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            dW_param[4]=op.intra_act_access_m
-                            dW_param[5]=op.w_s_g_access_m[1]
-                            dW_param[9]=op.w_s_g_access_m[1]
-                            dW_param[10]=op.w_s_g_access_m[2]
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        re_param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)
+                        re_param[3]=temp_input_size_m
+                        re_param[7]=temp_input_size_m
+                        dloss_param[2]=op.w_s_g_access_m[0]*max(1,self.buffer_bytes*temp_input_size_m/self.sram_capacity_m)
+                        dloss_param[3]=op.intra_act_access_m
+                        dloss_param[7]=op.intra_act_access_m
+                        dW_param[3]=op.intra_act_access_m
+                        dW_param[4]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        dW_param[5]=op.w_s_g_access_m[1]
+                        dW_param[9]=op.w_s_g_access_m[1]
+                        dW_param[10]=op.w_s_g_access_m[2]
+                    elif dataflow0==dataflow.OS:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        re_param[2]=op.w_s_g_access_m[0]
+                        temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        re_param[3]=temp_size_m
+                        re_param[7]=temp_size_m
+                        re_param[2]=op.w_s_g_access_m[0]
+                        temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        re_param[3]=temp_size_m
+                        re_param[7]=temp_size_m
+                        dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        dW_param[4]=op.intra_act_access_m
+                        dW_param[5]=op.w_s_g_access_m[1]
+                        dW_param[9]=op.w_s_g_access_m[1]
+                        dW_param[10]=op.w_s_g_access_m[2]
   
-                        elif dataflow0==dataflow.IS:
-                            re_param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            re_param[3]=op.intra_act_access_m
-                            re_param[7]=op.intra_act_access_m
-                            dloss_param[2]=op.w_s_g_access_m[0]
-                            temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
-                            dloss_param[3]=temp_size_m
-                            dloss_param[7]=temp_size_m
-                            dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
-                            dW_param[4]=op.intra_act_access_m
-                            dW_param[5]=op.w_s_g_access_m[1]
-                            dW_param[9]=op.w_s_g_access_m[1]
-                            dW_param[10]=op.w_s_g_access_m[2]
+                    elif dataflow0==dataflow.IS:
+                        re_param[2]=op.w_s_g_access_m[0]*max(1,self.act_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        re_param[3]=op.intra_act_access_m
+                        re_param[7]=op.intra_act_access_m
+                        dloss_param[2]=op.w_s_g_access_m[0]
+                        temp_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.sram_capacity_m)
+                        dloss_param[3]=temp_size_m
+                        dloss_param[7]=temp_size_m
+                        dW_param[3]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.sram_capacity_m)
+                        dW_param[4]=op.intra_act_access_m
+                        dW_param[5]=op.w_s_g_access_m[1]
+                        dW_param[9]=op.w_s_g_access_m[1]
+                        dW_param[10]=op.w_s_g_access_m[2]
 
-                        elif dataflow0==dataflow.OS:
-                            raise NotImplementedError
-                elif tiledram3==store_strategy.ACT:
-                    assert(edgedram4==store_strategy.weight and dataflow0==dataflow.WS)
-                    raise NotImplementedError
-                elif tiledram3==store_strategy.weight:
-                    assert(edgedram4==store_strategy.ACT and dataflow0==dataflow.WS)
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m  
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m
-                            dW_param[0]=access_size_m
-                            dW_param[1]=op.intra_act_access_m
+                    elif dataflow0==dataflow.OS:
+                        raise NotImplementedError
+            elif tiledram3==store_strategy.ACT:
+                assert(edgedram4==store_strategy.weight and dataflow0==dataflow.WS)
+                raise NotImplementedError
+            elif tiledram3==store_strategy.weight:
+                assert(edgedram4==store_strategy.ACT and dataflow0==dataflow.WS)
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m  
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m
+                        dW_param[0]=access_size_m
+                        dW_param[1]=op.intra_act_access_m
 
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            re_param[1]=temp_input_size_m
-                            re_param[8]=temp_input_size_m
-                            dloss_param[1]=op.intra_act_access_m
-                            dloss_param[8]=op.intra_act_access_m
-                            dW_param[0]=op.intra_act_access_m
-                            dW_param[1]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m
-                            dW_param[0]=access_size_m
-                            dW_param[1]=op.intra_act_access_m
-                        elif dataflow0==dataflow.IS:
-                            access_size_m=op.intra_act_access_m
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m
-                            dW_param[0]=op.intra_act_access_m
-                            dW_param[1]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        re_param[1]=temp_input_size_m
+                        re_param[8]=temp_input_size_m
+                        dloss_param[1]=op.intra_act_access_m
+                        dloss_param[8]=op.intra_act_access_m
+                        dW_param[0]=op.intra_act_access_m
+                        dW_param[1]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m
+                        dW_param[0]=access_size_m
+                        dW_param[1]=op.intra_act_access_m
+                    elif dataflow0==dataflow.IS:
+                        access_size_m=op.intra_act_access_m
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m
+                        dW_param[0]=op.intra_act_access_m
+                        dW_param[1]=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
                         
-                        else:
-                            raise NotImplementedError           
-                elif tiledram3==store_strategy.cache:
-                    assert(edgedram4==store_strategy.ACT_weight)
-                    if recomputes2==recompute_strategy.all:
-                        if dataflow0==dataflow.WS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            re_param[0]=op.w_s_g_access_m[0]
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m 
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            dloss_param[0]=op.w_s_g_access_m[0]
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m 
-                            dW_param[0]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
-                            dW_param[1]=op.intra_act_access_m
-                            dW_param[2]=op.w_s_g_access_m[1]
-                            dW_param[11]=op.w_s_g_access_m[1]
-                            dW_param[12]=op.w_s_g_access_m[2]
-                        elif dataflow0==dataflow.IS:
-                            temp_input_size_m=mulc(op.i_shape)/1000/1000
-                            access_size_m=temp_input_size_m
-                            re_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m
-                            access_size_m=op.intra_act_access_m
-                            dloss_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m 
-                            dW_param[0]=op.intra_act_access_m*max(1,self.act_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
-                            dW_param[1]=op.intra_act_access_m
-                            dW_param[2]=op.w_s_g_access_m[1]
-                            dW_param[11]=op.w_s_g_access_m[1]
-                            dW_param[12]=op.w_s_g_access_m[2]
-                        else:
-                            raise NotImplementedError
-                    else:#without recompute strategy
-                        if dataflow0==dataflow.WS:
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            re_param[0]=op.w_s_g_access_m[0]
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m
-                            access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
-                            dloss_param[0]=op.w_s_g_access_m[0]
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m 
-                            dW_param[0]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
-                            dW_param[1]=op.intra_act_access_m
-                            dW_param[2]=op.w_s_g_access_m[1]
-                            dW_param[11]=op.w_s_g_access_m[1]
-                            dW_param[12]=op.w_s_g_access_m[2]
-                        elif dataflow0==dataflow.IS:
-                            access_size_m=op.intra_act_access_m
-                            re_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
-                            re_param[1]=access_size_m
-                            re_param[8]=access_size_m
-                            access_size_m=op.intra_act_access_m
-                            dloss_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
-                            dloss_param[1]=access_size_m
-                            dloss_param[8]=access_size_m 
-                            dW_param[0]=op.intra_act_access_m*max(1,self.act_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
-                            dW_param[1]=op.intra_act_access_m
-                            dW_param[2]=op.w_s_g_access_m[1]
-                            dW_param[11]=op.w_s_g_access_m[1]
-                            dW_param[12]=op.w_s_g_access_m[2]
-                        else:
-                            raise NotImplementedError
-            else:
-                raise NotImplementedError
-            
-            if recomputes2==recompute_strategy.all:
-                events,comm_event=analysis_template_recompute_event(re_param)
-                execute_event=[self.env.process(event) for event in events]
-                yield simpy.AllOf(self.env,execute_event)
-                yield self.env.process(comm_event)
-            else:
-                pass
-            events,comm_event=analysis_template_dloss_event(dloss_param)
-            execute_event=[self.env.process(event) for event in events]
-            yield simpy.AllOf(self.env,execute_event)
-            yield self.env.process(comm_event)
-            events,comm_event=analysis_template_dW_event(dW_param)
-            execute_event=[self.env.process(event) for event in events]
-            yield simpy.AllOf(self.env,execute_event)
-            #if comm_event!=None:
-            #    yield self.env.process(comm_event)
-    def update_process(self):
-        def analysis_template_event(param=[None,None,None,None,None,None,None]):
-            assert(len(param)==7)
-            event_list=[]
-            if(param[0]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[0]*self.full_bytes*len(self.device_id),group_id=self.device_id,task_id=event.wt_load,multicast=False))
-            if(param[1]!=None):
-                event_list.append(self.noc.dram_read_group_process(access_size_MB=param[1]*self.full_bytes*len(self.device_id),group_id=self.device_id,task_id=event.grad_fetch,multicast=False))
-            if(param[2]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[2]*self.full_bytes,self.device_id,event.wt_load,WRITE=False))
-            if(param[3]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[3]*self.full_bytes,self.device_id,event.grad_fetch,WRITE=False))
-            if(param[4]!=None):
-                #DP communication 
-                event_list.append(self.tile_comm_process(param[4],self.noc,event.comm,True))
-            if(param[5]!=None):
-                event_list.append(self.noc.tile_dram_group_access_process(param[5]*self.full_bytes,self.device_id,event.wt_load,WRITE=True))
-            if(param[6]!=None):
-                event_list.append(self.noc.dram_write_group_process(access_size_MB=param[6]*self.full_bytes*len(self.device_id),group_id=self.device_id,task_id=event.wt_load,gather=True))
-            return event_list
+                    else:
+                        raise NotImplementedError           
+            elif tiledram3==store_strategy.cache:
+                assert(edgedram4==store_strategy.ACT_weight)
+                if recomputes2==recompute_strategy.all:
+                    if dataflow0==dataflow.WS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        re_param[0]=op.w_s_g_access_m[0]
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m 
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        dloss_param[0]=op.w_s_g_access_m[0]
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m 
+                        dW_param[0]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
+                        dW_param[1]=op.intra_act_access_m
+                        dW_param[2]=op.w_s_g_access_m[1]
+                        dW_param[11]=op.w_s_g_access_m[1]
+                        dW_param[12]=op.w_s_g_access_m[2]
+                    elif dataflow0==dataflow.IS:
+                        temp_input_size_m=mulc(op.i_shape)/1000/1000
+                        access_size_m=temp_input_size_m
+                        re_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m
+                        access_size_m=op.intra_act_access_m
+                        dloss_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m 
+                        dW_param[0]=op.intra_act_access_m*max(1,self.act_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
+                        dW_param[1]=op.intra_act_access_m
+                        dW_param[2]=op.w_s_g_access_m[1]
+                        dW_param[11]=op.w_s_g_access_m[1]
+                        dW_param[12]=op.w_s_g_access_m[2]
+                    else:
+                        raise NotImplementedError
+                else:#without recompute strategy
+                    if dataflow0==dataflow.WS:
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        re_param[0]=op.w_s_g_access_m[0]
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m
+                        access_size_m=op.intra_act_access_m*max(1,self.buffer_bytes*op.w_s_g_access_m[0]/self.tile_dram_capacity_m)
+                        dloss_param[0]=op.w_s_g_access_m[0]
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m 
+                        dW_param[0]=op.intra_act_access_m*max(1,self.buffer_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
+                        dW_param[1]=op.intra_act_access_m
+                        dW_param[2]=op.w_s_g_access_m[1]
+                        dW_param[11]=op.w_s_g_access_m[1]
+                        dW_param[12]=op.w_s_g_access_m[2]
+                    elif dataflow0==dataflow.IS:
+                        access_size_m=op.intra_act_access_m
+                        re_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
+                        re_param[1]=access_size_m
+                        re_param[8]=access_size_m
+                        access_size_m=op.intra_act_access_m
+                        dloss_param[0]=op.w_s_g_access_m[0]*max(1,self.act_bytes*temp_input_size_m/self.tile_dram_capacity_m)
+                        dloss_param[1]=access_size_m
+                        dloss_param[8]=access_size_m 
+                        dW_param[0]=op.intra_act_access_m*max(1,self.act_bytes*op.intra_act_access_m/self.tile_dram_capacity_m)
+                        dW_param[1]=op.intra_act_access_m
+                        dW_param[2]=op.w_s_g_access_m[1]
+                        dW_param[11]=op.w_s_g_access_m[1]
+                        dW_param[12]=op.w_s_g_access_m[2]
+                    else:
+                        raise NotImplementedError
+        else:
+            raise NotImplementedError
+        return re_param,dloss_param,dW_param
+    def __update_param(self,op):
         dataflow0,sram1,recomputes2,tiledram3,edgedram4=self.map_ana
-        for op in self.op_list:
-            update_param=[None,None,None,None,op.f_b_u_comm_d[2],None,None]
-            if sram1==store_strategy.ACT_weight:
-                #ideal situation
+        update_param=[None,None,None,None,op.f_b_u_comm_d[2],None,None]
+        if sram1==store_strategy.ACT_weight:
+            #ideal situation
+            pass
+        elif sram1==store_strategy.ACT:
+            if tiledram3==store_strategy.weight:
+                update_param[2]=1
+                update_param[3]=1
+            else:
+                raise NotImplementedError  
+        elif sram1==store_strategy.weight:
+            if tiledram3==store_strategy.ACT:
                 pass
-            elif sram1==store_strategy.ACT:
-                if tiledram3==store_strategy.weight:
-                    update_param[2]=1
-                    update_param[3]=1
-                else:
-                    raise NotImplementedError  
-            elif sram1==store_strategy.weight:
-                if tiledram3==store_strategy.ACT:
-                    pass
-                else:
-                    raise NotImplementedError
-            elif sram1==store_strategy.cache:
-                if tiledram3==store_strategy.ACT_weight:
-                    assert(edgedram4==store_strategy.none)
-                    update_param[2]=op.w_s_g_access_m[0]
-                    update_param[3]=op.w_s_g_access_m[1]
-                    update_param[5]=op.w_s_g_access_m[0]
-                elif tiledram3==store_strategy.ACT:
-                    assert(edgedram4==store_strategy.weight and dataflow0==dataflow.WS)
-                    update_param[0]=op.w_s_g_access_m[0]
-                    update_param[1]=op.w_s_g_access_m[1]
-                    update_param[6]=op.w_s_g_access_m[0]
-                elif tiledram3==store_strategy.weight:
-                    assert(edgedram4==store_strategy.ACT and dataflow0==dataflow.WS)
-                    update_param[2]=op.w_s_g_access_m[0]
-                    update_param[3]=op.w_s_g_access_m[1]
-                    update_param[5]=op.w_s_g_access_m[0]
-                elif tiledram3==store_strategy.cache:
-                    assert(edgedram4==store_strategy.ACT_weight)
-                    update_param[0]=op.w_s_g_access_m[0]
-                    update_param[1]=op.w_s_g_access_m[1]
-                    update_param[6]=op.w_s_g_access_m[0]
             else:
                 raise NotImplementedError
-            events=analysis_template_event(update_param)
-            execute_event=[self.env.process(event) for event in events]
-            yield simpy.AllOf(self.env,execute_event)
+        elif sram1==store_strategy.cache:
+            if tiledram3==store_strategy.ACT_weight:
+                assert(edgedram4==store_strategy.none)
+                update_param[2]=op.w_s_g_access_m[0]
+                update_param[3]=op.w_s_g_access_m[1]
+                update_param[5]=op.w_s_g_access_m[0]
+            elif tiledram3==store_strategy.ACT:
+                assert(edgedram4==store_strategy.weight and dataflow0==dataflow.WS)
+                update_param[0]=op.w_s_g_access_m[0]
+                update_param[1]=op.w_s_g_access_m[1]
+                update_param[6]=op.w_s_g_access_m[0]
+            elif tiledram3==store_strategy.weight:
+                assert(edgedram4==store_strategy.ACT and dataflow0==dataflow.WS)
+                update_param[2]=op.w_s_g_access_m[0]
+                update_param[3]=op.w_s_g_access_m[1]
+                update_param[5]=op.w_s_g_access_m[0]
+            elif tiledram3==store_strategy.cache:
+                assert(edgedram4==store_strategy.ACT_weight)
+                update_param[0]=op.w_s_g_access_m[0]
+                update_param[1]=op.w_s_g_access_m[1]
+                update_param[6]=op.w_s_g_access_m[0]
+        else:
+            raise NotImplementedError
+        return update_param
 
     
 
@@ -265,6 +265,27 @@ def visualize_resource(
     return data_list
 
 
+# NOTE: busy ratio of each monitor time bin * max_resource
+def visualize_monitor(monitor, path, name, max_resource=256):
+    if monitor is None or monitor.req_cnt == 0:
+        return None
+    t, util = monitor.utilization()
+    data_list = [
+        (t[i], t[i] + monitor.bin_ms, util[i] * max_resource) for i in range(len(t))
+    ]
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    plt.step(t, util * max_resource, where="post", color="b")
+    plt.xlabel("Time(ms)")
+    plt.ylabel("Bandwidth(GB/s)")
+    plt.title(str(monitor.summary()), fontsize=6)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    plt.savefig(os.path.join(path, name + ".png"))
+    plt.close()
+    return data_list
+
+
 def draw_mapping(wd, ml_name, tiles=[], path="status", ori=False):
     fig = plt.figure(figsize=(12, 12))
     ax = fig.add_subplot(111)
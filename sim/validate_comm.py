@@ -693,15 +693,15 @@ class Wafer_Device:
                 shutil.rmtree(f_path)
         if res_type == "all":
             for index, res in enumerate(self.edge_dram_resource):
-                visualize_resource(
-                    res.access_resource.data,
+                visualize_monitor(
+                    res.access_resource.monitor,
                     path + "edge_dram",
                     str(index),
                     max_resource=self.edge_die_dram_bw_GB,
                 )
             for index, res in enumerate(self.dram_per_tile_resource):
-                visualize_resource(
-                    res.access_resource.data,
+                visualize_monitor(
+                    res.access_resource.monitor,
                     path + "3ddram",
                     str(index),
                     max_resource=self.tile_dram_bw_GB,
@@ -710,31 +710,31 @@ class Wafer_Device:
             path2 = path + "intra_noc"
             for index, res in enumerate(self.link_resource):
                 if self.is_inter_link(index):
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path1,
                         str(index),
                         max_resource=self.tile_inter_noc_bw_GB,
                     )
                 else:
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path2,
                         str(index),
                         max_resource=self.tile_intra_noc_bw_GB,
                     )
         elif res_type == "edge_dram":
             for index, res in enumerate(self.edge_dram_resource):
-                visualize_resource(
-                    res.access_resource.data,
+                visualize_monitor(
+                    res.access_resource.monitor,
                     path + "edge_dram",
                     str(index),
                     max_resource=self.edge_die_dram_bw_GB,
                 )
         elif res_type == "3ddram":
             for index, res in enumerate(self.dram_per_tile_resource):
-                visualize_resource(
-                    res.access_resource.data,
+                visualize_monitor(
+                    res.access_resource.monitor,
                     path + "3ddram",
                     str(index),
                     max_resource=self.tile_dram_bw_GB,
@@ -744,15 +744,15 @@ class Wafer_Device:
             path2 = path + "intra_noc"
             for index, res in enumerate(self.link_resource):
                 if self.is_inter_link(index):
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path1,
                         str(index),
                         max_resource=self.tile_inter_noc_bw_GB,
                     )
                 else:
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path2,
                         str(index),
                         max_resource=self.tile_intra_noc_bw_GB,
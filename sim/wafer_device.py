@@ -1,11 +1,19 @@
 import simpy
-from monitored_resource import MonitoredResource as Resource
+import numpy as np
+from monitored_resource import MonitoredResource as Resource, LazyResourceList
 from typing import List, Union
 import random
+import copy
+import functools
 from util import *
 from functools import wraps
 import shutil
 from ML import *
+from route_cache import RouteCache
+from noc_flow import FlowNoC
+from noc_reservation import ReservationNoC
+from dram_bank import BankedDRAM, dram_access_time
+import collective
 
 # packet: (id, shape, size, meta)
 class Packet:
@@ -34,7 +42,7 @@ class Packet:
         return Packet(id=id, shape=shape)
 
 
-class DDR_model:
+class DDR_model(BankedDRAM):
     def __init__(
         self,
         name,
@@ -44,27 +52,28 @@ class DDR_model:
         die_num,
         per_die_cap_GB,
         bit_width=32,
+        monitor=True,
+        **dram_param,
     ) -> None:
-        self.name = name
         self.transfer_rate_M = transfer_rate_M
         self.channel_num = channel_num
         self.die_num = die_num
         self.die_cap_GB = per_die_cap_GB
         self.bit_width = bit_width
-        self.capacity = die_num * per_die_cap_GB
-        self.env = env
-        self.access_resource = Resource(self.env, capacity=1)
-        self.bandwidth = transfer_rate_M * bit_width / 8 * channel_num
-    # NOTE: latency = (size)/bw
-    def access_process(self, data_size_MB, task_id=1, write=True, DEBUG_MODE=False):
-        with self.access_resource.request() as req:
-            yield req
-            latency = data_size_MB / self.bandwidth
-            # latency+=self.write_latency if write else self.read_latency
-            yield self.env.timeout(latency)
+        # MT/s * byte per transfer = MB/s, /1000 -> GB/s == MB/ms
+        self.bandwidth = transfer_rate_M * bit_width / 8 * channel_num / 1000
+        super().__init__(
+            name,
+            env,
+            self.bandwidth,
+            die_num * per_die_cap_GB,
+            channels=channel_num,
+            monitor=monitor,
+            **dram_param,
+        )
 
 
-class dram_model:
+class dram_model(BankedDRAM):
     def __init__(
         self,
         name,
@@ -73,23 +82,20 @@ class dram_model:
         capacity_GB=16 * 100,
         read_latency_ms=0,
         write_latency_ms=0,
+        monitor=True,
+        **dram_param,
     ) -> None:
-        self.name = name
-        self.bw_GB = bw_GB
+        # TODO consider the dram capacity influence for total ml network
+        # @fangjh21.20230602: related to embedding op when ml network is recommend system like DLRM ,etc.
+        super().__init__(name, env, bw_GB, capacity_GB, monitor=monitor, **dram_param)
         self.read_latency = read_latency_ms
         self.write_latency = write_latency_ms
 
-        # TODO consider the dram capacity influence for total ml network
-        # @fangjh21.20230602: related to embedding op when ml network is recommend system like DLRM ,etc.
-        self.capacity = capacity_GB
-        self.env = env
-        self.access_resource = Resource(self.env, capacity=1)
-    # NOTE: latency = size/bw + write_latency or read_latency
+    # NOTE: latency = banked access + write_latency or read_latency
     def access_process(self, data_size_MB, task_id=1, write=True, DEBUG_MODE=False):
-        with self.access_resource.request() as req:
-            yield req
-            latency = data_size_MB / self.bw_GB
-            latency += self.write_latency if write else self.read_latency
+        yield from super().access_process(data_size_MB, task_id, write, DEBUG_MODE)
+        latency = self.write_latency if write else self.read_latency
+        if latency > 0:
             yield self.env.timeout(latency)
 
 
@@ -108,8 +114,35 @@ class Wafer_Device:
         clk_freq_GHz=1,
         with_dram_per_tile=True,
         Analytical=True,
+        route_cache_size=None,
+        noc_mode=noc_model.store_forward,
+        resource_monitor=True,
+        ring_reorder=True,
+        comm_algo=comm_algo.auto,
+        comm_memo=False,
+        tile_dram_channels=4,
+        edge_dram_channels=8,
+        dram_banks=16,
+        dram_row_hit_ns=15,
+        dram_row_miss_ns=45,
+        dram_turnaround_ns=10,
+        edge_ddr=None,
+        edge_dram_select=dram_select.nearest,
     ) -> None:
         self.wafer_name = wafer_name
+        # route_cache_size: None=unbounded, n=LRU with n paths, 0=disable
+        self.route_cache = RouteCache(0, route_cache_size)
+        # ring_reorder: reorder collective group into a short ring on the mesh
+        self.ring_reorder = ring_reorder
+        # comm_algo: collective algorithm, auto=least estimated time per call
+        self.comm_algo = comm_algo
+        self.comm_algo_table = {}
+        # comm_memo: Analytical only, reuse (algo, time) of a collective seen before
+        # NOTE: simulated collectives always run their transfers, a replay holding no link
+        # would let transfers issued meanwhile see idle links
+        self.comm_memo = comm_memo
+        self.comm_memo_table = {}
+        self.comm_memo_hits = 0
 
         self.tile_intra_shape = tile_intra_shape
         self.tile_inter_shape = tile_inter_shape
@@ -124,13 +157,56 @@ class Wafer_Device:
         self.clk_freq_GHz = clk_freq_GHz
         self.noc_response_latency_ms = 0.001
         self.dram_response_latency_ms = 0.001
+        # NOTE: banked DRAM timing, the same parameters in analytical & simulation mode
+        self.tile_dram_channels = tile_dram_channels
+        self.dram_param = dict(
+            banks=dram_banks,
+            ctrl_latency_ms=self.dram_response_latency_ms,
+            row_hit_ns=dram_row_hit_ns,
+            row_miss_ns=dram_row_miss_ns,
+            turnaround_ns=dram_turnaround_ns,
+        )
+        # edge_ddr: DDR_model parameters of one edge controller
+        # (transfer_rate_M, channel_num, die_num, per_die_cap_GB, bit_width)
+        # None: x32 channels whose transfer rate gives edge_die_dram_bw_GB
+        if edge_ddr is None:
+            edge_ddr = dict(
+                transfer_rate_M=edge_die_dram_bw_GB * 1000 * 8 / 32 / edge_dram_channels,
+                channel_num=edge_dram_channels,
+                die_num=2,
+                per_die_cap_GB=16,
+                bit_width=32,
+            )
+        self.edge_ddr = edge_ddr
+        self.edge_die_dram_bw_GB = (
+            edge_ddr["transfer_rate_M"]
+            * edge_ddr.get("bit_width", 32)
+            / 8
+            * edge_ddr["channel_num"]
+            / 1000
+        )
+        self.edge_dram_channels = edge_ddr["channel_num"]
+        self.edge_dram_select = edge_dram_select
         self.route_XY = "X"
         self.device_dist = {}
         self.device()
         # simpy env and resource define @fangjh21.20230602
         self.env = env
         self.Analytical = Analytical
+        # NOTE: noc_mode only works in simulation mode
+        # store_forward: hop by hop link Resource, flow: max-min fair fluid model
+        # wormhole: whole path link Resource reserved at once, cut-through timing
+        # reservation: per link busy calendar, store-and-forward window booked at issue time
+        self.noc_mode = noc_mode
+        # resource_monitor=False: no utilization counters are kept
+        self.resource_monitor = resource_monitor
         if not Analytical:
+            if self.noc_mode == noc_model.flow:
+                self.flow_noc = FlowNoC(self.env, self.link_bw)
+            elif self.noc_mode == noc_model.reservation:
+                self.noc_calendar = ReservationNoC(
+                    self.link_bw, self.noc_response_latency_ms
+                )
             self.link_resource = []
             self.dram_per_tile_resource = []
             # maybe in real system,there is one dram per die
@@ -138,6 +214,70 @@ class Wafer_Device:
             self.edge_dram_resource = []
             self.__create_resource()
 
+    # NOTE: route table depends on route_XY & mesh shape, reset it once they change
+    @property
+    def route_XY(self):
+        return self._route_XY
+
+    @route_XY.setter
+    def route_XY(self, value):
+        self._route_XY = value
+        self.route_cache_clear()
+
+    @property
+    def tile_intra_shape(self):
+        return self._tile_intra_shape
+
+    # NOTE: shapes are stored as tuples, the route cache is only cleared on assignment
+    @tile_intra_shape.setter
+    def tile_intra_shape(self, value):
+        self._tile_intra_shape = tuple(value)
+        self.route_cache_clear()
+
+    @property
+    def tile_inter_shape(self):
+        return self._tile_inter_shape
+
+    @tile_inter_shape.setter
+    def tile_inter_shape(self, value):
+        self._tile_inter_shape = tuple(value)
+        self.route_cache_clear()
+
+    # NOTE: shallow copy of wd whose bandwidths are arrays of shape (N,), for N configs at once
+    # the *_time methods, collective.estimate and STAGE_PASS_time of the copy return arrays
+    # routes and ring orders (by the bandwidth of wd) are shared with wd, cost tables are not
+    def batch_view(self, tile_intra_noc_bw_GB, tile_inter_noc_bw_GB, tile_dram_bw_GB):
+        view = copy.copy(self)
+        view.tile_intra_noc_bw_GB = np.asarray(tile_intra_noc_bw_GB, float)
+        view.tile_inter_noc_bw_GB = np.asarray(tile_inter_noc_bw_GB, float)
+        view.tile_dram_bw_GB = np.asarray(tile_dram_bw_GB, float)
+        view.ring_order = self.ring_order
+        for table in (
+            "noc_cost_table",
+            "multicast_table",
+            "stage_pass_table",
+            "comm_algo_table",
+            "comm_profile_table",
+            "comm_memo_table",
+        ):
+            setattr(view, table, {})
+        return view
+
+    def route_cache_clear(self):
+        self.noc_cost_table = {}
+        self.ring_table = {}
+        self.multicast_table = {}
+        self.stage_pass_table = {}
+        self.comm_algo_table = {}
+        self.comm_profile_table = {}
+        self.comm_memo_table = {}
+        if hasattr(self, "_tile_intra_shape") and hasattr(self, "_tile_inter_shape"):
+            self.route_cache.clear(
+                mulc(self._tile_intra_shape) * mulc(self._tile_inter_shape)
+            )
+        else:
+            self.route_cache.clear()
+
     def wafer_info(func):
         @wraps(func)
         def wrapper(self, *args, **kwargs):
@@ -229,40 +369,46 @@ class Wafer_Device:
 
     # NOTE: create NoC, Edge DRAM (num = x1), tile DRAM
     @wafer_info
+    # NOTE: resources are created on first use, list length & index are unchanged
     def __create_resource(self):
         x0 = self.tile_intra_shape[0]
         x1 = self.tile_inter_shape[0]
         y0 = self.tile_intra_shape[1]
         y1 = self.tile_inter_shape[1]
         # here I define the noc link is occupied by only one process until the process release it.
-        for _ in range(y0 * y1 - 1):
-            for _ in range(x0 * x1):
-                self.link_resource.append(Resource(self.env, capacity=1))
-        for _ in range(y0 * y1):
-            for _ in range(x0 * x1 - 1):
-                self.link_resource.append(Resource(self.env, capacity=1))
+        link_num = (y0 * y1 - 1) * x0 * x1 + y0 * y1 * (x0 * x1 - 1)
+        self.link_resource = LazyResourceList(
+            link_num,
+            lambda _: Resource(self.env, capacity=1, monitor=self.resource_monitor),
+        )
         print("noc link resource is created...")
-        for _ in range(x1):
-            self.edge_dram_resource.append(
-                dram_model("DDR", self.env, self.edge_die_dram_bw_GB)
-            )  # left dram
-        for _ in range(x1):
-            self.edge_dram_resource.append(
-                dram_model("DDR", self.env, self.edge_die_dram_bw_GB)
-            )  # right dram
+        # left dram + right dram
+        self.edge_dram_resource = LazyResourceList(
+            2 * x1,
+            lambda _: DDR_model(
+                "DDR",
+                self.env,
+                monitor=self.resource_monitor,
+                **self.edge_ddr,
+                **self.dram_param,
+            ),
+        )
         print("edge dram resource is created...")
 
         if self.with_dram_per_tile:
             tile_dram_num = x1 * x0 * y1 * y0
-            for _ in range(tile_dram_num):
-                self.dram_per_tile_resource.append(
-                    dram_model(
-                        "3DDRAM",
-                        self.env,
-                        self.tile_dram_bw_GB,
-                        self.tile_dram_capacity_GB,
-                    )
-                )
+            self.dram_per_tile_resource = LazyResourceList(
+                tile_dram_num,
+                lambda _: dram_model(
+                    "3DDRAM",
+                    self.env,
+                    self.tile_dram_bw_GB,
+                    self.tile_dram_capacity_GB,
+                    channels=self.tile_dram_channels,
+                    monitor=self.resource_monitor,
+                    **self.dram_param,
+                ),
+            )
             print("tile dram resource is created...")
 
     # NOTE: get # of hops == |src.x-dst.x| + |src.y-dst.y|
@@ -277,6 +423,71 @@ class Wafer_Device:
         else:
             return (min_id % y) - (max_id % y) + (max_id // y)
     
+    def ring_hops(self, group_id: List[int]):
+        return sum(
+            self.Manhattan_hops(group_id[i - 1], group_id[i])
+            for i in range(len(group_id))
+        )
+
+    # ring step time is set by its slowest edge: compare (slowest edge, total hops)
+    # edge time of a reference chunk_MB, inter-die links are slower than intra-die ones
+    def ring_cost(self, group_id: List[int], chunk_MB=1):
+        step_ms = functools.reduce(
+            np.maximum,
+            [
+                self.noc_time(chunk_MB, group_id[i - 1], group_id[i])
+                for i in range(len(group_id))
+            ],
+        )
+        return (step_ms, self.ring_hops(group_id))
+
+    # NOTE: minimum-hop ring of a comm group, cached per group
+    # 1. snake order by row and by column
+    # 2. 2-opt on squared hops (long edge is punished): reverse a segment while the ring improves
+    # 3. keep the fastest of given order, snakes and 2-opt results by ring_cost
+    def ring_order(self, group_id: List[int], max_pass=8):
+        key = tuple(group_id)
+        order = self.ring_table.get(key)
+        if order is not None:
+            return order
+        order = min(self.ring_candidates(group_id, max_pass), key=self.ring_cost)
+        self.ring_table[key] = order
+        return order
+
+    # given order, snakes and their 2-opt results, independent of the link bandwidth
+    def ring_candidates(self, group_id: List[int], max_pass=8):
+        n = len(group_id)
+        if n <= 3:
+            return [list(group_id)]
+        y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
+        row_snake = sorted(
+            group_id, key=lambda i: (i // y, i % y if (i // y) % 2 == 0 else -(i % y))
+        )
+        col_snake = sorted(
+            group_id, key=lambda i: (i % y, i // y if (i % y) % 2 == 0 else -(i // y))
+        )
+        candidates = [list(group_id), row_snake, col_snake]
+        pos = {i: (i // y, i % y) for i in group_id}
+        dist = lambda a, b: (
+            abs(pos[a][0] - pos[b][0]) + abs(pos[a][1] - pos[b][1])
+        ) ** 2
+        for snake in (row_snake, col_snake):
+            order = list(snake)
+            for _ in range(max_pass):
+                improved = False
+                for i in range(n - 2):
+                    a, b = order[i], order[i + 1]
+                    for j in range(i + 2, n if i > 0 else n - 1):
+                        c, d = order[j], order[(j + 1) % n]
+                        if dist(a, c) + dist(b, d) < dist(a, b) + dist(c, d):
+                            order[i + 1 : j + 1] = order[i + 1 : j + 1][::-1]
+                            b = order[i + 1]
+                            improved = True
+                if not improved:
+                    break
+            candidates.append(order)
+        return candidates
+
     # NOTE: generate manhattan route: (src, src+1, .., dst)
     def route_gen(self, src_id, des_id, DEBUG_MODE=True):
         x = self.tile_intra_shape[0] * self.tile_inter_shape[0]
@@ -299,8 +510,35 @@ class Wafer_Device:
         #    print('Router_List:{}'.format(list))
         return route_list
 
-    # NOTE: generate communication link id
+    # NOTE: generate communication link id, memoized per (src,des) in route_cache
     def link_gen(self, src_id, des_id, DEBUG_MODE=False):
+        return self.route_cache.get(src_id, des_id, self._link_path)
+
+    # NOTE: XY route in closed form: X links along the src row, then Y links along the des column
+    def _link_path(self, src_id, des_id, DEBUG_MODE=False):
+        if self.route_XY != "X":
+            return self._link_path_hops(src_id, des_id, DEBUG_MODE)
+        x = self.tile_intra_shape[0] * self.tile_inter_shape[0]
+        y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
+        assert src_id != des_id, "Source and destination IDs must be different"
+        assert 0 <= des_id < (x * y), "Destination ID {} out of range".format(des_id)
+        Y_OFFSET = (y - 1) * x
+        src_row, src_col = divmod(src_id, y)
+        des_row, des_col = divmod(des_id, y)
+        x_base = src_row * (y - 1)
+        if src_col < des_col:
+            link_list = list(range(x_base + src_col, x_base + des_col))
+        else:
+            link_list = list(range(x_base + src_col - 1, x_base + des_col - 1, -1))
+        y_base = Y_OFFSET + des_col
+        if src_row < des_row:
+            link_list += range(y_base + src_row * y, y_base + des_row * y, y)
+        else:
+            link_list += range(y_base + (src_row - 1) * y, y_base + (des_row - 1) * y, -y)
+        return link_list
+
+    # hop by hop link id from route_gen
+    def _link_path_hops(self, src_id, des_id, DEBUG_MODE=False):
         x0 = self.tile_intra_shape[0]
         x1 = self.tile_inter_shape[0]
         y0 = self.tile_intra_shape[1]
@@ -342,121 +580,325 @@ class Wafer_Device:
             else:
                 return False
 
+    def link_bw(self, link_id):
+        if self.is_inter_link(link_id):
+            return self.tile_inter_noc_bw_GB
+        else:
+            return self.tile_intra_noc_bw_GB
+
     # time: response time * hops + (comm size / bw) + request link time
     def noc_process(self, comm_size_MB, src_id, des_id, task_id=1, DEBUG_MODE=False):
         assert src_id != des_id, "src_id({})!=des_id({})".format(src_id, des_id)
+        if self.Analytical:
+            yield self.env.timeout(self.noc_time(comm_size_MB, src_id, des_id))
+            return
         ListID = self.link_gen(src_id, des_id, DEBUG_MODE)
         # print(src_id,des_id,ListID)
+        yield from self.__noc_transfer(comm_size_MB, ListID)
+
+    def __noc_transfer(self, comm_size_MB, ListID):
+        if self.noc_mode == noc_model.flow:
+            # time: response time * hops + comm size / max-min fair rate
+            yield self.env.timeout(self.noc_response_latency_ms * len(ListID))
+            yield self.flow_noc.transfer(comm_size_MB, ListID)
+            return
+        if self.noc_mode == noc_model.reservation:
+            finish_ms = self.noc_calendar.reserve(self.env.now, comm_size_MB, ListID)
+            yield self.env.timeout(finish_ms - self.env.now)
+            return
+        if self.noc_mode == noc_model.wormhole:
+            # request every link on the path together, requests are issued in one step
+            # and served FIFO, so the holder of a busy link always started earlier: no deadlock
+            reqs = [
+                self.link_resource[i].request(size_MB=comm_size_MB) for i in ListID
+            ]
+            yield simpy.AllOf(self.env, reqs)
+            # time: response time * hops + comm size / slowest link bw
+            bw = min(self.link_bw(i) for i in ListID)
+            yield self.env.timeout(
+                self.noc_response_latency_ms * len(ListID) + comm_size_MB / bw
+            )
+            for i, req in zip(ListID, reqs):
+                self.link_resource[i].release(req)
+            return
         first_hop = True
-        while True:
-            for i in ListID:
-                time_ms = self.noc_response_latency_ms
-                if self.is_inter_link(i):
-                    if first_hop:
-                        time_ms += comm_size_MB / self.tile_inter_noc_bw_GB
-                else:
-                    if first_hop:
-                        time_ms += comm_size_MB / self.tile_intra_noc_bw_GB
-                # only diff between ana & sim is request 
-                if not self.Analytical:
-                    with self.link_resource[i].request() as req:
-                        yield req
-                        yield self.env.timeout(time_ms)
-                else:
-                    yield self.env.timeout(time_ms)
-                first_hop = False
-            break
+        for i in ListID:
+            time_ms = self.noc_response_latency_ms
+            if first_hop:
+                time_ms += comm_size_MB / self.link_bw(i)
+            with self.link_resource[i].request(size_MB=comm_size_MB) as req:
+                yield req
+                yield self.env.timeout(time_ms)
+            first_hop = False
 
-    # NOTE: NoC proc + data_size/bw + write_latency
-    def edge_dram_write_process(
-        self, access_size_MB, src_id, task_id="DDR_READ_TEST", DEBUG_MODE=False
-    ):
-        # TODO
-        x1 = self.tile_inter_shape[0]
+    # NOTE: closed-form cost for Analytical mode, no contention,
+    # equal to the sum of per-hop timeout in store-and-forward noc_process
+    def noc_cost(self, src_id, des_id):
+        # (hops, first hop bw) per (src,des), cleared together with route_cache
+        key = src_id * self.route_cache.tile_num + des_id
+        cost = self.noc_cost_table.get(key)
+        if cost is None:
+            ListID = self.link_gen(src_id, des_id)
+            cost = (len(ListID), self.link_bw(ListID[0]))
+            self.noc_cost_table[key] = cost
+        return cost
+
+    def noc_time(self, comm_size_MB, src_id, des_id):
+        hops, bw = self.noc_cost(src_id, des_id)
+        return self.noc_response_latency_ms * hops + comm_size_MB / bw
+
+    # NOTE: multicast tree = union of XY routes from src, every link has one parent link
+    # return ({link: parent link, None for links leaving src}, parents first; depth in hops)
+    def multicast_tree(self, src_id, des_list: List[int]):
+        key = (src_id, tuple(sorted(des_list)))
+        tree = self.multicast_table.get(key)
+        if tree is None:
+            parent = {}
+            depth = 0
+            for des_id in des_list:
+                if des_id == src_id:
+                    continue
+                ListID = self.link_gen(src_id, des_id)
+                depth = max(depth, len(ListID))
+                prev = None
+                for link_id in ListID:
+                    parent.setdefault(link_id, prev)
+                    prev = link_id
+            tree = (parent, depth)
+            self.multicast_table[key] = tree
+        return tree
+
+    # data is sent once per tree link, so multicast ends with the farthest destination
+    def multicast_time(self, comm_size_MB, src_id, des_list: List[int]):
+        time_ms = 0
+        for des_id in des_list:
+            if des_id != src_id:
+                time_ms = np.maximum(time_ms, self.noc_time(comm_size_MB, src_id, des_id))
+        return time_ms
+
+    # analytical mode has no load, least_loaded is the nearest controller there
+    def edge_dram_time(self, access_size_MB, src_id):
+        time_ms = 0
+        for _, des_id, size in self.edge_dram_route(access_size_MB, src_id, False):
+            part_ms = dram_access_time(
+                size,
+                self.edge_die_dram_bw_GB,
+                self.dram_response_latency_ms,
+                self.dram_param["row_miss_ns"],
+                self.edge_dram_channels,
+            )
+            if des_id != src_id:
+                part_ms = part_ms + self.noc_time(size, src_id, des_id)
+            time_ms = np.maximum(time_ms, part_ms)
+        return time_ms
+
+    def tile_dram_time(self, access_size_MB):
+        return dram_access_time(
+            access_size_MB,
+            self.tile_dram_bw_GB,
+            self.dram_response_latency_ms,
+            self.dram_param["row_miss_ns"],
+            self.tile_dram_channels,
+        )
+
+    def dram_read_group_time(self, access_size_MB, group_id: List[int], multicast=True):
+        time_ms = self.edge_dram_time(access_size_MB, group_id[0])
+        if multicast:
+            return time_ms + self.multicast_time(access_size_MB, group_id[0], group_id[1:])
+        g_size = len(group_id)
+        for i in range(1, g_size):
+            time_ms = time_ms + self.noc_time(
+                access_size_MB / g_size, group_id[i - 1], group_id[i]
+            )
+        return time_ms
+
+    def dram_write_group_time(self, access_size_MB, group_id: List[int], gather=True):
+        time_ms = self.edge_dram_time(access_size_MB, group_id[0])
+        g_size = len(group_id)
+        if gather:
+            for i in range(g_size - 1, 0, -1):
+                time_ms = time_ms + self.noc_time(access_size_MB / g_size, group_id[i], group_id[0])
+        return time_ms
+
+    # same cost as the ring / pairwise schedules of collective.py, incl. the link-load bound
+    def ALL_REDUCE_time(self, comm_size, group_id: List[int]):
+        if len(group_id) < 2:
+            return 0
+        return collective.estimate(
+            self, COMM.ALL_REDUCE, comm_algo.ring, group_id, comm_size
+        )
+
+    def ALL_2_ALL_time(self, comm_size, group_id: List[int]):
+        if len(group_id) < 2:
+            return 0
+        return collective.estimate(
+            self, COMM.ALL_2_ALL, comm_algo.pairwise, group_id, comm_size
+        )
+
+    # boundary legs move concurrently, each phase (gather, pass, scatter) is bound by
+    # its slowest transfer or its most loaded link, see collective.schedule_profile
+    def STAGE_PASS_time(self, comm_size, group_a: List[int], group_b: List[int]):
+        _, profile = self.stage_pass_plan(group_a, group_b)
+        return collective.profile_time(profile, comm_size)
+
+    # NOTE: edge DRAM controllers: 2 per die row, index = 2 * die row + (0:left, 1:right)
+    def edge_dram_index(self, src_id):
+        y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
+        die_row = src_id // y // self.tile_intra_shape[0]
+        return 2 * die_row + (1 if self.edge_tile(src_id) % y else 0)
+
+    # edge tile of controller index closest to src_id: clamp the row into the die row
+    def edge_dram_tile(self, index, src_id):
+        y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
         x0 = self.tile_intra_shape[0]
-        y0 = self.tile_intra_shape[1]
-        y1 = self.tile_inter_shape[1]
+        row = min(max(src_id // y, index // 2 * x0), index // 2 * x0 + x0 - 1)
+        return row * y + (y - 1 if index % 2 else 0)
+
+    # NOTE: [(controller index, edge tile, size)] of an access from src_id, by edge_dram_select
+    # nearest: controller on the closer side of the die row
+    # least_loaded: least (data in flight / bw + access + noc) over all controllers
+    # interleaved: data is interleaved over all controllers, parts run in parallel
+    def edge_dram_route(self, access_size_MB, src_id, load=True):
+        if self.edge_dram_select == dram_select.interleaved:
+            n = 2 * self.tile_inter_shape[0]
+            return [
+                (k, self.edge_dram_tile(k, src_id), access_size_MB / n) for k in range(n)
+            ]
+        index = self.edge_dram_index(src_id)
+        if self.edge_dram_select == dram_select.least_loaded and load:
+            bw = self.edge_die_dram_bw_GB
+
+            def finish_ms(k):
+                des_id = self.edge_dram_tile(k, src_id)
+                noc_ms = 0 if des_id == src_id else self.noc_time(access_size_MB, src_id, des_id)
+                return (self.edge_dram_resource[k].load_MB + access_size_MB) / bw + noc_ms
+
+            index = min(range(2 * self.tile_inter_shape[0]), key=finish_ms)
+        return [(index, self.edge_dram_tile(index, src_id), access_size_MB)]
+
+    # NOTE: closest tile to edge DRAM in the same row
+    def edge_tile(self, src_id):
         y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
         row_line = int(src_id / y) + 1
-        # closest tile to DRAM
-        des_id = (
+        return (
             row_line * y - 1
             if (row_line * y - 1 - src_id) < (y / 2)
             else (row_line - 1) * y
         )
-        while True:
-            # if DEBUG_MODE:
-            #    print("task {} start dram wrtie  @ {:.3f} ms".format(task_id,self.envenv.now))
+
+    # NOTE: NoC multicast along multicast_tree, each tree link carries the data once
+    # time: response time * depth + comm size / bw, links are contended like noc_process
+    def multicast_process(
+        self, comm_size_MB, src_id, des_list: List[int], task_id=1, DEBUG_MODE=False
+    ):
+        if self.Analytical:
+            yield self.env.timeout(self.multicast_time(comm_size_MB, src_id, des_list))
+            return
+        parent, depth = self.multicast_tree(src_id, des_list)
+        if parent == {}:
+            return
+        if self.noc_mode == noc_model.flow:
+            # one flow over the whole tree, its rate is set by the most shared tree link
+            yield self.env.timeout(self.noc_response_latency_ms * depth)
+            yield self.flow_noc.transfer(comm_size_MB, list(parent))
+        elif self.noc_mode == noc_model.reservation:
+            finish_ms = self.noc_calendar.reserve_tree(self.env.now, comm_size_MB, parent)
+            yield self.env.timeout(finish_ms - self.env.now)
+        elif self.noc_mode == noc_model.wormhole:
+            reqs = [self.link_resource[i].request(size_MB=comm_size_MB) for i in parent]
+            yield simpy.AllOf(self.env, reqs)
+            bw = min(self.link_bw(i) for i in parent)
+            yield self.env.timeout(
+                self.noc_response_latency_ms * depth + comm_size_MB / bw
+            )
+            for i, req in zip(parent, reqs):
+                self.link_resource[i].release(req)
+        else:
+            children = {}
+            for link_id, p in parent.items():
+                children.setdefault(p, []).append(link_id)
+            yield simpy.AllOf(
+                self.env,
+                [
+                    self.env.process(self.__multicast_hop(comm_size_MB, i, children))
+                    for i in children[None]
+                ],
+            )
+
+    def __multicast_hop(self, comm_size_MB, link_id, children):
+        time_ms = self.noc_response_latency_ms
+        # first hop from src adds comm size / bw
+        if link_id in children[None]:
+            time_ms += comm_size_MB / self.link_bw(link_id)
+        with self.link_resource[link_id].request(size_MB=comm_size_MB) as req:
+            yield req
+            yield self.env.timeout(time_ms)
+        if link_id in children:
+            yield simpy.AllOf(
+                self.env,
+                [
+                    self.env.process(self.__multicast_hop(comm_size_MB, i, children))
+                    for i in children[link_id]
+                ],
+            )
+
+    # NOTE: NoC proc + edge DRAM write, parts of an interleaved access run in parallel
+    def edge_dram_write_process(
+        self, access_size_MB, src_id, task_id="DDR_READ_TEST", DEBUG_MODE=False
+    ):
+        if self.Analytical:
+            yield self.env.timeout(self.edge_dram_time(access_size_MB, src_id))
+            return
+
+        def part(index, des_id, size):
             if des_id != src_id:
                 yield self.env.process(
                     self.noc_process(
-                        access_size_MB,
-                        src_id,
-                        des_id,
-                        task_id=task_id,
-                        DEBUG_MODE=DEBUG_MODE,
+                        size, src_id, des_id, task_id=task_id, DEBUG_MODE=DEBUG_MODE
                     )
                 )
-            if not self.Analytical:
-                pos = self.dpos_trans(des_id)
-                dram_index = 2 * pos[1] - 1 if pos[3] > y1 / 2 else pos[1]
-                # print(dram_index)
-                yield self.env.process(
-                    self.edge_dram_resource[dram_index].access_process(
-                        access_size_MB, task_id=task_id, write=True
-                    )
+            yield self.env.process(
+                self.edge_dram_resource[index].access_process(
+                    size, task_id=task_id, write=True
                 )
-            else:
-                yield self.env.timeout(self.dram_response_latency_ms+access_size_MB/self.edge_die_dram_bw_GB)    
-            #if DEBUG_MODE:
-            #print("task {} end dram wrtie  @ {:.3f} ms".format(task_id,self.env.now))
-            break
+            )
 
+        yield simpy.AllOf(
+            self.env,
+            [
+                self.env.process(part(*p))
+                for p in self.edge_dram_route(access_size_MB, src_id)
+            ],
+        )
+
+    # NOTE: edge DRAM read + NoC proc
     def edge_dram_read_process(
         self, access_size_MB, src_id, task_id="DDR_READ_TEST", DEBUG_MODE=True
     ):
-        x1 = self.tile_inter_shape[0]
-        x0 = self.tile_intra_shape[0]
-        y0 = self.tile_intra_shape[1]
-        y1 = self.tile_inter_shape[1]
-        y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
-        row_line = int(src_id / y) + 1
-        des_id = (
-            row_line * y - 1
-            if (row_line * y - 1 - src_id) < (y / 2)
-            else (row_line - 1) * y
-        )
-        while True:
-            # if DEBUG_MODE:
-            #    print("task {} start dram read  @ {:.3f} ms".format(task_id,self.env.now))
-            pos = self.dpos_trans(des_id)
-            # print(pos)
-            dram_index = 2 * pos[1] - 1 if pos[3] > y1 / 2 else pos[1]
-            # print(dram_index)
-            if not self.Analytical:
-                yield self.env.process(
-                    self.edge_dram_resource[dram_index].access_process(
-                        access_size_MB, task_id=task_id, write=False
-                    )
-                )
-            else:
-                yield self.env.timeout(
-                    self.dram_response_latency_ms
-                    + access_size_MB / self.edge_die_dram_bw_GB
+        if self.Analytical:
+            yield self.env.timeout(self.edge_dram_time(access_size_MB, src_id))
+            return
+
+        def part(index, des_id, size):
+            yield self.env.process(
+                self.edge_dram_resource[index].access_process(
+                    size, task_id=task_id, write=False
                 )
+            )
             if des_id != src_id:
                 yield self.env.process(
                     self.noc_process(
-                        access_size_MB,
-                        des_id,
-                        src_id,
-                        task_id=task_id,
-                        DEBUG_MODE=DEBUG_MODE,
+                        size, des_id, src_id, task_id=task_id, DEBUG_MODE=DEBUG_MODE
                     )
                 )
-            # if DEBUG_MODE:
-            #    print("task {} end dram read @ {:.3f} ms".format(task_id,self.env.now))
-            break
+
+        yield simpy.AllOf(
+            self.env,
+            [
+                self.env.process(part(*p))
+                for p in self.edge_dram_route(access_size_MB, src_id)
+            ],
+        )
 
     # NOTE: tile DRAM: data_size/bw + write_latency
     def tile_dram_access_process(
@@ -479,13 +921,11 @@ class Wafer_Device:
                     )
                 )
             else:
-                yield self.env.timeout(
-                    self.dram_response_latency_ms
-                    + access_size_MB / self.tile_dram_bw_GB
-                )
+                yield self.env.timeout(self.tile_dram_time(access_size_MB))
             break
     
-    # process tile group 
+    # process tile group: every tile has its own DRAM, so accesses of the group are issued together
+    # parallel=False: one tile after another
     def tile_dram_group_access_process(
         self,
         access_size_MB,
@@ -493,7 +933,26 @@ class Wafer_Device:
         task_id="3DDRAM-TEST",
         WRITE=True,
         DEBUG_MODE=False,
+        parallel=True,
     ):
+        if self.Analytical:
+            time_ms = self.tile_dram_time(access_size_MB)
+            yield self.env.timeout(time_ms if parallel else time_ms * len(group_id))
+            return
+        if parallel:
+            assert self.with_dram_per_tile
+            yield simpy.AllOf(
+                self.env,
+                [
+                    self.env.process(
+                        self.dram_per_tile_resource[id].access_process(
+                            access_size_MB, task_id, WRITE, DEBUG_MODE
+                        )
+                    )
+                    for id in group_id
+                ],
+            )
+            return
         for id in group_id:
             yield self.env.process(
                 self.tile_dram_access_process(
@@ -501,7 +960,9 @@ class Wafer_Device:
                 )
             )
 
-    # edge DRAM read + NoC, if multicast, comm size = tot/#group, otherwise comm = tot
+    # edge DRAM read + NoC to the group
+    # multicast: the whole data along a spanning tree from group_id[0] (multicast_process)
+    # otherwise: tot/#group passed hop by hop along the group order
     def dram_read_group_process(
         self,
         access_size_MB: Union[int, List[int]],
@@ -514,17 +975,30 @@ class Wafer_Device:
             temp = mulc(access_size_MB)
             access_size_MB = temp / 1000 / 1000 * 2
             # print(access_size_MB)
+        if self.Analytical:
+            yield self.env.timeout(
+                self.dram_read_group_time(access_size_MB, group_id, multicast)
+            )
+            return
         while True:
             # print("task {} start dram_read_group_process @ {:.3f} ms".format(task_id,self.env.now))
             # print(group_id[0])
             yield self.env.process(
                 self.edge_dram_read_process(access_size_MB, group_id[0], task_id)
             )
+            if multicast:
+                yield self.env.process(
+                    self.multicast_process(
+                        access_size_MB, group_id[0], group_id[1:], task_id
+                    )
+                )
+                break
             g_size = len(group_id)
             for i in range(1, g_size):
-                comm_size = access_size_MB / g_size if not multicast else access_size_MB
                 yield self.env.process(
-                    self.noc_process(comm_size, group_id[i - 1], group_id[i], task_id)
+                    self.noc_process(
+                        access_size_MB / g_size, group_id[i - 1], group_id[i], task_id
+                    )
                 )
             # print("task {} end dram_read_group_process @ {:.3f} ms".format(task_id,self.env.now))
             break
@@ -541,6 +1015,11 @@ class Wafer_Device:
         if type(access_size_MB) is list:
             temp = mulc(access_size_MB)
             access_size_MB = temp / 1000 / 1000 * 2
+        if self.Analytical:
+            yield self.env.timeout(
+                self.dram_write_group_time(access_size_MB, group_id, gather)
+            )
+            return
         while True:
             g_size = len(group_id)
             if gather:
@@ -556,52 +1035,71 @@ class Wafer_Device:
 
     # all-reduce = reduce-scatter + all-gather = 2 * all-gather
     # diff between reduce-scatter and all-gather is reciprocal direction
+    # segments!=1: chunks stream through the ring in segments (None=auto tuned)
     def ALL_REDUCE_process(
-        self, comm_size, group_id: List[int], task_id, DEBUG_MODE=False
+        self, comm_size, group_id: List[int], task_id, DEBUG_MODE=False, segments=1
     ):
         # TODO 完成通信原语及其优化
         # yield self.env.timeout(5)
+        if self.ring_reorder:
+            group_id = self.ring_order(group_id)
+        if segments != 1 and len(group_id) > 1:
+            ring = collective.SegmentedRing(group_id, comm_size, segments)
+            t_last = self.env.now
+            if self.Analytical:
+                yield self.env.timeout(ring.time(self))
+            else:
+                yield self.env.process(ring.process(self, task_id))
+            print(
+                "ALL_REDUCE task {} end with {:.3f} ms ({} segments)".format(
+                    task_id, self.env.now - t_last, ring.segments
+                )
+            )
+            return
         group_size = len(group_id)
         chunk_size = comm_size / group_size
         # if DEBUG_MODE:
         #        print("ALL_REDUCE task {} start @ {:.3f} ms".format(task_id,self.env.now))
         t_last = self.env.now
-        for i in range(group_size - 1):
-            event_list = []
-            for id_idx in range(group_size - 1):
+        if self.Analytical:
+            yield self.env.timeout(self.ALL_REDUCE_time(comm_size, group_id))
+        else:
+            for i in range(group_size - 1):
+                event_list = []
+                for id_idx in range(group_size - 1):
+                    event_list.append(
+                        self.env.process(
+                            self.noc_process(
+                                chunk_size, group_id[id_idx], group_id[id_idx + 1]
+                            )
+                        )
+                    )
                 event_list.append(
                     self.env.process(
-                        self.noc_process(
-                            chunk_size, group_id[id_idx], group_id[id_idx + 1]
-                        )
+                        self.noc_process(chunk_size, group_id[-1], group_id[0])
                     )
                 )
-            event_list.append(
-                self.env.process(
-                    self.noc_process(chunk_size, group_id[-1], group_id[0])
-                )
-            )
-            yield simpy.AllOf(self.env, event_list)
-            # if DEBUG_MODE:
-            #    print('Reduce-Scatter {}/{} phase'.format(i+1,group_size-1))
-        for i in range(group_size - 1):
-            event_list = []
-            for id_idx in range(group_size - 1):
+                yield simpy.AllOf(self.env, event_list)
+                # if DEBUG_MODE:
+                #    print('Reduce-Scatter {}/{} phase'.format(i+1,group_size-1))
+            for i in range(group_size - 1):
+                event_list = []
+                for id_idx in range(group_size - 1):
+                    event_list.append(
+                        self.env.process(
+                            self.noc_process(
+                                chunk_size, group_id[id_idx], group_id[id_idx + 1]
+                            )
+                        )
+                    )
                 event_list.append(
                     self.env.process(
-                        self.noc_process(
-                            chunk_size, group_id[id_idx], group_id[id_idx + 1]
-                        )
+                        self.noc_process(chunk_size, group_id[-1], group_id[0])
                     )
                 )
-            event_list.append(
-                self.env.process(
-                    self.noc_process(chunk_size, group_id[-1], group_id[0])
-                )
-            )
-            yield simpy.AllOf(self.env, event_list)
-            # if DEBUG_MODE:
-            #    print('All-Gather {}/{} phase'.format(i+1,group_size-1))
+                yield simpy.AllOf(self.env, event_list)
+                # if DEBUG_MODE:
+                #    print('All-Gather {}/{} phase'.format(i+1,group_size-1))
         # if DEBUG_MODE:
         #    print("ALL_REDUCE task {} end @ {:.3f} ms".format(task_id,self.env.now))
         print(
@@ -618,26 +1116,178 @@ class Wafer_Device:
         # print(group_size)
         chunk_size = comm_size / group_size
         t_last = self.env.now
-        for i in range(group_size - 1):
-            event_list = []
-            for id_idx in range(group_size):
-                des_id = (id_idx + i + 1) % group_size
-                event_list.append(
-                    self.env.process(
-                        self.noc_process(chunk_size, group_id[id_idx], group_id[des_id])
+        if self.Analytical:
+            yield self.env.timeout(self.ALL_2_ALL_time(comm_size, group_id))
+        else:
+            for i in range(group_size - 1):
+                event_list = []
+                for id_idx in range(group_size):
+                    des_id = (id_idx + i + 1) % group_size
+                    event_list.append(
+                        self.env.process(
+                            self.noc_process(chunk_size, group_id[id_idx], group_id[des_id])
+                        )
                     )
-                )
-            yield simpy.AllOf(self.env, event_list)
+                yield simpy.AllOf(self.env, event_list)
         print(
             "ALL_2_ALL task {} end with {:.3f} ms".format(
                 task_id, self.env.now - t_last
             )
         )
-    # NOTE: Pass activation or gradient between group
-    # 1. find closest id between group a & b -- (src, dst)
-    # 2. transfer other tile in group a to src -- (i, src)
-    # 3. transfer src to dst -- (src, dst)
-    # 4. transfer dst to other tile in group b -- (dst, j)
+    # NOTE: comm_size is the full buffer of one tile
+    # reduce-scatter: every tile ends with 1/n of the reduced buffer
+    # all-gather: every tile contributes 1/n and ends with the full buffer
+    # ring, ring_segmented, mesh_2d, hierarchical, halving_doubling, auto
+    def REDUCE_SCATTER_process(
+        self, comm_size, group_id: List[int], task_id, algo=None, DEBUG_MODE=False
+    ):
+        yield from self.collective_process(
+            COMM.REDUCE_SCATTER, comm_size, group_id, task_id, algo
+        )
+
+    def ALL_GATHER_process(
+        self, comm_size, group_id: List[int], task_id, algo=None, DEBUG_MODE=False
+    ):
+        yield from self.collective_process(
+            COMM.ALL_GATHER, comm_size, group_id, task_id, algo
+        )
+
+    # group_id[0] is the root, tree, mesh_2d, multicast or auto
+    def BROADCAST_process(
+        self, comm_size, group_id: List[int], task_id, algo=None, DEBUG_MODE=False
+    ):
+        yield from self.collective_process(
+            COMM.BROADCAST, comm_size, group_id, task_id, algo
+        )
+
+    # NOTE: collective from collective.py, algorithm is selected per call
+    def collective_process(
+        self,
+        comm_type: COMM,
+        comm_size,
+        group_id: List[int],
+        task_id,
+        algo=None,
+        DEBUG_MODE=False,
+    ):
+        t_last = self.env.now
+        if comm_type == COMM.NONE or len(group_id) < 2:
+            return
+            yield
+        algo = algo or self.comm_algo
+        # NOTE: memo key: same primitive/algo/group/size on the same link bw & latency
+        memo_key = (
+            comm_type,
+            algo,
+            tuple(group_id),
+            comm_size,
+            self.tile_intra_noc_bw_GB,
+            self.tile_inter_noc_bw_GB,
+            self.noc_response_latency_ms,
+        )
+        if self.Analytical:
+            memo = self.comm_memo_table.get(memo_key) if self.comm_memo else None
+            if memo is None:
+                memo = collective.select(self, comm_type, group_id, comm_size, algo)
+                if self.comm_memo:
+                    self.comm_memo_table[memo_key] = memo
+            else:
+                self.comm_memo_hits += 1
+            algo, time_ms = memo
+            yield self.env.timeout(time_ms)
+        else:
+            algo, _ = collective.select(self, comm_type, group_id, comm_size, algo)
+            schedule = collective.schedule(self, comm_type, algo, group_id, comm_size)
+            if isinstance(schedule, collective.StreamSchedule):
+                yield self.env.process(schedule.process(self, task_id))
+                schedule = []
+            for step in schedule:
+                event_list = [
+                    self.env.process(self.noc_process(size, src, des, task_id))
+                    for src, des, size in step
+                    if src != des
+                ]
+                yield simpy.AllOf(self.env, event_list)
+        print(
+            "{} task {} end with {:.3f} ms ({})".format(
+                comm_type, task_id, self.env.now - t_last, algo
+            )
+        )
+
+    # greedy min-hop matching: every left tile to one right tile, a right tile takes
+    # at most cap left tiles, stop when left tiles or right capacity run out
+    def __hop_match(self, left: List[int], right: List[int], cap=1):
+        if left == [] or right == []:
+            return []
+        y = self.tile_intra_shape[1] * self.tile_inter_shape[1]
+        l, r = np.array(left), np.array(right)
+        hops = np.abs(l[:, None] // y - r[None, :] // y) + np.abs(
+            l[:, None] % y - r[None, :] % y
+        )
+        used = np.zeros(len(left), dtype=bool)
+        load = np.zeros(len(right), dtype=int)
+        pairs = []
+        for idx in np.argsort(hops, axis=None, kind="stable"):
+            i, j = divmod(int(idx), len(right))
+            if used[i] or load[j] >= cap:
+                continue
+            used[i] = True
+            load[j] += 1
+            pairs.append((left[i], right[j]))
+            if len(pairs) == len(left) or len(pairs) == cap * len(right):
+                break
+        return pairs
+
+    # NOTE: stage pass plan between group a & b, cached per (group_a, group_b)
+    # 1. min(|A|,|B|) disjoint (src,des) pairs with least hops -- boundary legs,
+    #    XY paths of the legs spread over every link on the boundary of the two regions
+    # 2. other tiles of A are spread evenly over the src tiles -- gather legs
+    # 3. other tiles of B are spread evenly over the des tiles -- scatter legs
+    # return legs [(gather tiles, src, des, tiles behind src, scatter tiles)] and the profile
+    # of the schedule [gather, pass, scatter] for a tile size of 1 MB
+    def stage_pass_plan(self, group_a: List[int], group_b: List[int]):
+        key = (tuple(group_a), tuple(group_b))
+        plan = self.stage_pass_table.get(key)
+        if plan is not None:
+            return plan
+        boundary = self.__hop_match(list(group_a), list(group_b))
+        srcs = [src for src, _ in boundary]
+        dess = [des for _, des in boundary]
+        k = len(boundary)
+        gather = self.__hop_match(
+            [i for i in group_a if i not in srcs], srcs, -(-len(group_a) // k) - 1
+        )
+        scatter = self.__hop_match(
+            [j for j in group_b if j not in dess], dess, -(-len(group_b) // k) - 1
+        )
+        legs = []
+        for src, des in boundary:
+            gather_ids = [i for i, s in gather if s == src]
+            scatter_ids = [j for j, d in scatter if d == des]
+            legs.append((gather_ids, src, des, len(gather_ids) + 1, scatter_ids))
+        schedule = self.stage_pass_schedule(legs, group_a, group_b)
+        plan = (legs, collective.schedule_profile(self, schedule))
+        self.stage_pass_table[key] = plan
+        return plan
+
+    # [gather, pass, scatter] steps of the legs for a tile size of 1 MB
+    def stage_pass_schedule(self, legs, group_a: List[int], group_b: List[int]):
+        share = len(group_a) / len(group_b)
+        return [
+            [(i, src, 1) for g, src, _, _, _ in legs for i in g],
+            [(src, des, load) for _, src, des, load, _ in legs],
+            [(des, j, share) for _, _, des, _, sc in legs for j in sc],
+        ]
+
+    # closest (src,des) tile pair between group a & b
+    def stage_pass_pair(self, group_a: List[int], group_b: List[int]):
+        legs, _ = self.stage_pass_plan(group_a, group_b)
+        return legs[0][1], legs[0][2]
+
+    # NOTE: Pass activation or gradient between group, see stage_pass_plan
+    # every boundary leg runs on its own: gather into src -> src to des -> scatter from des
+    # gather & scatter transfers of a leg run in parallel, legs run concurrently
+    # each tile in group a holds comm_size, each tile in group b ends with an equal share
     def STAGE_PASS_process(
         self,
         comm_size: Union[int, Packet],
@@ -649,37 +1299,39 @@ class Wafer_Device:
         # TODO 完成通信原语
         if type(comm_size) is Packet:
             comm_size = comm_size.size
-        distance = []
-        for i in group_a:
-            for j in group_b:
-                distance.append(self.Manhattan_hops(i, j))
-        index = distance.index(min(distance))
-        src = group_a[index // len(group_b)]
-        des = group_b[index % len(group_b)]
-        # if DEBUG_MODE:
-        # print('Group_A {} to Group_B stage pass {}'.format(src,des))
-        while True:
-            # if DEBUG_MODE:
-            #    print("STAGE_PASS task {} start @ {:.3f} ms".format(task_id,self.env.now))
-            for i in group_a:
-                if i != src:
-                    yield self.env.process(
-                        self.noc_process(comm_size, i, src, task_id, DEBUG_MODE)
-                    )
-            all_comm_size = comm_size * len(group_a)
-            yield self.env.process(
-                self.noc_process(all_comm_size, src, des, task_id, DEBUG_MODE)
-            )
-            for j in group_b:
-                if j != des:
-                    yield self.env.process(
-                        self.noc_process(
-                            all_comm_size / len(group_b), des, j, task_id, DEBUG_MODE
+        if self.Analytical:
+            yield self.env.timeout(self.STAGE_PASS_time(comm_size, group_a, group_b))
+            return
+        legs, _ = self.stage_pass_plan(group_a, group_b)
+        share = comm_size * len(group_a) / len(group_b)
+
+        def leg(gather_ids, src, des, load, scatter_ids):
+            if gather_ids != []:
+                yield simpy.AllOf(
+                    self.env,
+                    [
+                        self.env.process(
+                            self.noc_process(comm_size, i, src, task_id, DEBUG_MODE)
                         )
-                    )
-            # if DEBUG_MODE:
-            #    print("STAGE_PASS task {} start @ {:.3f} ms".format(task_id,self.env.now))
-            break
+                        for i in gather_ids
+                    ],
+                )
+            if src != des:
+                yield self.env.process(
+                    self.noc_process(comm_size * load, src, des, task_id, DEBUG_MODE)
+                )
+            if scatter_ids != []:
+                yield simpy.AllOf(
+                    self.env,
+                    [
+                        self.env.process(
+                            self.noc_process(share, des, j, task_id, DEBUG_MODE)
+                        )
+                        for j in scatter_ids
+                    ],
+                )
+
+        yield simpy.AllOf(self.env, [self.env.process(leg(*l)) for l in legs])
 
     def resource_visualize(
         self, res_type: str = "edge_dram", path="./status/resource/", clear=True
@@ -690,50 +1342,52 @@ class Wafer_Device:
                 f_path = os.path.join(path, i)
                 # print(f_path)
                 shutil.rmtree(f_path)
+        if not self.resource_monitor:
+            return
         if res_type == "all":
-            for index, res in enumerate(self.edge_dram_resource):
-                visualize_resource(
-                    res.access_resource.data,
+            for index, res in self.edge_dram_resource.items():
+                visualize_monitor(
+                    res.monitor,
                     path + "edge_dram",
                     str(index),
                     max_resource=self.edge_die_dram_bw_GB,
                 )
-            for index, res in enumerate(self.dram_per_tile_resource):
-                visualize_resource(
-                    res.access_resource.data,
+            for index, res in self.dram_per_tile_resource.items():
+                visualize_monitor(
+                    res.monitor,
                     path + "3ddram",
                     str(index),
                     max_resource=self.tile_dram_bw_GB,
                 )
             path1 = path + "inter_noc"
             path2 = path + "intra_noc"
-            for index, res in enumerate(self.link_resource):
+            for index, res in self.link_resource.items():
                 if self.is_inter_link(index):
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path1,
                         str(index),
                         max_resource=self.tile_inter_noc_bw_GB,
                     )
                 else:
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path2,
                         str(index),
                         max_resource=self.tile_intra_noc_bw_GB,
                     )
         elif res_type == "edge_dram":
-            for index, res in enumerate(self.edge_dram_resource):
-                visualize_resource(
-                    res.access_resource.data,
+            for index, res in self.edge_dram_resource.items():
+                visualize_monitor(
+                    res.monitor,
                     path + "edge_dram",
                     str(index),
                     max_resource=self.edge_die_dram_bw_GB,
                 )
         elif res_type == "3ddram":
-            for index, res in enumerate(self.dram_per_tile_resource):
-                visualize_resource(
-                    res.access_resource.data,
+            for index, res in self.dram_per_tile_resource.items():
+                visualize_monitor(
+                    res.monitor,
                     path + "3ddram",
                     str(index),
                     max_resource=self.tile_dram_bw_GB,
@@ -741,17 +1395,17 @@ class Wafer_Device:
         elif res_type == "noc":
             path1 = path + "inter_noc"
             path2 = path + "intra_noc"
-            for index, res in enumerate(self.link_resource):
+            for index, res in self.link_resource.items():
                 if self.is_inter_link(index):
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path1,
                         str(index),
                         max_resource=self.tile_inter_noc_bw_GB,
                     )
                 else:
-                    visualize_resource(
-                        res.data,
+                    visualize_monitor(
+                        res.monitor,
                         path2,
                         str(index),
                         max_resource=self.tile_intra_noc_bw_GB,
@@ -867,6 +1521,29 @@ def validate_congestion():
         )
         env.run(until=10000)
 
+    for mode in (noc_model.flow, noc_model.wormhole, noc_model.reservation):
+        print(f"$$$$$$$$$$$$$$$${mode.name} Model$$$$$$$$$$$$$$$$")
+        comm_size = 128
+        env = simpy.Environment()
+        wd = Wafer_Device(
+            env,
+            tile_inter_shape=[1, 2],
+            tile_intra_shape=[2, 4],
+            tile_intra_noc_bw_GB=150,
+            tile_inter_noc_bw_GB=120,
+            with_dram_per_tile=True,
+            Analytical=False,
+            noc_mode=mode,
+        )
+        env.process(
+            wd.ALL_REDUCE_process(
+                comm_size=comm_size,
+                group_id=[0, 1, 2, 3, 4, 5, 6, 7, 15, 14, 13, 12, 11, 10, 9, 8],
+                task_id="ALL_REDUCE_process",
+            )
+        )
+        env.run(until=10000)
+
 
 if __name__ == "__main__":
     # Debug=True